@@ -0,0 +1 @@
+"""Data and query helpers behind the Bucharest Amenities Dashboard."""
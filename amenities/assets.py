@@ -0,0 +1,117 @@
+"""Resized, recompressed variants of the dashboard's images.
+
+    python -m amenities.assets          # prebuild every variant, print savings
+
+The screenshots are shown at most ~1200 px wide and the map icons at
+``ICON_SIZE`` px, so the originals (1.3 MB of JPEGs, 70 px PNGs) are mostly
+wasted bytes. Variants are written once to ``.cache/assets`` under a name
+that includes the source's content hash and the variant parameters, so an
+edited source or a new size produces a new file and stale ones are never
+served. Within a process, lookups are memoized by path, mtime and size.
+If the variant cannot be written (read-only checkout), the original file is
+used instead.
+"""
+import argparse
+import functools
+import glob
+import hashlib
+import io
+import os
+
+from PIL import Image, features
+
+ASSETS_DIR = os.path.join(".cache", "assets")
+SCREENSHOT_WIDTH = 1200
+SCREENSHOT_QUALITY = 80
+# Icons are drawn at ICON_SIZE (30 px); keep 2x for high-DPI screens.
+ICON_PX = 60
+
+
+def _content_hash(path):
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()[:16]
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@functools.lru_cache(maxsize=None)
+def _variant(path, mtime_ns, size, kind, px, assets_dir):
+    name = os.path.splitext(os.path.basename(path))[0]
+    if kind == "photo":
+        ext = "webp" if features.check("webp") else "jpg"
+    else:
+        ext = "png"
+    out = os.path.join(assets_dir, f"{name}-{_content_hash(path)}-{kind}{px}.{ext}")
+    if os.path.exists(out):
+        return out
+
+    image = Image.open(path)
+    buffer = io.BytesIO()
+    if kind == "photo":
+        image = image.convert("RGB")
+        if image.width > px:
+            image = image.resize((px, round(image.height * px / image.width)), Image.LANCZOS)
+        if ext == "webp":
+            image.save(buffer, "WEBP", quality=SCREENSHOT_QUALITY, method=6)
+        else:
+            image.save(buffer, "JPEG", quality=SCREENSHOT_QUALITY, optimize=True, progressive=True)
+    else:
+        image = image.convert("RGBA")
+        if max(image.size) > px:
+            image.thumbnail((px, px), Image.LANCZOS)
+        # A 256-colour palette keeps the alpha edges and is a third of the size.
+        image.quantize(256, method=Image.Quantize.FASTOCTREE).save(buffer, "PNG", optimize=True)
+    try:
+        _write_atomic(out, buffer.getvalue())
+    except OSError:
+        return path  # read-only checkout: serve the original
+    return out
+
+
+def _cached(path, kind, px, assets_dir):
+    stat = os.stat(path)
+    return _variant(path, stat.st_mtime_ns, stat.st_size, kind, px, assets_dir)
+
+
+def screenshot(path, width=SCREENSHOT_WIDTH, assets_dir=ASSETS_DIR):
+    """Path of ``path`` scaled down to ``width`` px and recompressed.
+
+    WebP, or JPEG when Pillow has no WebP support.
+    """
+    return _cached(path, "photo", width, assets_dir)
+
+
+def icon(path, px=ICON_PX, assets_dir=ASSETS_DIR):
+    """Path of the icon at ``path`` scaled to ``px`` and palette-compressed."""
+    return _cached(path, "icon", px, assets_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the optimized screenshot and icon variants.")
+    parser.add_argument("--screenshots", default="Screenshots")
+    parser.add_argument("--icons", default="ICONS")
+    args = parser.parse_args(argv)
+
+    before = after = 0
+    jobs = [(p, screenshot) for p in sorted(glob.glob(os.path.join(args.screenshots, "*.jpg")))]
+    jobs += [(p, icon) for p in sorted(glob.glob(os.path.join(args.icons, "*.png")))]
+    for path, build in jobs:
+        out = build(path)
+        before += os.path.getsize(path)
+        after += os.path.getsize(out)
+        print(f"{path:<28} {os.path.getsize(path):>9,} -> {os.path.getsize(out):>9,}  {out}")
+    print(f"{'total':<28} {before:>9,} -> {after:>9,}")
+
+
+if __name__ == "__main__":
+    main()
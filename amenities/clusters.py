@@ -0,0 +1,198 @@
+"""Zoom-aware marker clustering from a precomputed aggregation pyramid.
+
+For every zoom level the venues are bucketed into screen-sized cells (Web
+Mercator pixels, ``CELL_PX`` wide). Inside a level, venues that share a cell,
+amenity type, hourly bitmap, weekly schedule code (``amenities.schedule``) and
+night flag collapse into one *group* that only keeps a count and coordinate
+sums. Filtering by amenity, hour or weekday and time then works on the
+groups, so a query scans per-cell counts instead of venues, and the number
+of bubbles returned is bounded by the viewport size.
+"""
+import numpy as np
+
+from amenities.hours import open_at_hour
+
+CELL_PX = 80
+MIN_ZOOM = 10
+MAX_CLUSTER_ZOOM = 17
+# Below this many venues in view, send individual markers instead of bubbles.
+MARKER_THRESHOLD = 300
+
+
+def mercator_pixels(lat, lon, zoom):
+    """Global Web Mercator pixel coordinates at ``zoom`` (256 px tiles)."""
+    scale = 256.0 * (1 << zoom)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878)
+    lon = np.asarray(lon, dtype=np.float64)
+    x = (lon + 180.0) / 360.0 * scale
+    sin_lat = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return x, y
+
+
+def viewport_bounds(center, zoom, width_px=1200, height_px=700):
+    """Approximate ``(lat_min, lat_max, lon_min, lon_max)`` of a map view.
+
+    Used before the browser has reported the real bounds (first render, or
+    right after a search recentred the map).
+    """
+    scale = 256.0 * (1 << int(round(zoom)))
+    x, y = mercator_pixels(center[0], center[1], int(round(zoom)))
+    xs = np.array([x - width_px / 2, x + width_px / 2])
+    ys = np.array([y + height_px / 2, y - height_px / 2])
+    lon = xs / scale * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * ys / scale))))
+    return float(lat[0]), float(lat[1]), float(lon[0]), float(lon[1])
+
+
+class _Level:
+    def __init__(self, zoom, cx, cy, amenity, bits, night, code, lat, lon):
+        self.zoom = zoom
+        # Pack (schedule code, amenity, bitmap, night) into one int64 so
+        # grouping is a two-key lexsort rather than a row-wise np.unique.
+        attrs = (
+            (code.astype(np.int64) << 34)
+            | (amenity.astype(np.int64) << 25)
+            | (bits.astype(np.int64) << 1)
+            | night.astype(np.int64)
+        )
+        order = np.lexsort((attrs, cx, cy))
+        cy, cx, attrs = cy[order], cx[order], attrs[order]
+        new_group = np.concatenate((
+            [True], (cy[1:] != cy[:-1]) | (cx[1:] != cx[:-1]) | (attrs[1:] != attrs[:-1])
+        ))
+        starts = np.flatnonzero(new_group)
+        inverse = np.empty(len(order), dtype=np.int64)
+        inverse[order] = np.cumsum(new_group) - 1
+        n_groups = len(starts)
+
+        # Groups come out ordered by (cy, cx), which groups_in relies on.
+        self.cy = cy[starts]
+        self.cx = cx[starts]
+        self.amenity = ((attrs[starts] >> 25) & 0x1FF).astype(np.int16)
+        self.bits = ((attrs[starts] >> 1) & 0xFFFFFF).astype(np.uint32)
+        self.night = (attrs[starts] & 1).astype(bool)
+        self.code = (attrs[starts] >> 34).astype(np.int64)
+        self.count = np.diff(np.append(starts, len(order))).astype(np.int64)
+        self.lat_sum = np.bincount(inverse, weights=lat, minlength=n_groups)
+        self.lon_sum = np.bincount(inverse, weights=lon, minlength=n_groups)
+
+    def groups_in(self, bounds):
+        lat_min, lat_max, lon_min, lon_max = bounds
+        x0, y1 = mercator_pixels(lat_min, lon_min, self.zoom)
+        x1, y0 = mercator_pixels(lat_max, lon_max, self.zoom)
+        c0, c1 = int(x0 // CELL_PX), int(x1 // CELL_PX)
+        r0, r1 = int(y0 // CELL_PX), int(y1 // CELL_PX)
+        start, stop = np.searchsorted(self.cy, [r0, r1 + 1])
+        cx = self.cx[start:stop]
+        return np.arange(start, stop)[(cx >= c0) & (cx <= c1)]
+
+
+class ClusterPyramid:
+    def __init__(self, df, schedule_code=None, min_zoom=MIN_ZOOM, max_zoom=MAX_CLUSTER_ZOOM):
+        self.categories = list(df["amenity"].cat.categories)
+        self.min_zoom, self.max_zoom = min_zoom, max_zoom
+        lat = df["lat"].to_numpy(dtype=np.float64)
+        lon = df["lon"].to_numpy(dtype=np.float64)
+        amenity = df["amenity"].cat.codes.to_numpy().astype(np.int64)
+        bits = df["open_hours"].to_numpy()
+        night = df["open_night"].to_numpy()
+        code = np.zeros(len(df), dtype=np.int64) if schedule_code is None else np.asarray(schedule_code)
+        self.levels = {}
+        for zoom in range(min_zoom, max_zoom + 1):
+            x, y = mercator_pixels(lat, lon, zoom)
+            cx = (x // CELL_PX).astype(np.int64)
+            cy = (y // CELL_PX).astype(np.int64)
+            self.levels[zoom] = _Level(zoom, cx, cy, amenity, bits, night, code, lat, lon)
+
+    def amenity_code(self, amenity):
+        return self.categories.index(amenity) if amenity in self.categories else -1
+
+    def _level(self, zoom):
+        return self.levels[int(np.clip(round(zoom), self.min_zoom, self.max_zoom))]
+
+    def _matching_groups(self, level, bounds, amenity=None, hour=None, night_only=False, open_schedules=None):
+        groups = level.groups_in(bounds)
+        keep = np.ones(len(groups), dtype=bool)
+        if amenity is not None:
+            keep &= level.amenity[groups] == self.amenity_code(amenity)
+        if hour is not None:
+            keep &= open_at_hour(level.bits[groups], hour)
+        if open_schedules is not None:
+            keep &= open_schedules[level.code[groups]]
+        if night_only:
+            keep &= level.night[groups]
+        return groups[keep]
+
+    def _cells(self, level, groups):
+        """Merge ``groups`` by cell into ``(cell_of_group, bubbles)``."""
+        counts = level.count[groups]
+        cells = level.cy[groups] * (1 << 32) + level.cx[groups]
+        cell_ids, cell_of_group = np.unique(cells, return_inverse=True)
+        n_cells = len(cell_ids)
+        total = np.bincount(cell_of_group, weights=counts, minlength=n_cells)
+        lat = np.bincount(cell_of_group, weights=level.lat_sum[groups], minlength=n_cells) / total
+        lon = np.bincount(cell_of_group, weights=level.lon_sum[groups], minlength=n_cells) / total
+        n_types = len(self.categories)
+        by_type = np.bincount(
+            cell_of_group * n_types + level.amenity[groups],
+            weights=counts,
+            minlength=n_cells * n_types,
+        ).reshape(n_cells, n_types)
+
+        return cell_of_group, [
+            {
+                "lat": float(lat[i]),
+                "lon": float(lon[i]),
+                "count": int(total[i]),
+                "by_amenity": {
+                    self.categories[t]: int(by_type[i, t]) for t in np.nonzero(by_type[i])[0]
+                },
+            }
+            for i in range(n_cells)
+        ]
+
+    def clusters(self, zoom, bounds, amenity=None, hour=None, night_only=False, open_schedules=None):
+        """Cluster bubbles for the view, or None if individual markers fit.
+
+        ``open_schedules`` is a boolean per weekly schedule code (for example
+        ``WeeklySchedule.schedules_open_at``) and needs the pyramid to have
+        been built with ``schedule_code``. Returns a list of dicts with
+        ``lat``, ``lon`` (centroid of the matching venues), ``count`` and
+        ``by_amenity`` ({amenity: count}).
+        """
+        level = self._level(zoom)
+        groups = self._matching_groups(level, bounds, amenity, hour, night_only, open_schedules)
+        if level.count[groups].sum() <= MARKER_THRESHOLD:
+            return None
+        return self._cells(level, groups)[1]
+
+    def cluster_frames(self, zoom, bounds, open_frames, amenity=None, night_only=False):
+        """Cluster bubbles for a sequence of times, or None if individual markers fit.
+
+        ``open_frames`` is a boolean ``[n_frames, n_schedules]`` (for example
+        ``WeeklySchedule.day_frames``). Bubbles are placed once, over the
+        venues open in any frame; each also gets ``counts``, its number of
+        open venues per frame. ``count`` and ``by_amenity`` cover every frame.
+        Markers are shipped for every frame at once, so it is the venues
+        open in any frame that have to fit under ``MARKER_THRESHOLD``.
+        """
+        level = self._level(zoom)
+        groups = self._matching_groups(level, bounds, amenity, night_only=night_only)
+        open_frames = np.asarray(open_frames, dtype=bool)
+        n_codes = open_frames.shape[1]
+        groups = groups[open_frames.any(axis=0)[level.code[groups]]]
+        if level.count[groups].sum() <= MARKER_THRESHOLD:
+            return None
+
+        # Who is open only depends on the schedule code, so frames are
+        # counted over (cell, code) totals, not over groups.
+        cell_of_group, bubbles = self._cells(level, groups)
+        pairs, pair_of_group = np.unique(cell_of_group * n_codes + level.code[groups], return_inverse=True)
+        pair_counts = np.bincount(pair_of_group, weights=level.count[groups], minlength=len(pairs))
+        # pairs are sorted by cell, and every cell has at least one
+        cell_starts = np.flatnonzero(np.diff(pairs // n_codes, prepend=-1))
+        per_cell = np.add.reduceat(open_frames[:, pairs % n_codes] * pair_counts, cell_starts, axis=1)
+        for bubble, counts in zip(bubbles, per_cell.T.astype(np.int64).tolist()):
+            bubble["counts"] = counts
+        return bubbles
@@ -0,0 +1,192 @@
+"""Precomputed count cube behind the analytics charts.
+
+Counts are stored as ``cube[amenity, night, measure, row, col]`` where
+``night`` is the venue's ``open_night`` flag, ``measure`` is ``"total"`` or
+one of the four periods, and ``(row, col)`` a coarse grid cell. Every chart
+is a sum over a slice of the cube, so following the map view or the night
+filter costs about the same as showing the whole city.
+
+The weekday-and-time chart needs counts per weekly schedule
+(``amenities.schedule``) instead of per measure. There are too many
+distinct schedules for a dense dimension, so those counts are kept sparse:
+one entry per (cell, amenity, night, schedule code) that has venues, sorted
+by cell, plus dense whole-city totals. A query weights them with the
+schedules open at the selected time.
+
+For a viewport, cells fully inside the view come from the cube and only the
+venues in the ring of cells cut by the view edge are counted one by one, so
+the sums are exact.
+"""
+import numpy as np
+import pandas as pd
+
+from amenities.data import PERIODS
+
+CELLS_PER_AXIS = 64
+MEASURES = ["total"] + list(PERIODS)
+
+
+class AggregateCube:
+    def __init__(self, df, schedule_code=None, cells_per_axis=CELLS_PER_AXIS):
+        self.amenities = list(df["amenity"].cat.categories)
+        self.n = cells_per_axis
+        self.lat = df["lat"].to_numpy(dtype=np.float64)
+        self.lon = df["lon"].to_numpy(dtype=np.float64)
+        self.lat_min, self.lat_max = (self.lat.min(), self.lat.max()) if len(df) else (0.0, 0.0)
+        self.lon_min, self.lon_max = (self.lon.min(), self.lon.max()) if len(df) else (0.0, 0.0)
+        self.lat_step = max(self.lat_max - self.lat_min, 1e-9) / self.n * (1 + 1e-6)
+        self.lon_step = max(self.lon_max - self.lon_min, 1e-9) / self.n * (1 + 1e-6)
+
+        self.amenity = df["amenity"].cat.codes.to_numpy().astype(np.int64)
+        self.night = df["open_night"].to_numpy().astype(bool)
+        self.periods = np.stack([df[f"open_{p}"].to_numpy() for p in PERIODS], axis=1)
+
+        cell = self._row(self.lat) * self.n + self._col(self.lon)
+        cell_counts = np.bincount(cell, minlength=self.n * self.n)
+        self.order = np.argsort(cell, kind="stable")
+        self.cell_start = np.concatenate(([0], np.cumsum(cell_counts)))
+
+        key = (self.amenity * 2 + self.night) * self.n * self.n + cell
+        size = len(self.amenities) * 2 * self.n * self.n
+        counts = np.stack(
+            [
+                np.bincount(key, weights=col, minlength=size)
+                for col in self._measure_columns(np.arange(len(df))).T
+            ],
+            axis=1,
+        )
+        self.cube = (
+            counts.reshape(len(self.amenities), 2, self.n, self.n, len(MEASURES))
+            .transpose(0, 1, 4, 2, 3)
+            .astype(np.int32)
+        )
+        # Whole-city sums [amenity, night, measure], the default chart scope.
+        self.totals = self.cube.sum(axis=(3, 4), dtype=np.int64)
+
+        # Sparse counts per weekly schedule code (see the module docstring).
+        if schedule_code is None:
+            schedule_code = np.zeros(len(df), dtype=np.int64)
+        self.code = code = np.asarray(schedule_code, dtype=np.int64)
+        self.n_codes = int(code.max()) + 1 if len(code) else 1
+        kinds = len(self.amenities) * 2 * self.n_codes
+        kind = (self.amenity * 2 + self.night) * self.n_codes + code
+        self.code_totals = np.bincount(kind, minlength=kinds).reshape(len(self.amenities), 2, self.n_codes)
+        entries, self.entry_count = np.unique(cell * kinds + kind, return_counts=True)
+        self.entry_cell = entries // kinds
+        kind = entries % kinds
+        self.entry_amenity = kind // (2 * self.n_codes)
+        self.entry_night = (kind // self.n_codes) % 2 == 1
+        self.entry_code = kind % self.n_codes
+        self.entry_start = np.searchsorted(self.entry_cell, np.arange(self.n * self.n + 1))
+
+    def _row(self, lat):
+        return np.clip(((lat - self.lat_min) / self.lat_step).astype(np.int64), 0, self.n - 1)
+
+    def _col(self, lon):
+        return np.clip(((lon - self.lon_min) / self.lon_step).astype(np.int64), 0, self.n - 1)
+
+    def _measure_columns(self, rows):
+        # [len(rows), len(MEASURES)] 0/1 matrix in MEASURES order.
+        return np.column_stack([np.ones(len(rows), dtype=bool), self.periods[rows]]).astype(np.float64)
+
+    def _block(self, bounds):
+        # (r0, r1, c0, c1) cells covering ``bounds``, or None if it misses the data.
+        lat_min, lat_max, lon_min, lon_max = bounds
+        if lat_min > self.lat_max or lat_max < self.lat_min or lon_min > self.lon_max or lon_max < self.lon_min:
+            return None
+        r0, r1 = self._row(np.float64(lat_min)), self._row(np.float64(lat_max))
+        c0, c1 = self._col(np.float64(lon_min)), self._col(np.float64(lon_max))
+        return r0, r1, c0, c1
+
+    def _edge_inside(self, bounds, block, night_only):
+        # Venues of the edge ring that are inside ``bounds`` (and open at night).
+        lat_min, lat_max, lon_min, lon_max = bounds
+        rows = self._edge_rows(*block)
+        lat, lon = self.lat[rows], self.lon[rows]
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        if night_only:
+            inside &= self.night[rows]
+        return rows[inside]
+
+    def _edge_rows(self, r0, r1, c0, c1):
+        # Venues in the cells on the border of the [r0..r1] x [c0..c1] block,
+        # as (first cell, last cell) runs that are contiguous in ``order``.
+        n = self.n
+        runs = [(r * n + c0, r * n + c1) for r in sorted({r0, r1})]
+        for r in range(r0 + 1, r1):
+            runs.append((r * n + c0, r * n + c0))
+            if c1 != c0:
+                runs.append((r * n + c1, r * n + c1))
+        return np.concatenate([self.order[self.cell_start[a]:self.cell_start[b + 1]] for a, b in runs])
+
+    def _slice(self, bounds, night_only):
+        if bounds is None:
+            totals = self.totals[:, 1:] if night_only else self.totals
+            # -> [amenity, measure]
+            return totals.sum(axis=1)
+
+        cube = self.cube[:, 1:] if night_only else self.cube
+
+        result = np.zeros((len(self.amenities), len(MEASURES)), dtype=np.int64)
+        block = self._block(bounds)
+        if block is None:
+            return result
+        r0, r1, c0, c1 = block
+        result += cube[..., r0 + 1:r1, c0 + 1:c1].sum(axis=(1, 3, 4), dtype=np.int64)
+
+        rows = self._edge_inside(bounds, block, night_only)
+        measures = self._measure_columns(rows)
+        for m in range(len(MEASURES)):
+            result[:, m] += np.bincount(
+                self.amenity[rows], weights=measures[:, m], minlength=len(self.amenities)
+            ).astype(np.int64)
+        return result
+
+    def by_amenity(self, measure="total", bounds=None, night_only=False):
+        """Venue counts per amenity for one measure (``"total"`` or a period)."""
+        counts = self._slice(bounds, night_only)[:, MEASURES.index(measure)]
+        return pd.Series(counts, index=self.amenities, name="count")
+
+    def open_by_amenity(self, open_schedules, bounds=None, night_only=False):
+        """Counts per amenity of the venues whose schedule code is set in ``open_schedules``.
+
+        ``open_schedules`` is a boolean per code, for example
+        ``WeeklySchedule.schedules_open``; the cube must have been built with
+        the same ``schedule_code``.
+        """
+        open_schedules = np.asarray(open_schedules, dtype=bool)
+        if bounds is None:
+            totals = self.code_totals[:, 1:] if night_only else self.code_totals
+            counts = (totals * open_schedules).sum(axis=(1, 2))
+            return pd.Series(counts.astype(np.int64), index=self.amenities, name="count")
+
+        counts = np.zeros(len(self.amenities), dtype=np.int64)
+        block = self._block(bounds)
+        if block is not None:
+            r0, r1, c0, c1 = block
+            # Entries of the cells fully inside the view, one run per grid row.
+            if c1 - c0 > 1:
+                entries = np.concatenate([
+                    np.arange(self.entry_start[r * self.n + c0 + 1], self.entry_start[r * self.n + c1])
+                    for r in range(r0 + 1, r1)
+                ] or [np.empty(0, dtype=np.int64)])
+                keep = open_schedules[self.entry_code[entries]]
+                if night_only:
+                    keep &= self.entry_night[entries]
+                entries = entries[keep]
+                counts += np.bincount(
+                    self.entry_amenity[entries], weights=self.entry_count[entries], minlength=len(self.amenities)
+                ).astype(np.int64)
+            rows = self._edge_inside(bounds, block, night_only)
+            rows = rows[open_schedules[self.code[rows]]]
+            counts += np.bincount(self.amenity[rows], minlength=len(self.amenities))
+        return pd.Series(counts, index=self.amenities, name="count")
+
+    def by_measure(self, measures, amenity=None, bounds=None, night_only=False):
+        """Counts per measure, for one amenity or all of them."""
+        counts = self._slice(bounds, night_only)
+        if amenity is not None:
+            code = self.amenities.index(amenity)
+            counts = counts[code:code + 1]
+        idx = [MEASURES.index(m) for m in measures]
+        return pd.Series(counts[:, idx].sum(axis=0), index=list(measures), name="count")
@@ -0,0 +1,147 @@
+"""Load stage for the amenities dataset.
+
+The CSV is parsed once into a compact frame (categorical ``amenity``,
+float32 coordinates, normalized minute-of-day hours, see ``amenities.hours``,
+and a packed ``open_hours`` bitmap) and kept as a pickle snapshot
+next to the CSV. The snapshot is reused until the CSV's mtime changes *and*
+its content hash no longer matches, so touching the file is cheap. A
+snapshot that cannot be read, or was written by another pandas version, is
+rebuilt.
+
+The returned frame is shared by every Streamlit session, treat it as
+read-only.
+"""
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from amenities.hours import hour_bits, normalize_hours, open_during
+
+CSV_PATH = "Amneties_Final.csv"
+CACHE_DIR = ".cache"
+
+# Bump when the snapshot layout changes so old snapshots are rebuilt.
+SNAPSHOT_VERSION = 5
+
+# Time-of-day periods as (start hour, end hour); "night" wraps midnight.
+PERIODS = {
+    "morning": (5, 12),
+    "midday": (12, 17),
+    "evening": (17, 21),
+    "night": (21, 5),
+}
+
+
+def hhmm_to_minutes(values):
+    """Convert a Series of ``HH:MM`` strings to int16 minutes after midnight."""
+    parts = values.astype(str).str.strip().str.split(":", n=1, expand=True)
+    hours = parts[0].astype(np.int16)
+    minutes = parts[1].astype(np.int16)
+    return (hours * 60 + minutes).astype(np.int16)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_frame(csv_path):
+    """Parse the CSV into the compact in-memory layout."""
+    raw = pd.read_csv(csv_path)
+    raw.columns = raw.columns.str.strip()
+
+    opening, closing = normalize_hours(
+        hhmm_to_minutes(raw["opening_hour"]), hhmm_to_minutes(raw["closing_hour"])
+    )
+    df = pd.DataFrame({
+        "amenity": raw["amenity"].str.strip().str.lower().astype("category"),
+        "name": raw["name"],
+        # Venues without a website (common in ingested exports) get "", not NaN.
+        "website": raw["website"].fillna("").astype(str).str.strip(),
+        "opening_hour": raw["opening_hour"],
+        "closing_hour": raw["closing_hour"],
+        "opening_min": opening,
+        "closing_min": closing,
+        "open_hours": hour_bits(opening, closing),
+        "lat": raw["lat"].astype(np.float32),
+        "lon": raw["lon"].astype(np.float32),
+    })
+
+    for period, (start_hour, end_hour) in PERIODS.items():
+        df[f"open_{period}"] = open_during(opening, closing, start_hour * 60, end_hour * 60)
+    # Optional OSM-style per-weekday hours (written by amenities.ingest),
+    # read by amenities.schedule.
+    if "opening_hours" in raw.columns:
+        df["opening_hours"] = raw["opening_hours"].fillna("").astype(str)
+    return df
+
+
+def _snapshot_path(csv_path, cache_dir):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{name}.snapshot.pkl")
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, "rb") as fh:
+            snapshot = pickle.load(fh)
+    except Exception:
+        # Missing, truncated, or pickled by another pandas/numpy version
+        # (ModuleNotFoundError, ImportError, TypeError, ...): rebuild it.
+        return None
+    if (
+        not isinstance(snapshot, dict)
+        or snapshot.get("version") != SNAPSHOT_VERSION
+        or snapshot.get("pandas") != pd.__version__
+    ):
+        return None
+    return snapshot
+
+
+def _write_snapshot(path, snapshot):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        pickle.dump(snapshot, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_amenities(csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """Return the compact amenities frame, rebuilding the snapshot if stale."""
+    stat = os.stat(csv_path)
+    snapshot_path = _snapshot_path(csv_path, cache_dir)
+    snapshot = _read_snapshot(snapshot_path)
+
+    if snapshot is not None and snapshot["mtime_ns"] == stat.st_mtime_ns and snapshot["size"] == stat.st_size:
+        return snapshot["frame"]
+
+    digest = file_digest(csv_path)
+    if snapshot is not None and snapshot["sha256"] == digest:
+        # Only the mtime moved; remember it so the next start skips hashing.
+        snapshot.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    else:
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "pandas": pd.__version__,
+            "sha256": digest,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "frame": build_frame(csv_path),
+        }
+    try:
+        _write_snapshot(snapshot_path, snapshot)
+    except OSError:
+        pass  # read-only checkout: keep serving from memory
+    return snapshot["frame"]
+
+
+def dataset_version(csv_path=CSV_PATH):
+    """Cheap key that changes whenever the CSV is replaced or edited."""
+    stat = os.stat(csv_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
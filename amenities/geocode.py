@@ -0,0 +1,264 @@
+"""Location search for the search box.
+
+A query is answered, in order, by:
+
+1. the local gazetteer: exact names (bundled Bucharest places, then the
+   dataset's own venues) and partial / fuzzy matches on the places (no
+   network);
+2. the process-wide LRU of earlier answers;
+3. the on-disk cache (SQLite, with a TTL), shared by every session and
+   process on the machine;
+4. Nominatim, with request timeouts and client-side rate limiting;
+5. a partial / fuzzy match on the venue names, when none of the above has
+   an answer.
+
+Results are dicts with ``lat``, ``lon``, ``display_name`` and ``source``.
+"""
+import bisect
+import collections
+import contextlib
+import csv
+import difflib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import requests
+
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+USER_AGENT = "Streamlit-App"
+PLACES_PATH = "bucharest_places.csv"
+CACHE_PATH = os.path.join(".cache", "geocode.sqlite")
+
+CACHE_TTL = 30 * 24 * 3600
+LRU_SIZE = 1024
+TIMEOUT = (3.05, 6)
+# Nominatim's usage policy allows at most one request per second.
+MIN_INTERVAL = 1.0
+# Restrict the remote search to roughly the Bucharest metropolitan area.
+VIEWBOX = "25.90,44.55,26.30,44.30"
+# Shorter queries ("bar", "caf") only match a local name exactly; partial and
+# fuzzy matches on them would pick an arbitrary name instead of asking Nominatim.
+MIN_PARTIAL_LENGTH = 5
+
+
+def normalize(text):
+    """Lowercase, strip diacritics and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+class _NameIndex:
+    """Exact / prefix / fuzzy matching over one list of names."""
+
+    def __init__(self, entries):
+        # entries: iterable of (name, lat, lon); first entry for a name wins.
+        self.places = {}
+        for name, lat, lon in entries:
+            key = normalize(name)
+            if key and key not in self.places:
+                self.places[key] = {"lat": float(lat), "lon": float(lon), "display_name": name}
+        self.keys = sorted(self.places)
+        # Word-level index so "aviatorilor" also finds "piata aviatorilor".
+        self.words = sorted(
+            (word, key) for key in self.keys for word in key.split() if len(word) > 2
+        )
+
+    def exact(self, key):
+        return self.places.get(key)
+
+    def partial(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        match = self.keys[i] if i < len(self.keys) and self.keys[i].startswith(key) else None
+        if match is None:
+            i = bisect.bisect_left(self.words, (key,))
+            if i < len(self.words) and self.words[i][0].startswith(key):
+                match = self.words[i][1]
+        if match is None:
+            # Fuzzy match only against names sharing the first two letters,
+            # which keeps typo tolerance cheap on large gazetteers.
+            lo = bisect.bisect_left(self.keys, key[:2])
+            hi = bisect.bisect_left(self.keys, key[:2] + "\uffff")
+            close = difflib.get_close_matches(key, self.keys[lo:hi], n=1, cutoff=0.85)
+            match = close[0] if close else None
+        return self.places[match] if match else None
+
+
+class Gazetteer:
+    """Local lookup over bundled place names first, then the dataset's venue names.
+
+    ``lookup`` answers exact names (places before venues) and partial or
+    fuzzy matches on places only. A partial venue match ("Victoriei" for
+    "Victoriei Ballroom") is a weak guess, so ``lookup_venue`` is kept apart
+    for when nothing else, Nominatim included, has an answer.
+    """
+
+    def __init__(self, places, venues=()):
+        self.places = _NameIndex(places)
+        self.venues = _NameIndex(venues)
+
+    def lookup(self, query):
+        key = normalize(query)
+        if not key:
+            return None
+        match = self.places.exact(key) or self.venues.exact(key)
+        if match is None and len(key) >= MIN_PARTIAL_LENGTH:
+            match = self.places.partial(key)
+        return match
+
+    def lookup_venue(self, query):
+        """Partial or fuzzy match on venue names only."""
+        key = normalize(query)
+        if len(key) < MIN_PARTIAL_LENGTH:
+            return None
+        return self.venues.partial(key)
+
+    @classmethod
+    def from_sources(cls, venues=None, places_path=PLACES_PATH):
+        places = []
+        if places_path and os.path.exists(places_path):
+            with open(places_path, newline="", encoding="utf-8") as fh:
+                places.extend((row["name"], row["lat"], row["lon"]) for row in csv.DictReader(fh))
+        if venues is None:
+            return cls(places)
+        return cls(places, zip(venues["name"], venues["lat"], venues["lon"]))
+
+
+class RateLimiter:
+    def __init__(self, min_interval=MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DiskCache:
+    """Query -> JSON result, expiring after ``ttl`` seconds."""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL):
+        self.path, self.ttl = path, ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode (query TEXT PRIMARY KEY, result TEXT, fetched_at REAL)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:  # commits on success
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT result, fetched_at FROM geocode WHERE query = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return None  # locked or unreadable: treat as a miss
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        try:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?)", (key, json.dumps(result), time.time())
+                )
+        except sqlite3.Error:
+            pass  # read-only or full disk: the LRU still has the answer
+
+
+def open_disk_cache(path=CACHE_PATH, ttl=CACHE_TTL):
+    """``DiskCache`` at ``path``, or None if it cannot be created (read-only checkout)."""
+    try:
+        return DiskCache(path, ttl)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+class Geocoder:
+    def __init__(self, gazetteer=None, disk_cache=None, url=NOMINATIM_URL,
+                 rate_limiter=None, timeout=TIMEOUT, lru_size=LRU_SIZE):
+        self.gazetteer = gazetteer
+        self.disk_cache = disk_cache
+        self.url = url
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self._lru = collections.OrderedDict()
+        self._lru_size = lru_size
+        self._lock = threading.Lock()
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._lru[key] = result
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+
+    def search(self, query):
+        """Best match for ``query``, or None. Network errors propagate."""
+        key = normalize(query)
+        if not key:
+            return None
+
+        if self.gazetteer is not None:
+            place = self.gazetteer.lookup(key)
+            if place is not None:
+                return dict(place, source="gazetteer")
+
+        result, source = self._remote(query, key)
+        return dict(result, source=source) if result else self._venue(key)
+
+    def _remote(self, query, key):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key], "cache"
+
+        if self.disk_cache is not None:
+            cached = self.disk_cache.get(key)
+            if cached is not None:
+                result = cached.get("result")
+                self._remember(key, result)
+                return result, "cache"
+
+        result = self._fetch(query)
+        self._remember(key, result)
+        if self.disk_cache is not None:
+            self.disk_cache.put(key, {"result": result})
+        return result, "nominatim"
+
+    def _venue(self, key):
+        place = self.gazetteer.lookup_venue(key) if self.gazetteer is not None else None
+        return dict(place, source="gazetteer") if place else None
+
+    def _fetch(self, query):
+        self.rate_limiter.wait()
+        params = {"q": query, "format": "json", "limit": 1, "viewbox": VIEWBOX}
+        response = self.session.get(self.url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if not data:
+            return None
+        return {
+            "lat": float(data[0]["lat"]),
+            "lon": float(data[0]["lon"]),
+            "display_name": data[0]["display_name"],
+        }
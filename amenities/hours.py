@@ -0,0 +1,94 @@
+"""Vectorized opening-hours engine.
+
+Hours are integer minutes after midnight. A venue is open on ``[opening,
+closing)``; when ``opening > closing`` the window runs past midnight. Two
+conventions from the curated dataset are folded in by ``normalize_hours``:
+
+* a closing time of 23:59 means "until midnight" (the spreadsheet could not
+  store 24:00), so it becomes 1440;
+* ``opening == closing`` means open around the clock.
+
+After normalization every query below is a handful of NumPy comparisons over
+the whole table, with no per-row Python.
+"""
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+END_OF_DAY = 23 * 60 + 59
+
+
+def normalize_hours(opening, closing):
+    """Return int16 ``(opening, closing)`` arrays with the dataset conventions applied."""
+    opening = np.asarray(opening, dtype=np.int16)
+    closing = np.asarray(closing, dtype=np.int16)
+    closing = np.where(closing == END_OF_DAY, MINUTES_PER_DAY, closing).astype(np.int16)
+    all_day = opening == closing
+    opening = np.where(all_day, 0, opening).astype(np.int16)
+    closing = np.where(all_day, MINUTES_PER_DAY, closing).astype(np.int16)
+    return opening, closing
+
+
+def open_at(opening, closing, minute):
+    """Open at ``minute``. ``minute`` may be a scalar or broadcast against the venues."""
+    wraps = opening > closing
+    return np.where(
+        wraps,
+        (minute >= opening) | (minute < closing),
+        (opening <= minute) & (minute < closing),
+    )
+
+
+def _segments(start, end):
+    # Split a circular window into two linear ones on [0, 1440); the second
+    # one is empty (0, 0) unless the window crosses midnight.
+    wraps = start > end
+    first = (start, np.where(wraps, MINUTES_PER_DAY, end))
+    second = (np.zeros_like(start), np.where(wraps, end, 0))
+    return first, second
+
+
+def _interval(start, end):
+    start, end = int(start), int(end)
+    if start == end:
+        start, end = 0, MINUTES_PER_DAY
+    return np.asarray(start), np.asarray(end)
+
+
+def open_during(opening, closing, start, end):
+    """Open at any point in ``[start, end)``; the interval may cross midnight."""
+    venue = _segments(opening, closing)
+    window = _segments(*_interval(start, end))
+    result = np.zeros(np.shape(opening), dtype=bool)
+    for v0, v1 in venue:
+        for w0, w1 in window:
+            result |= (v0 < w1) & (w0 < v1) & (v0 < v1) & (w0 < w1)
+    return result
+
+
+def open_throughout(opening, closing, start, end):
+    """Open for the whole of ``[start, end)``; the interval may cross midnight."""
+    wraps = opening > closing
+    result = np.ones(np.shape(opening), dtype=bool)
+    for w0, w1 in _segments(*_interval(start, end)):
+        if w0 >= w1:
+            continue
+        inside = np.where(
+            wraps,
+            (w1 <= closing) | (w0 >= opening),
+            (opening <= w0) & (w1 <= closing),
+        )
+        result &= inside
+    return result
+
+
+def hour_bits(opening, closing):
+    """Pack "open at HH:00" for the 24 hours into one uint32 per venue (bit h = hour h)."""
+    hours = np.arange(24, dtype=np.int16) * 60
+    matrix = open_at(opening[:, None], closing[:, None], hours[None, :])
+    weights = np.uint32(1) << np.arange(24, dtype=np.uint32)
+    return (matrix.astype(np.uint32) * weights).sum(axis=1, dtype=np.uint32)
+
+
+def open_at_hour(bits, hour):
+    """Look up hour ``hour`` in the packed bitmap built by ``hour_bits``."""
+    return (bits >> np.uint32(hour)) & np.uint32(1) != 0
@@ -0,0 +1,315 @@
+"""Streaming ingestion of raw Overpass exports into the dashboard's CSV.
+
+    python -m amenities.ingest export.json --output Amneties_Final.csv
+    python -m amenities.ingest north.osm south.osm.gz --output city.csv --default-hours 10:00-22:00
+
+Reproduces the cleanup described in the reflection section in code:
+
+* JSON (``[out:json]``) and XML exports are read one element at a time, so
+  memory does not grow with the size of the file (only the duplicate
+  indexes grow, with the number of venues);
+* elements are kept if their ``amenity`` is one of ``AMENITIES`` and they
+  have a name and a location (nodes, or ways/relations exported with
+  ``out center``);
+* duplicates are dropped by OSM id (across all inputs) and by name: a venue
+  whose normalized name matches a kept venue within ``DEDUP_METERS`` is the
+  same place mapped twice;
+* ``opening_hours`` is parsed into a weekly schedule and collapsed into the
+  dataset's single 24h ``HH:MM`` opening/closing window, with the 23:59
+  convention for "until midnight" and 00:00-23:59 for around the clock; the
+  original value is kept in an ``opening_hours`` column for the per-weekday
+  schedules (``amenities.schedule``);
+* rows are written in batches, with the ``open_*`` period flags, to a
+  temporary file that replaces ``--output`` once the run succeeds.
+"""
+import argparse
+import collections
+import csv
+import gzip
+import json
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from amenities.data import PERIODS
+from amenities.geocode import normalize
+from amenities.hours import MINUTES_PER_DAY, normalize_hours, open_during
+from amenities.schedule import parse_opening_hours
+
+AMENITIES = ("bar", "pub", "cafe", "nightclub", "restaurant", "theatre", "cinema")
+COLUMNS = [
+    "amenity", "name", "website", "opening_hour", "closing_hour", "lat", "lon",
+    "open_dawn", "open_day", "open_dusk", "open_night", "opening_hours",
+]
+DEDUP_METERS = 50
+BATCH_SIZE = 10_000
+CHUNK_SIZE = 1 << 16
+METERS_PER_DEGREE = 111_320
+OSM_TYPES = {"node": 0, "way": 1, "relation": 2}
+
+
+# --- Reading exports ---
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def _element(osm_type, osm_id, lat, lon, center, tags):
+    if lat is None and center:
+        lat, lon = center.get("lat"), center.get("lon")
+    return {
+        "type": osm_type,
+        "id": int(osm_id or 0),
+        "lat": None if lat is None else float(lat),
+        "lon": None if lon is None else float(lon),
+        "tags": tags or {},
+    }
+
+
+def iter_json_elements(fh, chunk_size=CHUNK_SIZE):
+    """Yield the members of the top-level ``elements`` array one by one."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    def more():
+        nonlocal buffer, eof
+        chunk = fh.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+    start = re.compile(r'"elements"\s*:\s*\[')
+    while True:
+        match = start.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        if eof:
+            return
+        # Keep a tail in case the key is split across chunks.
+        buffer = buffer[-32:]
+        more()
+
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer) or buffer[pos] != "]":
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely an element cut at the chunk boundary.
+                if eof:
+                    raise
+                buffer, pos = buffer[pos:], 0
+                more()
+                continue
+            pos = end
+            yield _element(value.get("type"), value.get("id"), value.get("lat"), value.get("lon"),
+                           value.get("center"), value.get("tags"))
+        else:
+            return
+
+
+def iter_xml_elements(fh):
+    """Yield nodes, ways and relations of an OSM XML export one by one."""
+    context = ET.iterparse(fh, events=("start", "end"))
+    _, root = next(context)
+    depth = 0
+    for event, elem in context:
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            if elem.tag in ("node", "way", "relation"):
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                center = elem.find("center")
+                yield _element(elem.tag, elem.get("id"), elem.get("lat"), elem.get("lon"),
+                               None if center is None else center.attrib, tags)
+            # Drop everything parsed so far so memory stays flat.
+            root.clear()
+
+
+def iter_elements(path):
+    """Elements of a JSON or XML export (optionally gzipped), by content sniffing."""
+    with _open_text(path) as fh:
+        head = fh.read(1)
+        while head and head.isspace():
+            head = fh.read(1)
+        if head == "{":
+            fh.seek(0)
+            yield from iter_json_elements(fh)
+            return
+    if head != "<":
+        raise ValueError(f"{path}: not an Overpass JSON or XML export")
+    # iterparse reads bytes so the XML declaration's encoding is honoured.
+    with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as fh:
+        yield from iter_xml_elements(fh)
+
+
+# --- Opening hours ---
+def general_window(schedule):
+    """Collapse a weekly schedule into one ``(opening, closing)`` in minutes.
+
+    The window runs from the earliest opening to the latest closing over the
+    week, closings past midnight counting as later than same-day ones, which
+    is how the curated dataset summarized split schedules. A window of a full
+    day or more is ``(0, 1440)``. Returns None if the venue is never open.
+    """
+    spans = [span for spans in schedule.values() for span in spans]
+    if not spans:
+        return None
+    opening = min(start for start, _ in spans)
+    closing = max(end for _, end in spans)
+    if closing - opening >= MINUTES_PER_DAY:
+        return 0, MINUTES_PER_DAY
+    if closing > MINUTES_PER_DAY:
+        closing -= MINUTES_PER_DAY
+    return opening, closing
+
+
+def format_hhmm(minutes):
+    """24h ``HH:MM``; midnight as a closing time is the dataset's 23:59."""
+    if minutes >= MINUTES_PER_DAY:
+        return "23:59"
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# --- Deduplication ---
+class Deduplicator:
+    """Remembers kept venues by OSM id and by (normalized name, grid cell).
+
+    Keys are stored as plain ints (packed ids, hashed names) to keep the
+    per-venue footprint small on city-sized exports.
+    """
+
+    def __init__(self, meters=DEDUP_METERS):
+        self.meters = meters
+        self.cell = max(meters, 1) / METERS_PER_DEGREE
+        self._ids = set()
+        self._names = {}
+
+    def seen_id(self, osm_type, osm_id):
+        key = osm_id * 4 + OSM_TYPES.get(osm_type, 3)
+        if key in self._ids:
+            return True
+        self._ids.add(key)
+        return False
+
+    def seen_nearby(self, name, lat, lon):
+        """True if ``name`` was kept within ``meters``; otherwise remember this one."""
+        name_key = hash(normalize(name))
+        row, col = int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+        # Cells are square in degrees, so a degree of longitude covers fewer
+        # meters and more columns have to be checked.
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        reach = math.ceil(1 / cos_lat)
+        for r in range(row - 1, row + 2):
+            for c in range(col - reach, col + reach + 1):
+                for other_lat, other_lon in self._names.get(hash((name_key, r, c)), ()):
+                    dy = (lat - other_lat) * METERS_PER_DEGREE
+                    dx = (lon - other_lon) * METERS_PER_DEGREE * cos_lat
+                    if dx * dx + dy * dy <= self.meters * self.meters:
+                        return True
+        self._names.setdefault(hash((name_key, row, col)), []).append((lat, lon))
+        return False
+
+
+# --- Writing the dataset ---
+def _write_batch(writer, batch):
+    opening, closing = normalize_hours([r[3] for r in batch], [r[4] for r in batch])
+    flags = [open_during(opening, closing, start * 60, end * 60) for start, end in PERIODS.values()]
+    for i, (amenity, name, website, open_min, close_min, lat, lon, hours) in enumerate(batch):
+        writer.writerow([
+            amenity, name, website, format_hhmm(open_min), format_hhmm(close_min),
+            f"{lat:.7f}", f"{lon:.7f}", *(int(f[i]) for f in flags), hours,
+        ])
+
+
+def ingest(paths, output, amenities=AMENITIES, dedup_meters=DEDUP_METERS,
+           default_hours=None, batch_size=BATCH_SIZE):
+    """Stream ``paths`` into the CSV at ``output``; return per-outcome counts."""
+    amenities = set(amenities)
+    dedup = Deduplicator(dedup_meters)
+    stats = collections.Counter()
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(COLUMNS)
+            batch = []
+            for path in paths:
+                for element in iter_elements(path):
+                    stats["elements"] += 1
+                    tags = element["tags"]
+                    amenity = (tags.get("amenity") or "").strip().lower()
+                    if amenity not in amenities:
+                        stats["other_amenity"] += 1
+                        continue
+                    name = " ".join((tags.get("name") or "").split())
+                    if not name:
+                        stats["no_name"] += 1
+                        continue
+                    if element["lat"] is None:
+                        stats["no_location"] += 1
+                        continue
+                    if dedup.seen_id(element["type"], element["id"]):
+                        stats["duplicate_id"] += 1
+                        continue
+                    hours = " ".join((tags.get("opening_hours") or "").split())
+                    schedule = parse_opening_hours(hours)
+                    window = general_window(schedule) if schedule is not None else default_hours
+                    if window is None:
+                        stats["no_hours" if schedule is None else "never_open"] += 1
+                        continue
+                    if dedup.seen_nearby(name, element["lat"], element["lon"]):
+                        stats["duplicate_nearby"] += 1
+                        continue
+                    website = tags.get("website") or tags.get("contact:website") or tags.get("url") or ""
+                    batch.append((amenity, name, website.strip(), *window, element["lat"], element["lon"],
+                                  hours if schedule is not None else ""))
+                    stats["written"] += 1
+                    if len(batch) >= batch_size:
+                        _write_batch(writer, batch)
+                        batch = []
+            if batch:
+                _write_batch(writer, batch)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return stats
+
+
+def _hours_argument(value):
+    match = re.fullmatch(r"(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})", value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError("expected HH:MM-HH:MM")
+    h0, m0, h1, m1 = (int(v) for v in match.groups())
+    opening, closing = normalize_hours(h0 * 60 + m0, h1 * 60 + m1)
+    return int(opening), int(closing)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the amenities CSV from Overpass exports.")
+    parser.add_argument("inputs", nargs="+", help="Overpass JSON or XML exports (.gz allowed)")
+    parser.add_argument("--output", "-o", required=True)
+    parser.add_argument("--amenities", nargs="+", default=list(AMENITIES))
+    parser.add_argument("--dedup-meters", type=float, default=DEDUP_METERS,
+                        help="same-name venues closer than this are duplicates")
+    parser.add_argument("--default-hours", type=_hours_argument,
+                        help="HH:MM-HH:MM for venues without usable opening_hours (default: skip them)")
+    args = parser.parse_args(argv)
+
+    stats = ingest(args.inputs, args.output, args.amenities, args.dedup_meters, args.default_hours)
+    print(f"Wrote {stats['written']:,} venues to {args.output}")
+    for key, count in sorted(stats.items()):
+        if key != "written":
+            print(f"  {key:<17} {count:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Per-rerun stage timings for the dashboard.
+
+Off unless ``DASHBOARD_PERF`` is set, in which case every rerun records how
+long each named stage took, plus optional row counts and payload sizes:
+
+    DASHBOARD_PERF=1                    # sidebar debug panel only
+    DASHBOARD_PERF_LOG=perf.jsonl       # also append one JSON line per rerun
+    DASHBOARD_PERF_PROM=perf.prom       # also rewrite a Prometheus text file
+
+Setting either file variable turns instrumentation on by itself. The p50/p95
+figures come from a rolling window kept per process, so they cover every
+session served by that process.
+"""
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+WINDOW = 1000
+
+
+def perf_enabled():
+    return bool(
+        os.environ.get("DASHBOARD_PERF")
+        or os.environ.get("DASHBOARD_PERF_LOG")
+        or os.environ.get("DASHBOARD_PERF_PROM")
+    )
+
+
+class StageStats:
+    """Rolling per-stage timings shared by all sessions of a process."""
+
+    def __init__(self, window=WINDOW):
+        self._window = window
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=self._window))
+        self._counts = collections.Counter()
+        self._sums = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+            self._sums[stage] += seconds
+
+    def summary(self):
+        """{stage: {"count", "p50_ms", "p95_ms"}} over the rolling window."""
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self._samples.items()}
+            counts = dict(self._counts)
+            sums = dict(self._sums)
+        return {
+            stage: {
+                "count": counts[stage],
+                "sum_s": sums[stage],
+                "p50_ms": float(np.percentile(values, 50) * 1000),
+                "p95_ms": float(np.percentile(values, 95) * 1000),
+            }
+            for stage, values in samples.items()
+            if len(values)
+        }
+
+    def prometheus(self):
+        lines = [
+            "# HELP dashboard_stage_seconds Dashboard rerun stage duration.",
+            "# TYPE dashboard_stage_seconds summary",
+        ]
+        for stage, s in sorted(self.summary().items()):
+            label = stage.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            lines.append(f'dashboard_stage_seconds{{stage="{label}",quantile="0.5"}} {s["p50_ms"] / 1000:.6f}')
+            lines.append(f'dashboard_stage_seconds{{stage="{label}",quantile="0.95"}} {s["p95_ms"] / 1000:.6f}')
+            lines.append(f'dashboard_stage_seconds_sum{{stage="{label}"}} {s["sum_s"]:.6f}')
+            lines.append(f'dashboard_stage_seconds_count{{stage="{label}"}} {s["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+STATS = StageStats()
+_write_lock = threading.Lock()
+
+
+class RerunTimer:
+    """Collects the stages of one rerun; a no-op when disabled."""
+
+    def __init__(self, session_id=None, enabled=None, stats=STATS, total="total"):
+        self.enabled = perf_enabled() if enabled is None else enabled
+        self.session_id = session_id
+        self.stats = stats
+        self.total = total
+        self.stages = []
+        self.finished = False
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name, **metrics):
+        """Time the ``with`` block; metrics may be added later via the yielded dict."""
+        if not self.enabled:
+            yield metrics
+            return
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            self.stages.append(dict(stage=name, ms=(time.perf_counter() - start) * 1000, **metrics))
+
+    def finish(self):
+        """Record the rerun in the shared stats and the configured files.
+
+        ``total`` names the stat the whole run is counted under, so partial
+        (fragment) reruns do not mix with full ones.
+        """
+        self.finished = True
+        if not self.enabled:
+            return None
+        total_ms = (time.perf_counter() - self._start) * 1000
+        for s in self.stages:
+            self.stats.add(s["stage"], s["ms"] / 1000)
+        self.stats.add(self.total, total_ms / 1000)
+        record = {
+            "ts": time.time(),
+            "session": self.session_id,
+            "rerun": self.total,
+            "total_ms": total_ms,
+            "stages": self.stages,
+        }
+        log_path = os.environ.get("DASHBOARD_PERF_LOG")
+        prom_path = os.environ.get("DASHBOARD_PERF_PROM")
+        with _write_lock:
+            if log_path:
+                with open(log_path, "a") as fh:
+                    fh.write(json.dumps(record) + "\n")
+            if prom_path:
+                tmp_path = f"{prom_path}.tmp"
+                with open(tmp_path, "w") as fh:
+                    fh.write(self.stats.prometheus())
+                os.replace(tmp_path, prom_path)
+        return record
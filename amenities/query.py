@@ -0,0 +1,26 @@
+"""Filter semantics shared by the dashboard and the query service."""
+import numpy as np
+
+from amenities.hours import open_at_hour
+
+
+def filter_mask(df, amenity=None, hour=None, night_only=False, schedule=None, day=None, minute=None,
+                stay_minutes=0):
+    """Boolean mask over ``df`` for the amenity / time / night-only filters.
+
+    ``amenity`` None (or "All") and ``hour`` None leave that filter off. With a
+    ``schedule`` (``amenities.schedule.WeeklySchedule``), ``day`` and
+    ``minute`` select venues open at that weekday and time instead of
+    ``hour``, and ``stay_minutes`` requires them to stay open that long.
+    """
+    if schedule is not None and day is not None and minute is not None:
+        mask = schedule.schedules_open(day, minute, stay_minutes)[schedule.code]
+    elif hour is None:
+        mask = np.ones(len(df), dtype=bool)
+    else:
+        mask = open_at_hour(df["open_hours"].to_numpy(), hour)
+    if amenity not in (None, "All"):
+        mask &= (df["amenity"] == amenity).to_numpy()
+    if night_only:
+        mask &= df["open_night"].to_numpy()
+    return mask
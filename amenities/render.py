@@ -0,0 +1,393 @@
+"""Batch map rendering: every visible venue and cluster in one GeoJSON layer.
+
+Instead of one ``folium.Marker`` + ``Popup`` + ``CustomIcon`` per venue (each
+serialized separately, each icon base64-inlined again), the page gets a single
+FeatureCollection, one icon definition per amenity type and one shared popup
+template that is filled in on click.
+"""
+import base64
+import functools
+import json
+import os
+from urllib.parse import quote
+
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+from amenities import assets
+from amenities.schedule import SLOT_MINUTES, pack_slots
+
+ICONS_DIR = "ICONS"
+ICON_SIZE = 30
+# Playback speed: one 15-minute frame every FRAME_MS, so a day takes 24 s.
+FRAME_MS = 250
+
+AMENITY_COLORS = {
+    "cafe": "#6f4e37",
+    "restaurant": "#d35400",
+    "pub": "#2980b9",
+    "park": "#27ae60",
+}
+DEFAULT_COLOR = "#555555"
+
+
+@functools.lru_cache(maxsize=None)
+def icon_data_uri(amenity, icons_dir=ICONS_DIR):
+    """``ICONS/<amenity>.png``, downsized by ``amenities.assets``, as a data URI (None if missing).
+
+    Read once per process.
+    """
+    path = os.path.join(icons_dir, f"{amenity.lower()}.png")
+    if not os.path.exists(path):
+        return None
+    with open(assets.icon(path), "rb") as fh:
+        return "data:image/png;base64," + base64.b64encode(fh.read()).decode("ascii")
+
+
+def venue_features(frame):
+    """GeoJSON point features for the rows of ``frame``."""
+    lon = np.round(frame["lon"].to_numpy(dtype=np.float64), 6).tolist()
+    lat = np.round(frame["lat"].to_numpy(dtype=np.float64), 6).tolist()
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [x, y]},
+            "properties": {
+                "name": name,
+                "amenity": amenity,
+                "open": opening,
+                "close": closing,
+                # Only web links: a javascript: or data: URL would run on click.
+                "website": quote(website, safe=":/?=&") if website.lower().startswith(("http://", "https://")) else "",
+            },
+        }
+        for x, y, name, amenity, opening, closing, website in zip(
+            lon,
+            lat,
+            frame["name"].tolist(),
+            frame["amenity"].astype(str).tolist(),
+            frame["opening_hour"].tolist(),
+            frame["closing_hour"].tolist(),
+            frame["website"].astype(str).tolist(),
+        )
+    ]
+
+
+def playback_features(frame, open_frames, codes):
+    """``venue_features`` with ``s`` on each, plus the open masks that ``s`` indexes.
+
+    ``open_frames`` is ``[96, n_schedules]`` (``WeeklySchedule.day_frames``)
+    and ``codes`` the schedule code of each row of ``frame``. Only the
+    schedules in view are shipped, three uint32 words each (``pack_slots``).
+    """
+    used, index = np.unique(np.asarray(codes), return_inverse=True)
+    masks = pack_slots(open_frames[:, used].T).tolist()
+    features = venue_features(frame)
+    for feature, s in zip(features, index.tolist()):
+        feature["properties"]["s"] = s
+    return features, masks
+
+
+def cluster_features(clusters):
+    """GeoJSON point features for the bubbles from ``ClusterPyramid.clusters``."""
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(c["lon"], 6), round(c["lat"], 6)]},
+            "properties": {
+                "count": c["count"],
+                "by_amenity": sorted(c["by_amenity"].items(), key=lambda kv: -kv[1]),
+                **({"counts": c["counts"]} if "counts" in c else {}),
+            },
+        }
+        for c in clusters or []
+    ]
+
+
+def _script_json(value):
+    # Compact JSON that is safe to inline inside a <script> block.
+    text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return text.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
+
+# Icons, popup and bubble builders shared by the layers below (inside their
+# script macro, so ``this`` is the layer being rendered).
+_LAYER_HELPERS = """
+            var colors = {{ this.colors }};
+            var iconUrls = {{ this.icons }};
+            var icons = {};
+            Object.keys(iconUrls).forEach(function (amenity) {
+                icons[amenity] = L.icon({
+                    iconUrl: iconUrls[amenity],
+                    iconSize: [{{ this.icon_size }}, {{ this.icon_size }}],
+                });
+            });
+            var fallbackIcon = new L.Icon.Default();
+
+            function esc(value) {
+                return String(value).replace(/[&<>"']/g, function (c) {
+                    return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+                });
+            }
+
+            function popupHtml(p) {
+                return '<div style="font-family: Arial, sans-serif; font-size: 14px; border-radius: 6px; '
+                    + 'overflow: hidden; box-shadow: 0 2px 6px rgba(0,0,0,0.3); width: 220px;">'
+                    + '<div style="background-color: ' + (colors[p.amenity] || "{{ this.default_color }}") + '; '
+                    + 'color: white; padding: 8px 12px; font-weight: bold; font-size: 16px; text-align: center;">'
+                    + esc(p.name) + '</div>'
+                    + '<div style="padding: 8px 12px; color: #333;">'
+                    + '<div>Open: ' + esc(p.open) + ' → ' + esc(p.close) + '</div>'
+                    + (p.website ? '<div style="margin-top: 6px;"><a href="' + esc(p.website) + '" target="_blank" '
+                        + 'style="color:#1E90FF; text-decoration:none;">Website</a></div>' : '')
+                    + '</div></div>';
+            }
+
+            function bubbleIcon(count) {
+                var size = Math.round(28 + 8 * Math.log10(count));
+                return L.divIcon({
+                    className: "",
+                    iconSize: [size, size],
+                    iconAnchor: [size / 2, size / 2],
+                    html: '<div style="width: ' + size + 'px; height: ' + size + 'px; line-height: ' + size + 'px; '
+                        + 'border-radius: 50%; background-color: rgba(211, 84, 0, 0.85); border: 2px solid white; '
+                        + 'color: white; font-family: Arial, sans-serif; font-weight: bold; text-align: center;">'
+                        + count + '</div>',
+                });
+            }
+
+"""
+
+
+class VenueLayer(MacroElement):
+    """All venue markers and cluster bubbles of a view as one ``L.geoJSON`` layer."""
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function () {
+""" + _LAYER_HELPERS + """
+            return L.geoJSON({{ this.data }}, {
+                pointToLayer: function (feature, latlng) {
+                    var p = feature.properties;
+                    if (p.count) {
+                        return L.marker(latlng, {icon: bubbleIcon(p.count)});
+                    }
+                    return L.marker(latlng, {icon: icons[p.amenity] || fallbackIcon});
+                },
+                onEachFeature: function (feature, layer) {
+                    var p = feature.properties;
+                    if (p.count) {
+                        layer.bindTooltip(p.by_amenity.map(function (kv) {
+                            return esc(kv[0]) + ": " + kv[1];
+                        }).join("<br>"));
+                    } else {
+                        layer.bindPopup(function () { return popupHtml(p); }, {maxWidth: 250});
+                    }
+                },
+            }).addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, features):
+        super().__init__()
+        self._name = "VenueLayer"
+        amenities = sorted({f["properties"]["amenity"] for f in features if "amenity" in f["properties"]})
+        icons = {a: icon_data_uri(a) for a in amenities}
+        self.icons = _script_json({a: uri for a, uri in icons.items() if uri})
+        self.colors = _script_json(AMENITY_COLORS)
+        self.default_color = DEFAULT_COLOR
+        self.icon_size = ICON_SIZE
+        self.data = _script_json({"type": "FeatureCollection", "features": features})
+
+
+class PlaybackLayer(VenueLayer):
+    """``VenueLayer`` for a whole day, replayed in the browser with a time slider.
+
+    Venue features carry ``s`` (see ``playback_features``) and bubbles
+    ``counts`` per frame (``ClusterPyramid.cluster_frames``). Scrubbing or
+    playing only shows and hides markers and switches the tile style by
+    hour, so it never reruns the script.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function () {
+""" + _LAYER_HELPERS + """
+            var masks = {{ this.masks }};
+            var tileUrls = {{ this.tile_urls }};
+            var nSlots = 1440 / {{ this.slot_minutes }};
+            var slot = {{ this.start }};
+            var venues = [], bubbles = [];
+            var tiles = null, originalUrl = null, timer = null;
+            var button, slider, label;
+
+            function isOpen(words, s) {
+                return ((words[s >> 5] >>> (s & 31)) & 1) === 1;
+            }
+
+            function hhmm(s) {
+                var minutes = s * {{ this.slot_minutes }};
+                return String(Math.floor(minutes / 60)).padStart(2, "0") + ":" + String(minutes % 60).padStart(2, "0");
+            }
+
+            var layer = L.geoJSON({{ this.data }}, {
+                pointToLayer: function (feature, latlng) {
+                    var p = feature.properties;
+                    var marker;
+                    if (p.counts) {
+                        marker = L.marker(latlng, {icon: bubbleIcon(p.count)});
+                        marker.counts = p.counts;
+                        bubbles.push(marker);
+                    } else {
+                        marker = L.marker(latlng, {icon: icons[p.amenity] || fallbackIcon});
+                        marker.mask = masks[p.s];
+                        venues.push(marker);
+                    }
+                    return marker;
+                },
+                onEachFeature: function (feature, marker) {
+                    var p = feature.properties;
+                    if (p.counts) {
+                        marker.bindTooltip(function () {
+                            return "<b>" + p.counts[slot] + " open at " + hhmm(slot) + "</b><br>"
+                                + p.by_amenity.map(function (kv) {
+                                    return esc(kv[0]) + ": " + kv[1];
+                                }).join("<br>");
+                        });
+                    } else {
+                        marker.bindPopup(function () { return popupHtml(p); }, {maxWidth: 250});
+                    }
+                },
+            });
+
+            function showSlot(s) {
+                slot = s;
+                var open = 0;
+                venues.forEach(function (marker) {
+                    var visible = isOpen(marker.mask, s);
+                    if (visible !== layer.hasLayer(marker)) {
+                        visible ? layer.addLayer(marker) : layer.removeLayer(marker);
+                    }
+                    open += visible;
+                });
+                bubbles.forEach(function (marker) {
+                    var count = marker.counts[s];
+                    if (count && marker.shown !== count) {
+                        marker.setIcon(bubbleIcon(count));
+                        marker.shown = count;
+                    }
+                    if (!!count !== layer.hasLayer(marker)) {
+                        count ? layer.addLayer(marker) : layer.removeLayer(marker);
+                    }
+                    open += count;
+                });
+                var url = tileUrls[Math.floor(s * {{ this.slot_minutes }} / 60)];
+                if (tiles && tiles._url !== url) {
+                    tiles.setUrl(url);
+                }
+                if (slider) {
+                    slider.value = s;
+                    label.textContent = {{ this.day_name }} + " " + hhmm(s) + " · " + open + " open";
+                }
+            }
+
+            function stop() {
+                clearInterval(timer);
+                timer = null;
+                if (button) {
+                    button.textContent = "▶";
+                }
+            }
+
+            function play() {
+                if (slot >= nSlots - 1) {
+                    showSlot(0);
+                }
+                button.textContent = "⏸";
+                timer = setInterval(function () {
+                    if (slot >= nSlots - 1) {
+                        stop();
+                    } else {
+                        showSlot(slot + 1);
+                    }
+                }, {{ this.frame_ms }});
+            }
+
+            var control = L.control({position: "bottomleft"});
+            control.onAdd = function () {
+                var div = L.DomUtil.create("div", "leaflet-bar");
+                div.style.cssText = "background: white; padding: 6px 10px; display: flex; align-items: center; "
+                    + "gap: 8px; font-family: Arial, sans-serif; font-size: 13px;";
+                button = L.DomUtil.create("a", "", div);
+                button.href = "#";
+                button.title = "Play the day";
+                button.style.cssText = "position: static; border: none; width: 24px; height: 24px; line-height: 24px;";
+                slider = L.DomUtil.create("input", "", div);
+                slider.type = "range";
+                slider.min = 0;
+                slider.max = nSlots - 1;
+                slider.style.width = "220px";
+                label = L.DomUtil.create("span", "", div);
+                label.style.minWidth = "150px";
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+                L.DomEvent.on(slider, "input", function () {
+                    stop();
+                    showSlot(Number(slider.value));
+                });
+                L.DomEvent.on(button, "click", function (e) {
+                    L.DomEvent.preventDefault(e);
+                    timer ? stop() : play();
+                });
+                stop();
+                return div;
+            };
+
+            // The slider and the tile switching live as long as the layer is on a map.
+            layer.on("add", function (e) {
+                if (e.target !== layer) {
+                    return;
+                }
+                layer._map.eachLayer(function (l) {
+                    if (l instanceof L.TileLayer) {
+                        tiles = l;
+                    }
+                });
+                originalUrl = tiles && tiles._url;
+                control.addTo(layer._map);
+                showSlot(slot);
+            });
+            layer.on("remove", function (e) {
+                if (e.target !== layer) {
+                    return;
+                }
+                stop();
+                control.remove();
+                if (tiles && tiles._url !== originalUrl) {
+                    tiles.setUrl(originalUrl);
+                }
+                tiles = null;
+            });
+
+            showSlot(slot);
+            return layer.addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, features, masks, start, day_name, tile_urls, frame_ms=FRAME_MS):
+        """``start`` is the first frame shown, ``tile_urls`` the tile URL template for each hour."""
+        super().__init__(features)
+        self._name = "PlaybackLayer"
+        self.masks = _script_json(masks)
+        self.start = int(start)
+        self.day_name = _script_json(day_name)
+        self.tile_urls = _script_json(list(tile_urls))
+        self.slot_minutes = SLOT_MINUTES
+        self.frame_ms = frame_ms
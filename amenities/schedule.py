@@ -0,0 +1,223 @@
+"""Weekly opening schedules as packed 15-minute slot bitsets.
+
+A week is 7 days x 96 slots of 15 minutes; slot ``s`` of day ``d`` is set
+when the venue is open at that slot's start. A day's 96 bits are packed into
+three uint32 words, so one schedule is a ``(7, 3)`` uint32 block (84 bytes).
+
+Venues rarely have unique schedules, so ``WeeklySchedule`` keeps one block
+per *distinct* schedule in ``table`` and a per-venue ``code`` into it. A
+query ("open at day d, slot s", "open throughout an interval") is a few bit
+operations over the table, then one gather by ``code`` for all venues.
+
+Schedules come from an OSM ``opening_hours`` column when the dataset has one
+(see ``amenities.ingest``); otherwise the two-column ``opening``/``closing``
+window repeats every day, which gives the same answers as ``hours.open_at``.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from amenities.hours import MINUTES_PER_DAY, open_at
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = MINUTES_PER_DAY // SLOT_MINUTES
+DAYS = 7
+WORDS_PER_DAY = SLOTS_PER_DAY // 32
+
+WEEKDAYS = ["mo", "tu", "we", "th", "fr", "sa", "su"]
+_DAY = r"(?:mo|tu|we|th|fr|sa|su)"
+_DAYS_RE = re.compile(rf"^{_DAY}(?:-{_DAY})?(?:,{_DAY}(?:-{_DAY})?)*$")
+_SPAN_RE = re.compile(r"^(\d{1,2}):(\d{2})(?:-(\d{1,2}):(\d{2}))?(\+)?$")
+
+
+# --- OSM opening_hours ---
+def _expand_days(selector):
+    days = []
+    for part in selector.split(","):
+        first, _, last = part.partition("-")
+        i = WEEKDAYS.index(first)
+        j = WEEKDAYS.index(last) if last else i
+        while True:
+            days.append(i)
+            if i == j:
+                break
+            i = (i + 1) % 7
+    return days
+
+
+def _parse_spans(text):
+    spans = []
+    for part in text.split(","):
+        match = _SPAN_RE.match(part.strip())
+        if not match:
+            return None
+        h0, m0, h1, m1, open_end = match.groups()
+        start = int(h0) * 60 + int(m0)
+        if h1 is None:
+            if not open_end:
+                return None
+            end = MINUTES_PER_DAY  # "18:00+": open end, read as until midnight
+        else:
+            end = int(h1) * 60 + int(m1)
+        if start >= MINUTES_PER_DAY or int(m0) >= 60 or (m1 and int(m1) >= 60) or end > 2 * MINUTES_PER_DAY:
+            return None
+        if end <= start:
+            end += MINUTES_PER_DAY
+        spans.append((start, end))
+    return spans
+
+
+def parse_opening_hours(text):
+    """Parse an OSM ``opening_hours`` value into ``{weekday: [(start, end), ...]}``.
+
+    Minutes after midnight, weekday 0 is Monday, and ``end`` is past 1440 for
+    spans that run over midnight. Days that are never mentioned are closed.
+    Covers the common subset: weekday ranges and lists, comma separated
+    spans, ``24/7``, ``off``/``closed`` and open ends (``18:00+``). Rules
+    using anything else (months, holidays, sunrise, comments) are skipped;
+    returns None when no rule could be read.
+    """
+    if not text:
+        return None
+    schedule = {}
+    parsed = False
+    for rule in text.split("||")[0].split(";"):
+        rule = " ".join(rule.strip().lower().split())
+        if not rule:
+            continue
+        if rule == "24/7":
+            schedule = {day: [(0, MINUTES_PER_DAY)] for day in range(7)}
+            parsed = True
+            continue
+        head, _, rest = rule.partition(" ")
+        head = head.rstrip(":")
+        if _DAYS_RE.match(head):
+            days, times = _expand_days(head), rest
+        else:
+            days, times = range(7), rule
+        times = times.replace(" ", "")
+        if times in ("off", "closed"):
+            spans = []
+        elif times in ("", "24/7"):
+            spans = [(0, MINUTES_PER_DAY)]
+        else:
+            spans = _parse_spans(times)
+            if spans is None:
+                continue
+        # Later rules replace earlier ones for the days they name.
+        for day in days:
+            schedule[day] = spans
+        parsed = True
+    return schedule if parsed else None
+
+
+# --- Packing ---
+_WEIGHTS = np.uint32(1) << np.arange(32, dtype=np.uint32)
+
+
+def pack_slots(slots):
+    """Pack a ``[..., 96]`` boolean array (days, e.g. ``[..., 7, 96]``) into ``[..., 3]`` uint32 words."""
+    slots = np.asarray(slots, dtype=bool)
+    words = slots.reshape(slots.shape[:-1] + (WORDS_PER_DAY, 32)).astype(np.uint32)
+    return (words * _WEIGHTS).sum(axis=-1, dtype=np.uint32)
+
+
+def slots_from_spans(schedule):
+    """``[7, 96]`` booleans for a parsed weekly schedule (overnight spans spill into the next day)."""
+    week = np.zeros(DAYS * SLOTS_PER_DAY, dtype=bool)
+    for day, spans in schedule.items():
+        for start, end in spans:
+            first = day * SLOTS_PER_DAY + -(-start // SLOT_MINUTES)
+            last = day * SLOTS_PER_DAY + -(-end // SLOT_MINUTES)
+            idx = np.arange(first, last) % (DAYS * SLOTS_PER_DAY)
+            week[idx] = True
+    return week.reshape(DAYS, SLOTS_PER_DAY)
+
+
+def slots_from_window(opening, closing):
+    """``[len, 7, 96]`` booleans for normalized daily windows repeated every day."""
+    minutes = np.arange(SLOTS_PER_DAY, dtype=np.int16) * SLOT_MINUTES
+    day = open_at(np.asarray(opening)[:, None], np.asarray(closing)[:, None], minutes[None, :])
+    return np.repeat(day[:, None, :], DAYS, axis=1)
+
+
+class WeeklySchedule:
+    def __init__(self, table, code):
+        self.table = np.asarray(table, dtype=np.uint32)
+        self.code = np.asarray(code, dtype=np.int32)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from the frame's ``opening_min``/``closing_min`` and optional ``opening_hours``."""
+        # One int64 key per venue: (text code, opening, closing); factorizing
+        # it is much cheaper than factorizing the columns as tuples.
+        key = df["opening_min"].to_numpy().astype(np.int64) * 2048 + df["closing_min"].to_numpy()
+        texts = None
+        if "opening_hours" in df:
+            text_code, texts = pd.factorize(df["opening_hours"].fillna("").astype(str))
+            key = key + text_code.astype(np.int64) * (2048 * 2048)
+        code, uniques = pd.factorize(key)
+        opening, closing = (uniques // 2048) % 2048, uniques % 2048
+
+        slots = slots_from_window(opening, closing)
+        if texts is not None:
+            for i, text_code in enumerate(uniques // (2048 * 2048)):
+                parsed = parse_opening_hours(texts[text_code])
+                if parsed is not None:
+                    slots[i] = slots_from_spans(parsed)
+        return cls(pack_slots(slots), code)
+
+    def __len__(self):
+        return len(self.code)
+
+    @staticmethod
+    def slot_of(minute):
+        return int(minute) // SLOT_MINUTES
+
+    def schedules_open_at(self, day, slot):
+        """Boolean per distinct schedule (index with ``code``): slot ``slot`` of ``day`` is set."""
+        day, slot = (day + slot // SLOTS_PER_DAY) % DAYS, slot % SLOTS_PER_DAY
+        return (self.table[:, day, slot >> 5] >> np.uint32(slot & 31)) & np.uint32(1) != 0
+
+    def schedules_open_throughout(self, day, slot, n_slots):
+        """Boolean per distinct schedule: open for all of ``n_slots`` from ``slot`` of ``day``.
+
+        The interval may run past midnight into the following days.
+        """
+        result = np.ones(len(self.table), dtype=bool)
+        start = day * SLOTS_PER_DAY + slot
+        # Whole 32-slot words are checked at once against a mask of the
+        # slots they contain.
+        pos, end = start, start + max(int(n_slots), 1)
+        while pos < end:
+            week_pos = pos % (DAYS * SLOTS_PER_DAY)
+            d, s = divmod(week_pos, SLOTS_PER_DAY)
+            word, bit = divmod(s, 32)
+            take = min(32 - bit, end - pos)
+            need = np.uint32(((1 << take) - 1) << bit)
+            result &= (self.table[:, d, word] & need) == need
+            pos += take
+        return result
+
+    def schedules_open(self, day, minute, stay_minutes=0):
+        """Boolean per distinct schedule: open at ``minute`` on ``day`` (for ``stay_minutes`` if given)."""
+        slot = self.slot_of(minute)
+        if stay_minutes:
+            return self.schedules_open_throughout(day, slot, -(-int(stay_minutes) // SLOT_MINUTES))
+        return self.schedules_open_at(day, slot)
+
+    def day_frames(self, day, stay_minutes=0):
+        """Boolean ``[96, n_schedules]``: ``schedules_open`` for every 15-minute slot of ``day``."""
+        return np.stack([
+            self.schedules_open(day, slot * SLOT_MINUTES, stay_minutes) for slot in range(SLOTS_PER_DAY)
+        ])
+
+    def open_at(self, day, minute):
+        """Boolean per venue: open at ``minute`` after midnight on ``day`` (0 = Monday)."""
+        return self.schedules_open_at(day, self.slot_of(minute))[self.code]
+
+    def open_throughout(self, day, minute, duration):
+        """Boolean per venue: open from ``minute`` on ``day`` for ``duration`` minutes."""
+        n_slots = -(-max(int(duration), 1) // SLOT_MINUTES)
+        return self.schedules_open_throughout(day, self.slot_of(minute), n_slots)[self.code]
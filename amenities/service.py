@@ -0,0 +1,273 @@
+"""Headless amenity query service.
+
+    python -m amenities.service --port 8765 --workers 16
+
+Serves the dashboard's filters (amenity type, hour or weekday and time,
+night-only, bounding box, limit) as JSON or GeoJSON over HTTP. The dataset,
+grid index, weekly schedules and filter code are the ones the dashboard
+uses; they are loaded once and shared read-only by a pool of worker threads.
+
+    GET /venues?amenity=bar&hour=22&night=1&bbox=44.42,26.09,44.44,26.11&limit=300&format=geojson
+    GET /venues?day=fr&time=23:30&stay=60
+    GET /health
+
+``bbox`` is ``lat_min,lon_min,lat_max,lon_max``. ``day`` (0-6 or mo..su) with
+``time`` (``HH:MM``, 15-minute resolution) replaces ``hour``; ``stay`` asks
+for venues still open that many minutes later. Responses are cached by
+their normalized query parameters, in an LRU capped at ``--cache-mb``, and
+carry an ``ETag`` (answering ``If-None-Match`` with 304) plus
+``Cache-Control``.
+"""
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from amenities.data import CSV_PATH, dataset_version, load_amenities
+from amenities.query import filter_mask
+from amenities.render import venue_features
+from amenities.schedule import SLOT_MINUTES, WEEKDAYS, WeeklySchedule
+from amenities.spatial import GridIndex
+
+DEFAULT_LIMIT = 300
+MAX_LIMIT = 5000
+# Bodies run up to MAX_LIMIT venues, so the response cache is capped by size.
+CACHE_BYTES = 64 * 1024 * 1024
+MAX_AGE = 60
+# Idle keep-alive connections are closed after this many seconds, so they
+# cannot hold on to a pool worker.
+KEEPALIVE_TIMEOUT = 2
+
+
+class QueryError(ValueError):
+    """Invalid query parameters; reported to the client as 400."""
+
+
+class AmenityQueryService:
+    def __init__(self, csv_path=CSV_PATH, cache_bytes=CACHE_BYTES):
+        self.df = load_amenities(csv_path)
+        self.version = dataset_version(csv_path)
+        self.index = GridIndex(self.df["lat"].to_numpy(), self.df["lon"].to_numpy())
+        self.schedule = WeeklySchedule.from_frame(self.df)
+        self.amenities = set(self.df["amenity"].cat.categories)
+        self._cache = collections.OrderedDict()
+        self.cache_bytes = 0
+        self.max_cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+
+    def normalize(self, params):
+        """Validate raw query parameters into a canonical, hashable tuple."""
+        def one(name, default=None):
+            values = params.get(name)
+            return values[-1].strip() if values else default
+
+        amenity = one("amenity")
+        amenity = None if amenity in (None, "", "all", "All") else amenity.lower()
+        if amenity is not None and amenity not in self.amenities:
+            raise QueryError(f"unknown amenity {amenity!r}")
+
+        hour = one("hour")
+        if hour not in (None, ""):
+            try:
+                hour = int(hour)
+            except ValueError:
+                raise QueryError("hour must be an integer 0-23") from None
+            if not 0 <= hour <= 23:
+                raise QueryError("hour must be an integer 0-23")
+        else:
+            hour = None
+
+        day, minute, stay = one("day"), one("time"), one("stay")
+        if minute:
+            if hour is not None:
+                raise QueryError("use either hour or day and time")
+            if day in (None, ""):
+                raise QueryError("time needs a day")
+            day = day.lower()[:2]
+            if day.isdigit() and 0 <= int(day) <= 6:
+                day = int(day)
+            elif day in WEEKDAYS:
+                day = WEEKDAYS.index(day)
+            else:
+                raise QueryError("day must be 0-6 or mo, tu, we, th, fr, sa, su")
+            try:
+                h, m = (int(v) for v in minute.split(":"))
+            except ValueError:
+                raise QueryError("time must be HH:MM") from None
+            if not (0 <= h <= 23 and 0 <= m <= 59):
+                raise QueryError("time must be HH:MM")
+            # Round down to the schedule resolution so equivalent queries share a cache entry.
+            minute = (h * 60 + m) // SLOT_MINUTES * SLOT_MINUTES
+            try:
+                stay = max(0, min(int(stay or 0), 7 * 24 * 60))
+            except ValueError:
+                raise QueryError("stay must be a number of minutes") from None
+        elif day not in (None, "") or stay not in (None, ""):
+            raise QueryError("day and stay need a time")
+        else:
+            day = minute = None
+            stay = 0
+
+        night = one("night", "0").lower() in ("1", "true", "yes")
+
+        bbox = one("bbox")
+        if bbox:
+            try:
+                lat_min, lon_min, lat_max, lon_max = (round(float(v), 6) for v in bbox.split(","))
+            except ValueError:
+                raise QueryError("bbox must be lat_min,lon_min,lat_max,lon_max") from None
+            if lat_min > lat_max or lon_min > lon_max:
+                raise QueryError("bbox minimums must not exceed maximums")
+            bbox = (lat_min, lat_max, lon_min, lon_max)
+        else:
+            bbox = None
+
+        try:
+            limit = int(one("limit", DEFAULT_LIMIT))
+        except ValueError:
+            raise QueryError("limit must be an integer") from None
+        limit = max(0, min(limit, MAX_LIMIT))
+
+        fmt = one("format", "json").lower()
+        if fmt not in ("json", "geojson"):
+            raise QueryError("format must be json or geojson")
+        return amenity, hour, day, minute, stay, night, bbox, limit, fmt
+
+    def query(self, key):
+        """Return ``(body bytes, etag)`` for a normalized key, from cache when possible."""
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        amenity, hour, day, minute, stay, night, bbox, limit, fmt = key
+        mask = filter_mask(self.df, amenity, hour, night, self.schedule, day, minute, stay)
+        rows = self.index.query(bbox, mask=mask, limit=limit)
+        frame = self.df.iloc[rows]
+        if fmt == "geojson":
+            payload = {"type": "FeatureCollection", "features": venue_features(frame)}
+        else:
+            payload = {
+                "count": len(frame),
+                "venues": [
+                    {
+                        "name": name,
+                        "amenity": a,
+                        "lat": round(float(lat), 6),
+                        "lon": round(float(lon), 6),
+                        "opening_hour": opening,
+                        "closing_hour": closing,
+                        "website": website,
+                    }
+                    for name, a, lat, lon, opening, closing, website in zip(
+                        frame["name"], frame["amenity"].astype(str), frame["lat"], frame["lon"],
+                        frame["opening_hour"], frame["closing_hour"], frame["website"],
+                    )
+                ],
+            }
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(f"{self.version}|{key!r}".encode()).hexdigest()[:20] + '"'
+
+        with self._lock:
+            old = self._cache.pop(key, None)
+            if old is not None:  # another worker answered the same query meanwhile
+                self.cache_bytes -= len(old[0])
+            self._cache[key] = (body, etag)
+            self.cache_bytes += len(body)
+            while self.cache_bytes > self.max_cache_bytes:
+                evicted, _ = self._cache.popitem(last=False)[1]
+                self.cache_bytes -= len(evicted)
+        return body, etag
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "AmenityQuery/1.0"
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    timeout = KEEPALIVE_TIMEOUT
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            return self._send(200, b'{"status":"ok"}')
+        if url.path != "/venues":
+            return self._send(404, b'{"error":"not found"}')
+
+        service = self.server.service
+        try:
+            key = service.normalize(parse_qs(url.query))
+        except QueryError as e:
+            return self._send(400, json.dumps({"error": str(e)}).encode("utf-8"))
+        body, etag = service.query(key)
+
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={MAX_AGE}"}
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", headers)
+        content_type = "application/geo+json" if key[-1] == "geojson" else "application/json"
+        return self._send(200, body, headers, content_type)
+
+    def _send(self, status, body, headers=None, content_type="application/json"):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class QueryServer(ThreadingHTTPServer):
+    """HTTP server handing connections to a fixed pool of worker threads."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, service, workers=16, verbose=False):
+        super().__init__(address, QueryHandler)
+        self.service = service
+        self.verbose = verbose
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the amenity filters as a JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--cache-mb", type=int, default=CACHE_BYTES // (1024 * 1024),
+                        help="response cache size limit")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    service = AmenityQueryService(args.csv, args.cache_mb * 1024 * 1024)
+    server = QueryServer((args.host, args.port), service, args.workers, args.verbose)
+    print(f"Serving {args.csv} on http://{args.host}:{server.server_port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Uniform grid index over venue coordinates for viewport queries.
+
+Rows are bucketed into an ``nx`` x ``ny`` grid and stored sorted by cell
+(CSR layout: ``order`` holds row positions, ``cell_start`` the offsets), so a
+bounding box touches one contiguous slice per grid row it spans. Work is
+proportional to the cells and venues inside the box, not to the table size.
+Nearest-venue queries reuse the same boxes, growing them around the point
+until enough matches are found.
+"""
+import numpy as np
+
+# Aim for this many venues per grid cell on average.
+VENUES_PER_CELL = 8
+MAX_CELLS_PER_AXIS = 1024
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEGREE = EARTH_RADIUS_M * np.pi / 180
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters; arguments broadcast like NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def box_around(lat, lon, radius_m):
+    """``(lat_min, lat_max, lon_min, lon_max)`` containing every point within ``radius_m``."""
+    dlat = radius_m / METERS_PER_DEGREE
+    # Use the narrowest longitude degree inside the band so the box never
+    # cuts off a point that is within the radius.
+    cos_lat = max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+    dlon = dlat / cos_lat
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+class GridIndex:
+    def __init__(self, lat, lon, cells_per_axis=None):
+        self.lat = np.asarray(lat, dtype=np.float32)
+        self.lon = np.asarray(lon, dtype=np.float32)
+        n = len(self.lat)
+        if cells_per_axis is None:
+            cells_per_axis = int(np.sqrt(max(n, 1) / VENUES_PER_CELL))
+        self.nx = self.ny = int(np.clip(cells_per_axis, 1, MAX_CELLS_PER_AXIS))
+
+        if n:
+            self.lat_min, self.lat_max = float(self.lat.min()), float(self.lat.max())
+            self.lon_min, self.lon_max = float(self.lon.min()), float(self.lon.max())
+        else:
+            self.lat_min = self.lat_max = self.lon_min = self.lon_max = 0.0
+        # Pad so the max coordinate still falls inside the last cell.
+        self.lat_step = max(self.lat_max - self.lat_min, 1e-9) / self.ny * (1 + 1e-6)
+        self.lon_step = max(self.lon_max - self.lon_min, 1e-9) / self.nx * (1 + 1e-6)
+
+        cell = self._row(self.lat) * self.nx + self._col(self.lon)
+        self.order = np.argsort(cell, kind="stable").astype(np.int64)
+        counts = np.bincount(cell, minlength=self.nx * self.ny)
+        self.cell_start = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def _row(self, lat):
+        return np.clip(((lat - self.lat_min) / self.lat_step).astype(np.int64), 0, self.ny - 1)
+
+    def _col(self, lon):
+        return np.clip(((lon - self.lon_min) / self.lon_step).astype(np.int64), 0, self.nx - 1)
+
+    def within(self, lat_min, lat_max, lon_min, lon_max):
+        """Row positions of all venues inside the box, in grid order."""
+        if lat_min > self.lat_max or lat_max < self.lat_min or lon_min > self.lon_max or lon_max < self.lon_min:
+            return np.empty(0, dtype=np.int64)
+        r0, r1 = self._row(np.float64(lat_min)), self._row(np.float64(lat_max))
+        c0, c1 = self._col(np.float64(lon_min)), self._col(np.float64(lon_max))
+        slices = [
+            self.order[self.cell_start[r * self.nx + c0]:self.cell_start[r * self.nx + c1 + 1]]
+            for r in range(r0, r1 + 1)
+        ]
+        rows = np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+        lat, lon = self.lat[rows], self.lon[rows]
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return rows[inside]
+
+    def query(self, bounds=None, mask=None, limit=None):
+        """Venues inside ``bounds`` that pass ``mask``, capped at ``limit``.
+
+        ``bounds`` is ``(lat_min, lat_max, lon_min, lon_max)`` or None for the
+        whole table, and ``mask`` a boolean array over all rows (the amenity
+        and hour filters). Past the cap, venues are picked round-robin over a
+        sub-grid of the box so the result covers the viewport evenly instead
+        of following file order.
+        """
+        if bounds is None:
+            bounds = (self.lat_min, self.lat_max, self.lon_min, self.lon_max)
+            rows = self.order
+        else:
+            rows = self.within(*bounds)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        if limit is None or len(rows) <= limit:
+            return np.sort(rows)
+        return np.sort(spread(rows, self.lat[rows], self.lon[rows], bounds, limit))
+
+    def nearest(self, lat, lon, k=10, radius_m=1000, mask=None):
+        """The ``k`` venues closest to ``(lat, lon)`` within ``radius_m`` that pass ``mask``.
+
+        Returns ``(rows, distances in meters)`` sorted by distance. The search
+        box starts at about one grid cell and doubles until it holds ``k``
+        matches no farther than its inscribed radius (so nothing outside it
+        can be closer) or reaches ``radius_m``; only venues in the final box
+        get a haversine distance.
+        """
+        cell_m = min(self.lat_step, self.lon_step * np.cos(np.radians(lat))) * METERS_PER_DEGREE
+        search_m = min(max(cell_m, 1.0), radius_m)
+        while True:
+            rows = self.within(*box_around(lat, lon, search_m))
+            if mask is not None:
+                rows = rows[mask[rows]]
+            dist = haversine_m(lat, lon, self.lat[rows], self.lon[rows])
+            if search_m >= radius_m or np.count_nonzero(dist <= search_m) >= k:
+                break
+            search_m = min(search_m * 2, radius_m)
+
+        keep = dist <= min(search_m, radius_m)
+        rows, dist = rows[keep], dist[keep]
+        if len(rows) > k:
+            top = np.argpartition(dist, k - 1)[:k]
+            rows, dist = rows[top], dist[top]
+        order = np.lexsort((rows, dist))
+        return rows[order], dist[order]
+
+
+def spread(rows, lat, lon, bounds, limit):
+    """Pick ``limit`` of ``rows`` spread evenly over ``bounds``."""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    side = max(int(np.sqrt(limit)), 1)
+    by = ((lat - lat_min) / max(lat_max - lat_min, 1e-9) * side).astype(np.int64).clip(0, side - 1)
+    bx = ((lon - lon_min) / max(lon_max - lon_min, 1e-9) * side).astype(np.int64).clip(0, side - 1)
+    bucket = by * side + bx
+
+    # Rank each venue within its bucket, then take rank 0 of every bucket,
+    # then rank 1, ... until the cap is reached.
+    by_bucket = np.argsort(bucket, kind="stable")
+    sorted_buckets = bucket[by_bucket]
+    first = np.searchsorted(sorted_buckets, sorted_buckets, side="left")
+    rank = np.empty(len(rows), dtype=np.int64)
+    rank[by_bucket] = np.arange(len(rows)) - first
+    pick = np.lexsort((bucket, rank))[:limit]
+    return rows[pick]
+
+
+def bounds_from_leaflet(bounds):
+    """Convert a Leaflet/st_folium ``bounds`` dict to ``(lat_min, lat_max, lon_min, lon_max)``.
+
+    Returns None when the map has not reported its bounds yet.
+    """
+    box = (
+        bounds["_southWest"]["lat"],
+        bounds["_northEast"]["lat"],
+        bounds["_southWest"]["lng"],
+        bounds["_northEast"]["lng"],
+    )
+    return None if any(v is None for v in box) else box
+
+
+# Pans smaller than this fraction of the viewport do not trigger a new query.
+PAN_THRESHOLD = 0.15
+
+
+def viewport_moved(old, new, threshold=PAN_THRESHOLD):
+    """True if ``new`` bounds differ from ``old`` by more than ``threshold`` of the view."""
+    if old is None or new is None:
+        return old is not new
+    lat_span = max(old[1] - old[0], 1e-9)
+    lon_span = max(old[3] - old[2], 1e-9)
+    return (
+        abs(new[0] - old[0]) > threshold * lat_span
+        or abs(new[1] - old[1]) > threshold * lat_span
+        or abs(new[2] - old[2]) > threshold * lon_span
+        or abs(new[3] - old[3]) > threshold * lon_span
+    )
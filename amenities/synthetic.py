@@ -0,0 +1,105 @@
+"""Synthetic amenity datasets with the same schema as ``Amneties_Final.csv``.
+
+Venues are scattered around a few Bucharest hot spots (the old town, the
+north, the east and west boroughs) with a thin uniform background, the
+amenity mix follows the curated dataset, and about a quarter of the venues
+stay open past midnight, including the 23:59 and 24h conventions.
+"""
+import numpy as np
+import pandas as pd
+
+from amenities.data import PERIODS
+from amenities.hours import normalize_hours, open_during
+
+CITY_CENTER = (44.4268, 26.1025)
+
+# (lat, lon, spread in degrees, share of venues)
+HOT_SPOTS = [
+    (44.4316, 26.1003, 0.012, 0.35),  # old town
+    (44.4469, 26.0978, 0.015, 0.20),  # Romana / Victoriei
+    (44.4700, 26.0850, 0.020, 0.15),  # north
+    (44.4300, 26.0400, 0.030, 0.10),  # west
+    (44.4350, 26.1600, 0.030, 0.10),  # east
+]
+BACKGROUND_SHARE = 0.10
+BACKGROUND_RADIUS = 0.12
+
+AMENITY_MIX = {
+    "restaurant": 0.52,
+    "cafe": 0.31,
+    "bar": 0.056,
+    "pub": 0.048,
+    "nightclub": 0.031,
+    "theatre": 0.019,
+    "cinema": 0.016,
+}
+
+# (opening hours, closing hours) choices per schedule kind, in whole hours;
+# 24 stands for the dataset's "23:59".
+SCHEDULES = {
+    "day": ([7, 8, 9, 10, 11, 12], [16, 17, 18, 20, 22, 23]),
+    "late": ([10, 11, 12, 16, 18], [0, 1, 2, 3, 4, 5]),
+    "night": ([20, 21, 22, 23], [3, 4, 5, 6, 7]),
+    "always": ([0], [24]),
+}
+SCHEDULE_MIX = {"day": 0.72, "late": 0.18, "night": 0.05, "always": 0.05}
+
+
+def _coordinates(rng, n):
+    shares = np.array([s[3] for s in HOT_SPOTS] + [BACKGROUND_SHARE])
+    spot = rng.choice(len(shares), size=n, p=shares / shares.sum())
+    lat = np.empty(n)
+    lon = np.empty(n)
+    for i, (slat, slon, spread, _) in enumerate(HOT_SPOTS):
+        sel = spot == i
+        lat[sel] = rng.normal(slat, spread, sel.sum())
+        # A degree of longitude is ~0.71 of a degree of latitude here.
+        lon[sel] = rng.normal(slon, spread / 0.71, sel.sum())
+    sel = spot == len(HOT_SPOTS)
+    lat[sel] = CITY_CENTER[0] + rng.uniform(-1, 1, sel.sum()) * BACKGROUND_RADIUS
+    lon[sel] = CITY_CENTER[1] + rng.uniform(-1, 1, sel.sum()) * BACKGROUND_RADIUS / 0.71
+    return lat.round(7), lon.round(7)
+
+
+def _hours(rng, n):
+    kinds = list(SCHEDULE_MIX)
+    kind = rng.choice(len(kinds), size=n, p=list(SCHEDULE_MIX.values()))
+    opening = np.empty(n, dtype=np.int64)
+    closing = np.empty(n, dtype=np.int64)
+    for i, name in enumerate(kinds):
+        sel = kind == i
+        opens, closes = SCHEDULES[name]
+        opening[sel] = rng.choice(opens, sel.sum())
+        closing[sel] = rng.choice(closes, sel.sum())
+    opening_hhmm = [f"{h:02d}:00" for h in opening]
+    closing_hhmm = ["23:59" if h == 24 else f"{h:02d}:00" for h in closing]
+    return opening_hhmm, closing_hhmm, opening * 60, np.where(closing == 24, 23 * 60 + 59, closing * 60)
+
+
+def generate(n, seed=0):
+    """A DataFrame of ``n`` synthetic venues in the curated CSV's schema."""
+    rng = np.random.default_rng(seed)
+    amenity = rng.choice(list(AMENITY_MIX), size=n, p=np.array(list(AMENITY_MIX.values())) / sum(AMENITY_MIX.values()))
+    lat, lon = _coordinates(rng, n)
+    opening_hhmm, closing_hhmm, opening, closing = _hours(rng, n)
+    ids = np.arange(n)
+
+    df = pd.DataFrame({
+        "amenity": amenity,
+        "name": [f"{a.title()} {i}" for a, i in zip(amenity, ids)],
+        "website": [f"https://example.com/venue/{i}" for i in ids],
+        "opening_hour": opening_hhmm,
+        "closing_hour": closing_hhmm,
+        "lat": lat,
+        "lon": lon,
+    })
+    opening, closing = normalize_hours(opening, closing)
+    for column, period in zip(("open_dawn", "open_day", "open_dusk", "open_night"), PERIODS):
+        start, end = PERIODS[period]
+        df[column] = open_during(opening, closing, start * 60, end * 60).astype(np.int8)
+    return df
+
+
+def write_csv(path, n, seed=0):
+    generate(n, seed=seed).to_csv(path, index=False)
+    return path
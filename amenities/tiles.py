@@ -0,0 +1,354 @@
+"""Caching tile proxy for the four Mapbox map styles.
+
+    python -m amenities.tiles serve --port 8766
+    python -m amenities.tiles prefetch --zooms 11-17 --workers 16
+    TILE_PROXY_URL=http://localhost:8766 streamlit run dashboard.py
+
+The proxy answers ``/tiles/<style>/<z>/<x>/<y>`` (style is dawn, day, dusk or
+night) from a disk-backed LRU cache (SQLite, capped at ``TILE_CACHE_MB``) and
+fetches misses from the upstream server once, even when several browsers
+ask for the same tile at the same time. The access token stays on the
+server: the page only sees proxy URLs. It is read from ``MAPBOX_TOKEN``
+only; without it, building a Mapbox URL raises ``MissingTokenError``.
+``prefetch`` warms the cache for the Bucharest bounding box with concurrent
+downloads.
+
+``TILE_UPSTREAM`` overrides the upstream URL template (fields ``{style}``,
+``{style_id}``, ``{user}``, ``{token}``, ``{z}``, ``{x}``, ``{y}``), for
+example to point at a local stand-in tile server. Keep prefetching within
+the tile provider's terms of use.
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from amenities.clusters import mercator_pixels
+
+MAPBOX_USER = "alexaval"
+MAPBOX_TOKEN = os.environ.get("MAPBOX_TOKEN")
+STYLE_IDS = {
+    "dawn": "cmbrv82lu00z101qwbhjn0k8a",
+    "day": "cmbrvisot00uk01qx04914c3i",
+    "dusk": "cmbrut16a010u01sc784d2857",
+    "night": "cmbru8b5v00yu01r030sw4ack",
+}
+# Plain OpenStreetMap tiles for the dashboard when there is neither a token nor a proxy.
+FALLBACK_URL = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+FALLBACK_ATTRIBUTION = '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+UPSTREAM_URL = os.environ.get(
+    "TILE_UPSTREAM",
+    "https://api.mapbox.com/styles/v1/{user}/{style_id}/tiles/{z}/{x}/{y}?access_token={token}",
+)
+
+CACHE_PATH = os.path.join(".cache", "tiles.sqlite")
+MAX_BYTES = int(os.environ.get("TILE_CACHE_MB", 2048)) * 1024 * 1024
+# Hits refresh a tile's LRU timestamp at most this often, so most hits are reads only.
+TOUCH_INTERVAL = 60
+TIMEOUT = (3.05, 15)
+MAX_AGE = 7 * 24 * 3600
+
+# (lat_min, lat_max, lon_min, lon_max), the city inside the A0 ring road and a bit more.
+BUCHAREST_BBOX = (44.34, 44.54, 25.96, 26.24)
+PREFETCH_ZOOMS = range(11, 18)
+
+_TILE_PATH = re.compile(r"^/tiles/(\w+)/(\d+)/(\d+)/(\d+)(?:\.\w+)?$")
+
+
+class MissingTokenError(RuntimeError):
+    """A Mapbox style was requested without ``MAPBOX_TOKEN`` in the environment."""
+
+
+def check_token(template=UPSTREAM_URL):
+    """Raise ``MissingTokenError`` if ``template`` needs an access token and none is set."""
+    if "{token}" in template and not MAPBOX_TOKEN:
+        raise MissingTokenError("MAPBOX_TOKEN is not set; export a Mapbox access token to load the map styles")
+
+
+def _style_url(template, style, z, x, y):
+    check_token(template)
+    return template.format(
+        user=MAPBOX_USER, style=style, style_id=STYLE_IDS[style], token=MAPBOX_TOKEN, z=z, x=x, y=y
+    )
+
+
+def mapbox_url(style):
+    """Direct Mapbox URL template for a style, as used without the proxy."""
+    return _style_url(UPSTREAM_URL, style, "{z}", "{x}", "{y}")
+
+
+def proxy_url(base, style):
+    """Leaflet URL template for a style served by the proxy at ``base``."""
+    return f"{base.rstrip('/')}/tiles/{style}/{{z}}/{{x}}/{{y}}"
+
+
+def tiles_in(bounds, zoom):
+    """Every ``(x, y)`` tile covering ``(lat_min, lat_max, lon_min, lon_max)`` at ``zoom``."""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    x0, y1 = mercator_pixels(lat_min, lon_min, zoom)
+    x1, y0 = mercator_pixels(lat_max, lon_max, zoom)
+    last = (1 << zoom) - 1
+    xs = range(max(int(x0 // 256), 0), min(int(x1 // 256), last) + 1)
+    ys = range(max(int(y0 // 256), 0), min(int(y1 // 256), last) + 1)
+    return [(x, y) for x in xs for y in ys]
+
+
+class TileCache:
+    """``style/z/x/y`` -> tile bytes, evicting least recently used tiles past ``max_bytes``."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        self.path, self.max_bytes = path, max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tiles"
+                " (key TEXT PRIMARY KEY, content_type TEXT, data BLOB, size INTEGER, accessed REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed)")
+            self.total_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:  # commits on success
+                yield db
+        finally:
+            db.close()
+
+    def __contains__(self, key):
+        with self._connect() as db:
+            return db.execute("SELECT 1 FROM tiles WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key):
+        """``(data, content_type)`` or None."""
+        with self._connect() as db:
+            row = db.execute("SELECT data, content_type, accessed FROM tiles WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[2] > TOUCH_INTERVAL:
+                db.execute("UPDATE tiles SET accessed = ? WHERE key = ?", (now, key))
+        return bytes(row[0]), row[1]
+
+    def put(self, key, data, content_type):
+        with self._lock, self._connect() as db:
+            old = db.execute("SELECT size FROM tiles WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?)",
+                (key, content_type, sqlite3.Binary(data), len(data), time.time()),
+            )
+            self.total_bytes += len(data) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict(db)
+
+    def _evict(self, db):
+        # Drop the oldest tiles down to 90% of the cap, so eviction runs in batches.
+        target = int(self.max_bytes * 0.9)
+        freed, keys = 0, []
+        for key, size in db.execute("SELECT key, size FROM tiles ORDER BY accessed"):
+            if self.total_bytes - freed <= target:
+                break
+            keys.append((key,))
+            freed += size
+        db.executemany("DELETE FROM tiles WHERE key = ?", keys)
+        self.total_bytes -= freed
+
+
+class TileFetcher:
+    """Upstream downloads with one connection pool per thread and one request per tile in flight."""
+
+    def __init__(self, cache, url=UPSTREAM_URL, timeout=TIMEOUT):
+        self.cache, self.url, self.timeout = cache, url, timeout
+        self._local = threading.local()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def upstream(self, style, z, x, y):
+        return _style_url(self.url, style, z, x, y)
+
+    def get(self, style, z, x, y):
+        """``(data, content_type, hit)``; data is None if upstream has no such tile."""
+        key = f"{style}/{z}/{x}/{y}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            # Someone else is downloading this tile; wait and read it from the cache.
+            event.wait(self.timeout[0] + self.timeout[1])
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[0], cached[1], True
+
+        try:
+            response = self._session().get(self.upstream(style, z, x, y), timeout=self.timeout)
+            if response.status_code == 404:
+                return None, None, False
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "image/png")
+            self.cache.put(key, response.content, content_type)
+            return response.content, content_type, False
+        finally:
+            if leader:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "TileProxy/1.0"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send(200, b'{"status":"ok"}', "application/json")
+        match = _TILE_PATH.match(self.path.split("?", 1)[0])
+        if not match or match.group(1) not in STYLE_IDS:
+            return self._send(404, b"not found", "text/plain")
+        style = match.group(1)
+        z, x, y = (int(v) for v in match.groups()[1:])
+        if z > 22 or x >= (1 << z) or y >= (1 << z):
+            return self._send(404, b"not found", "text/plain")
+
+        try:
+            data, content_type, hit = self.server.fetcher.get(style, z, x, y)
+        except (requests.RequestException, MissingTokenError) as e:
+            return self._send(502, f"upstream error: {e}".encode("utf-8"), "text/plain")
+        if data is None:
+            return self._send(404, b"not found", "text/plain")
+
+        etag = '"' + hashlib.sha1(data).hexdigest()[:20] + '"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={MAX_AGE}",
+            "X-Cache": "HIT" if hit else "MISS",
+        }
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", None, headers)
+        return self._send(200, data, content_type, headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class TileProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, fetcher, verbose=False):
+        super().__init__(address, TileHandler)
+        self.fetcher = fetcher
+        self.verbose = verbose
+
+
+def prefetch(fetcher, bounds=BUCHAREST_BBOX, zooms=PREFETCH_ZOOMS, styles=tuple(STYLE_IDS), workers=16,
+             progress=None):
+    """Download every missing tile of ``bounds`` at ``zooms`` for ``styles``; return counts."""
+    jobs = [(style, z, x, y) for style in styles for z in zooms for x, y in tiles_in(bounds, z)]
+    counts = {"tiles": len(jobs), "cached": 0, "fetched": 0, "missing": 0, "failed": 0, "bytes": 0}
+
+    def fetch(job):
+        style, z, x, y = job
+        if f"{style}/{z}/{x}/{y}" in fetcher.cache:
+            return "cached", 0
+        try:
+            data, _, _ = fetcher.get(style, z, x, y)
+        except requests.RequestException:
+            return "failed", 0
+        return ("missing", 0) if data is None else ("fetched", len(data))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for done, (outcome, size) in enumerate(pool.map(fetch, jobs), 1):
+            counts[outcome] += 1
+            counts["bytes"] += size
+            if progress and done % 500 == 0:
+                progress(done, len(jobs))
+    return counts
+
+
+def _zoom_range(value):
+    first, _, last = value.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Caching tile proxy for the Mapbox styles.")
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--max-mb", type=int, default=MAX_BYTES // (1024 * 1024))
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the proxy")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8766)
+    serve.add_argument("--verbose", action="store_true", help="log every request")
+    warm = commands.add_parser("prefetch", help="warm the cache for the Bucharest bounding box")
+    warm.add_argument("--zooms", type=_zoom_range, default=PREFETCH_ZOOMS, help="e.g. 11-17")
+    warm.add_argument("--styles", nargs="+", choices=list(STYLE_IDS), default=list(STYLE_IDS))
+    warm.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    try:
+        check_token()
+    except MissingTokenError as e:
+        parser.error(str(e))
+    fetcher = TileFetcher(TileCache(args.cache, args.max_mb * 1024 * 1024))
+    if args.command == "serve":
+        server = TileProxyServer((args.host, args.port), fetcher, args.verbose)
+        print(f"Serving tiles on http://{args.host}:{server.server_port} (cache {args.cache}, {args.max_mb} MB)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    n = sum(len(tiles_in(BUCHAREST_BBOX, z)) for z in args.zooms) * len(args.styles)
+    print(f"Prefetching {n:,} tiles ({len(args.styles)} styles, zooms {args.zooms.start}-{args.zooms.stop - 1})")
+    start = time.perf_counter()
+    counts = prefetch(
+        fetcher, zooms=args.zooms, styles=args.styles, workers=args.workers,
+        progress=lambda done, total: print(f"  {done:,}/{total:,}", flush=True),
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.1f} s: {counts['fetched']:,} fetched ({counts['bytes'] / 1e6:.1f} MB), "
+          f"{counts['cached']:,} already cached, {counts['missing']:,} missing, {counts['failed']:,} failed")
+    if fetcher.cache.total_bytes >= fetcher.cache.max_bytes * 0.9:
+        print("Warning: the cache is at its size limit, some prefetched tiles were evicted (raise --max-mb).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Load test for the amenity query service.
+
+    python -m amenities.service --workers 16 &
+    python -m benchmarks.load_test --url http://127.0.0.1:8765 --clients 8 --duration 10
+
+Each client is a separate process with one keep-alive connection that sends
+random viewport queries (amenity, hour, night, bbox, limit) back to back.
+``--distinct`` bounds how many different queries are drawn, which sets the
+expected response-cache hit rate. Reports throughput and latency percentiles.
+"""
+import argparse
+import http.client
+import multiprocessing
+import random
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from amenities.synthetic import AMENITY_MIX, CITY_CENTER
+
+# Viewport sizes in degrees of latitude, roughly zoom 13 to zoom 17.
+VIEW_SPANS = [0.08, 0.04, 0.02, 0.01, 0.005]
+
+
+def make_queries(n, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        span = rng.choice(VIEW_SPANS)
+        lat = CITY_CENTER[0] + rng.gauss(0, 0.03)
+        lon = CITY_CENTER[1] + rng.gauss(0, 0.04)
+        params = {
+            "bbox": f"{lat - span / 2:.5f},{lon - span * 0.7:.5f},{lat + span / 2:.5f},{lon + span * 0.7:.5f}",
+            "hour": rng.randrange(24),
+            "limit": rng.choice([100, 300]),
+        }
+        if rng.random() < 0.5:
+            params["amenity"] = rng.choice(list(AMENITY_MIX))
+        if rng.random() < 0.2:
+            params["night"] = 1
+        if rng.random() < 0.3:
+            params["format"] = "geojson"
+        queries.append("/venues?" + urlencode(params))
+    return queries
+
+
+def client(args):
+    url, queries, duration, seed = args
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    rng = random.Random(seed)
+    latencies, statuses, received = [], {}, 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        path = rng.choice(queries)
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+            statuses["error"] = statuses.get("error", 0) + 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        received += len(body)
+    conn.close()
+    return latencies, statuses, received
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the amenity query service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--distinct", type=int, default=2000, help="number of distinct queries")
+    args = parser.parse_args(argv)
+
+    queries = make_queries(args.distinct)
+    jobs = [(args.url, queries, args.duration, seed) for seed in range(args.clients)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.clients) as pool:
+        results = pool.map(client, jobs)
+    elapsed = time.perf_counter() - start
+
+    latencies = np.concatenate([np.asarray(r[0]) for r in results]) if results else np.empty(0)
+    statuses = {}
+    for _, s, _ in results:
+        for code, count in s.items():
+            statuses[code] = statuses.get(code, 0) + count
+    received = sum(r[2] for r in results)
+
+    print(f"{len(latencies):,} requests in {elapsed:.1f} s with {args.clients} clients "
+          f"-> {len(latencies) / args.duration:,.0f} req/s, {received / args.duration / 1e6:.1f} MB/s")
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+        print(f"latency ms: p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f}  max {latencies.max() * 1000:.2f}")
+    print("status:", dict(sorted(statuses.items(), key=lambda kv: str(kv[0]))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Time every stage of a dashboard rerun without Streamlit.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 1000000 --output bench.json
+    python -m benchmarks.run --sizes 1000 10000 --compare bench.json
+
+Each stage runs ``--repeat`` times for wall time (the best run is kept) and
+once more under tracemalloc for peak memory. Results are written as JSON so
+two versions can be compared with ``--compare``.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import folium
+import numpy as np
+import pandas as pd
+
+from amenities.clusters import MARKER_THRESHOLD, ClusterPyramid, viewport_bounds
+from amenities.cube import AggregateCube
+from amenities.data import build_frame, load_amenities
+from amenities.query import filter_mask
+from amenities.render import VenueLayer, cluster_features, venue_features
+from amenities.schedule import WeeklySchedule
+from amenities.spatial import GridIndex
+from amenities.synthetic import CITY_CENTER, write_csv
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SELECTED_HOUR = 21
+
+
+def measure(fn, repeat, trace_memory=True):
+    """Return (result, best wall seconds, peak traced bytes or None)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            result = fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def render_html(features):
+    m = folium.Map(location=list(CITY_CENTER), zoom_start=13, tiles=None)
+    VenueLayer(features).add_to(m)
+    return m.get_root().render()
+
+
+def bench_size(n, workdir, repeat, trace_memory):
+    csv_path = os.path.join(workdir, f"synthetic_{n}.csv")
+    write_csv(csv_path, n)
+    cache_dir = os.path.join(workdir, f"cache_{n}")
+    rows = []
+
+    def stage(name, fn, **extra):
+        result, wall, peak = measure(fn, repeat, trace_memory)
+        record = {"rows": n, "stage": name, "wall_s": wall, "peak_bytes": peak}
+        record.update({k: v(result) if callable(v) else v for k, v in extra.items()})
+        rows.append(record)
+        print(f"{n:>9,} {name:<18} {wall * 1000:>10.2f} ms  "
+              f"{(peak or 0) / 1e6:>9.2f} MB  {json.dumps({k: record[k] for k in extra})}")
+        return result
+
+    stage("load_csv", lambda: build_frame(csv_path), size_bytes=os.path.getsize(csv_path))
+    load_amenities(csv_path, cache_dir=cache_dir)
+    df = stage("load_snapshot", lambda: load_amenities(csv_path, cache_dir=cache_dir))
+
+    grid = stage("build_grid", lambda: GridIndex(df["lat"].to_numpy(), df["lon"].to_numpy()))
+    schedule = stage("build_schedule", lambda: WeeklySchedule.from_frame(df), schedules=lambda s: len(s.table))
+    pyramid = stage("build_pyramid", lambda: ClusterPyramid(df, schedule.code))
+    cube = stage("build_cube", lambda: AggregateCube(df, schedule.code))
+
+    # The same filter_mask the dashboard and the query service run.
+    stage("filter_hour", lambda: filter_mask(df, hour=SELECTED_HOUR), matches=lambda m: int(m.sum()))
+    mask = stage("filter_amenity", lambda: filter_mask(df, "bar", hour=SELECTED_HOUR),
+                 matches=lambda m: int(m.sum()))
+    stage("filter_slot", lambda: filter_mask(df, schedule=schedule, day=4, minute=SELECTED_HOUR * 60 + 45),
+          matches=lambda m: int(m.sum()))
+    stage("filter_throughout",
+          lambda: filter_mask(df, schedule=schedule, day=4, minute=SELECTED_HOUR * 60 + 45, stay_minutes=120),
+          matches=lambda m: int(m.sum()))
+
+    city_view = viewport_bounds(CITY_CENTER, 13)
+    street_view = viewport_bounds(CITY_CENTER, 16)
+    hour_mask = filter_mask(df, hour=SELECTED_HOUR)
+    stage("viewport_markers", lambda: grid.query(street_view, mask=hour_mask, limit=MARKER_THRESHOLD),
+          results=len)
+    stage("nearest", lambda: grid.nearest(CITY_CENTER[0], CITY_CENTER[1], k=10, radius_m=1500, mask=mask),
+          results=lambda r: len(r[0]))
+    clusters = stage("viewport_clusters",
+                     lambda: pyramid.clusters(13, city_view, hour=SELECTED_HOUR),
+                     results=lambda c: 0 if c is None else len(c))
+    frames = stage("day_frames", lambda: schedule.day_frames(4), schedules=lambda f: f.shape[1])
+    stage("playback_clusters", lambda: pyramid.cluster_frames(13, city_view, frames),
+          results=lambda c: 0 if c is None else len(c))
+
+    # The dashboard never draws more than MARKER_THRESHOLD individual markers.
+    markers = df.iloc[grid.query(street_view, mask=mask, limit=MARKER_THRESHOLD)]
+    stage("render_markers", lambda: render_html(venue_features(markers)),
+          markers=len(markers), payload_bytes=len)
+    stage("render_clusters", lambda: render_html(cluster_features(clusters)),
+          clusters=0 if clusters is None else len(clusters), payload_bytes=len)
+
+    def charts(bounds):
+        return [
+            cube.by_amenity("total", bounds=bounds),
+            cube.open_by_amenity(schedule.schedules_open(4, SELECTED_HOUR * 60 + 45), bounds=bounds),
+            cube.by_measure(["morning", "midday", "evening", "night"], bounds=bounds),
+        ] + [cube.by_amenity(p, bounds=bounds) for p in ("morning", "midday", "evening", "night")]
+
+    stage("charts_city", lambda: charts(None))
+    stage("charts_view", lambda: charts(city_view))
+    return rows
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)
+    before = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('revision')}):")
+    print(f"{'rows':>9} {'stage':<18} {'before ms':>10} {'after ms':>10} {'ratio':>7}")
+    for r in current:
+        old = before.get((r["rows"], r["stage"]))
+        if old is None:
+            continue
+        ratio = r["wall_s"] / old["wall_s"] if old["wall_s"] else float("nan")
+        print(f"{r['rows']:>9,} {r['stage']:<18} {old['wall_s'] * 1000:>10.2f} "
+              f"{r['wall_s'] * 1000:>10.2f} {ratio:>6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in args.sizes:
+            results.extend(bench_size(n, workdir, args.repeat, not args.no_memory))
+
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
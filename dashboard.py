@@ -1,87 +1,142 @@
 import streamlit as st
 import pandas as pd
 import folium
-from streamlit_folium import st_folium
-from urllib.parse import quote
-from datetime import time
+import datetime
 import os
-import requests
+import uuid
+from zoneinfo import ZoneInfo
+from streamlit_folium import st_folium
+
+from amenities.assets import screenshot
+from amenities.clusters import ClusterPyramid, viewport_bounds
+from amenities.cube import AggregateCube
+from amenities.data import dataset_version, load_amenities
+from amenities.geocode import Gazetteer, Geocoder, open_disk_cache
+from amenities.perf import STATS, RerunTimer
+from amenities.query import filter_mask
+from amenities.render import PlaybackLayer, VenueLayer, cluster_features, playback_features, venue_features
+from amenities.schedule import WeeklySchedule
+from amenities.spatial import GridIndex, bounds_from_leaflet, viewport_moved
+from amenities.tiles import FALLBACK_ATTRIBUTION, FALLBACK_URL, STYLE_IDS, MissingTokenError, mapbox_url, proxy_url
 
 st.set_page_config(layout="wide")
 
+# --- Instrumentation (off unless DASHBOARD_PERF is set, see amenities/perf.py) ---
+perf = RerunTimer(session_id=st.session_state.setdefault("perf_session", uuid.uuid4().hex[:12]))
+
 # --- Load and prepare data ---
-df = pd.read_csv("Amneties_Final.csv")
-df.columns = df.columns.str.strip()
-df["opening_hour_clean"] = df["opening_hour"]
-df["closing_hour_clean"] = df["closing_hour"]
-df["opening_time"] = pd.to_datetime(df["opening_hour"], format="%H:%M").dt.time
-df["closing_time"] = pd.to_datetime(df["closing_hour"], format="%H:%M").dt.time
-
-def is_open_at_interval(open_time, close_time, start_hour, end_hour):
-    # Convert to comparable floats (hour + fraction)
-    open_h = open_time.hour + open_time.minute / 60
-    close_h = close_time.hour + close_time.minute / 60
-
-    if start_hour < end_hour:
-        # Interval doesn’t cross midnight
-        return (open_h < end_hour) and (close_h > start_hour)
-    else:
-        # Interval crosses midnight (e.g. 21 to 5)
-        return (open_h < end_hour) or (close_h > start_hour)
-
-df['open_morning'] = df.apply(lambda r: is_open_at_interval(r['opening_time'], r['closing_time'], 5, 12), axis=1)
-df['open_midday'] = df.apply(lambda r: is_open_at_interval(r['opening_time'], r['closing_time'], 12, 17), axis=1)
-df['open_evening'] = df.apply(lambda r: is_open_at_interval(r['opening_time'], r['closing_time'], 17, 21), axis=1)
-df['open_night'] = df.apply(lambda r: is_open_at_interval(r['opening_time'], r['closing_time'], 21, 5), axis=1)
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_amenities(version):
+    # One read-only frame per process, shared by every session.
+    # `version` only keys the cache so an edited CSV is picked up.
+    # One entry per getter: a new version evicts the previous build.
+    return load_amenities()
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_weekly_schedule(version):
+    return WeeklySchedule.from_frame(get_amenities(version))
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_cluster_pyramid(version):
+    return ClusterPyramid(get_amenities(version), get_weekly_schedule(version).code)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_spatial_index(version):
+    df = get_amenities(version)
+    return GridIndex(df["lat"].to_numpy(), df["lon"].to_numpy())
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_aggregate_cube(version):
+    return AggregateCube(get_amenities(version), get_weekly_schedule(version).code)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_geocoder(version):
+    # Process-wide: the LRU, disk cache and rate limit are shared by all sessions.
+    gazetteer = Gazetteer.from_sources(get_amenities(version))
+    # Without a writable .cache the search just runs without the disk cache.
+    return Geocoder(gazetteer=gazetteer, disk_cache=open_disk_cache())
+
+with perf.stage("load") as stage:
+    version = dataset_version()
+    df = get_amenities(version)
+    spatial_index = get_spatial_index(version)
+    schedule = get_weekly_schedule(version)
+    cluster_pyramid = get_cluster_pyramid(version)
+    geocoder = get_geocoder(version)
+    cube = get_aggregate_cube(version)
+    stage["rows"] = len(df)
 
 # --- Sidebar filters ---
 st.sidebar.title("Filter Options")
 amenity_options = ["All"] + sorted(df['amenity'].unique())
 selected_amenity = st.sidebar.selectbox("Amenity Type", amenity_options)
 show_night = st.sidebar.checkbox("Only show places open at night", value=False)
-selected_hour = st.sidebar.slider("Select Hour (24h)", 0, 23, 12)
-selected_time = time(selected_hour, 0)
-
-def is_open_at(hour, open_time, close_time):
-    if open_time < close_time:
-        return open_time <= hour < close_time
-    else:
-        return hour >= open_time or hour < close_time
-
-# Initial filtering
-if selected_amenity == "All":
-    filtered = df.copy()
-else:
-    filtered = df[df["amenity"] == selected_amenity]
-
-if show_night:
-    filtered = filtered[filtered["open_night"] == 1]
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+today = datetime.datetime.now(ZoneInfo("Europe/Bucharest")).weekday()
+selected_day = st.sidebar.selectbox("Day of the Week", range(7), index=today, format_func=DAY_NAMES.__getitem__)
+selected_time = st.sidebar.slider(
+    "Select Time (24h)",
+    min_value=datetime.time(0, 0),
+    max_value=datetime.time(23, 45),
+    value=datetime.time(12, 0),
+    step=datetime.timedelta(minutes=15),
+    format="HH:mm",
+)
+selected_hour = selected_time.hour
+selected_minute = selected_time.hour * 60 + selected_time.minute
+STAY_OPTIONS = {0: "Any time", 30: "30 minutes", 60: "1 hour", 120: "2 hours", 180: "3 hours"}
+stay_minutes = st.sidebar.selectbox("Still Open For", list(STAY_OPTIONS), format_func=STAY_OPTIONS.__getitem__)
+charts_follow_map = st.sidebar.checkbox("Charts follow the map view", value=False)
+play_day = st.sidebar.checkbox(
+    "▶ Play the day on the map",
+    value=False,
+    help="Sends the whole selected day for the venues in view at once; the slider on the map then replays it without reloading.",
+)
 
-filtered = filtered[
-    filtered.apply(lambda row: is_open_at(selected_time, row["opening_time"], row["closing_time"]), axis=1)
-]
+# Initial filtering (a single mask, the shared frame is never copied or mutated)
+with perf.stage("filter") as stage:
+    # Day and time are answered per distinct weekly schedule, then per venue
+    open_schedules = schedule.schedules_open(selected_day, selected_minute, stay_minutes)
+    mask = filter_mask(
+        df, selected_amenity, night_only=show_night,
+        schedule=schedule, day=selected_day, minute=selected_minute, stay_minutes=stay_minutes,
+    )
+    stage["rows"] = int(mask.sum())
 
 # --- Mapbox styles ---
-MAPBOX_TOKEN = "pk.eyJ1IjoiYWxleGF2YWwiLCJhIjoiY21ib3VqeW9jMDF3bTJqc2FsYXg3eXZtdyJ9.-SREo-5j4jMGJ8e8Bhbmzw"
-MAPBOX_STYLES = {
-    "dawn": f"https://api.mapbox.com/styles/v1/alexaval/cmbrv82lu00z101qwbhjn0k8a/tiles/{{z}}/{{x}}/{{y}}?access_token={MAPBOX_TOKEN}",
-    "day": f"https://api.mapbox.com/styles/v1/alexaval/cmbrvisot00uk01qx04914c3i/tiles/{{z}}/{{x}}/{{y}}?access_token={MAPBOX_TOKEN}",
-    "dusk": f"https://api.mapbox.com/styles/v1/alexaval/cmbrut16a010u01sc784d2857/tiles/{{z}}/{{x}}/{{y}}?access_token={MAPBOX_TOKEN}",
-    "night": f"https://api.mapbox.com/styles/v1/alexaval/cmbru8b5v00yu01r030sw4ack/tiles/{{z}}/{{x}}/{{y}}?access_token={MAPBOX_TOKEN}"
-}
+# Fetched straight from Mapbox, or through the caching tile proxy when
+# TILE_PROXY_URL is set (python -m amenities.tiles serve); the proxy keeps the
+# access token on the server. Direct Mapbox URLs need MAPBOX_TOKEN; without
+# it (and without the proxy) every style falls back to OpenStreetMap tiles.
+TILE_PROXY_URL = os.environ.get("TILE_PROXY_URL")
+TILE_ATTRIBUTION = "Mapbox"
+try:
+    MAPBOX_STYLES = {
+        style: proxy_url(TILE_PROXY_URL, style) if TILE_PROXY_URL else mapbox_url(style)
+        for style in STYLE_IDS
+    }
+except MissingTokenError:
+    MAPBOX_STYLES = dict.fromkeys(STYLE_IDS, FALLBACK_URL)
+    TILE_ATTRIBUTION = FALLBACK_ATTRIBUTION
+    st.warning(
+        "MAPBOX_TOKEN is not set, so the map shows OpenStreetMap tiles instead of the custom styles. "
+        "Set MAPBOX_TOKEN, or TILE_PROXY_URL for a running tile proxy, to get them back."
+    )
 
-if 5 <= selected_hour < 12:
-    time_period = "dawn"
-elif 12 <= selected_hour < 17:
-    time_period = "day"
-elif 17 <= selected_hour < 21:
-    time_period = "dusk"
-else:
-    time_period = "night"
+def period_of(hour):
+    if 5 <= hour < 12:
+        return "dawn"
+    elif 12 <= hour < 17:
+        return "day"
+    elif 17 <= hour < 21:
+        return "dusk"
+    return "night"
+
+time_period = period_of(selected_hour)
 
 # --- Session state initialization ---
 if "map_center" not in st.session_state:
-    default_center = [filtered['lat'].mean(), filtered['lon'].mean()] if not filtered.empty else [44.43, 26.10]
+    default_center = [float(spatial_index.lat[mask].mean()), float(spatial_index.lon[mask].mean())] if mask.any() else [44.43, 26.10]
     st.session_state["map_center"] = default_center
 if "map_zoom" not in st.session_state:
     st.session_state["map_zoom"] = 13
@@ -89,6 +144,35 @@ if "map_zoom" not in st.session_state:
 if "search_updated" not in st.session_state:
     st.session_state["search_updated"] = False
 
+# --- Map interaction ---
+# "incremental" (default) keeps one base map per session and only swaps the
+# markers; "rebuild" recreates the whole map on every rerun.
+INCREMENTAL_MAP = os.environ.get("DASHBOARD_MAP_MODE", "incremental") != "rebuild"
+MAP_KEY = "amenity_map"
+MAP_RETURNED_OBJECTS = ["bounds", "zoom", "center", "last_clicked"]
+
+def on_map_change():
+    # Runs before the map fragment reruns, so it already filters on the new view.
+    # Small pans are ignored until they add up to a meaningful move.
+    map_data = st.session_state.get(MAP_KEY) or {}
+    old_bounds = bounds_from_leaflet(st.session_state["map_bounds"]) if "map_bounds" in st.session_state else None
+    new_bounds = bounds_from_leaflet(map_data["bounds"]) if map_data.get("bounds") else None
+    zoom = map_data.get("zoom")
+    if (zoom is not None and zoom != st.session_state["map_zoom"]) or viewport_moved(old_bounds, new_bounds):
+        if map_data.get("center"):
+            st.session_state["map_center"] = [map_data["center"]["lat"], map_data["center"]["lng"]]
+        if zoom is not None:
+            st.session_state["map_zoom"] = zoom
+        if new_bounds is not None:
+            st.session_state["map_bounds"] = map_data["bounds"]
+    # A new click becomes the point for the "open near" list
+    clicked = map_data.get("last_clicked")
+    if clicked and clicked != st.session_state.get("last_clicked"):
+        st.session_state["last_clicked"] = clicked
+        st.session_state["near_point"] = {"lat": clicked["lat"], "lon": clicked["lng"], "label": "the clicked point"}
+    # Reset search_updated after map interaction so next bounds filtering works
+    st.session_state["search_updated"] = False
+
 # Main page title and info
 st.title("📍 Bucharest Amenities Dashboard")
 
@@ -99,112 +183,184 @@ search_query = st.text_input("🔍 Search location (e.g. Lipscani, Aviatorilor)"
 if st.button("Search") or (search_query and not st.session_state.get("last_search") == search_query):
     # Only trigger on explicit search button or new input change
     try:
-        url = f"https://nominatim.openstreetmap.org/search"
-        params = {"q": search_query, "format": "json", "limit": 1}
-        response = requests.get(url, params=params, headers={"User-Agent": "Streamlit-App"})
-        data = response.json()
-        if data:
-            lat = float(data[0]["lat"])
-            lon = float(data[0]["lon"])
-            st.session_state["map_center"] = [lat, lon]
+        with perf.stage("geocode") as stage:
+            place = geocoder.search(search_query)
+            stage["source"] = place["source"] if place else None
+        if place:
+            st.session_state["map_center"] = [place["lat"], place["lon"]]
             st.session_state["map_zoom"] = 16
             st.session_state["search_updated"] = True
             if "map_bounds" in st.session_state:
                 del st.session_state["map_bounds"]
             st.session_state["last_search"] = search_query
-            st.success(f"Found: {data[0]['display_name']}")
+            st.session_state["near_point"] = {"lat": place["lat"], "lon": place["lon"], "label": search_query}
+            st.success(f"Found: {place['display_name']}")
         else:
             st.warning("No results found.")
     except Exception as e:
         st.error(f"Geocoding error: {e}")
 
 # --- Filtering by bounds only if not recently searched ---
-if "map_bounds" in st.session_state and not st.session_state.get("search_updated", False):
-    bounds = st.session_state["map_bounds"]
-    lat_min = bounds["_southWest"]["lat"]
-    lat_max = bounds["_northEast"]["lat"]
-    lon_min = bounds["_southWest"]["lng"]
-    lon_max = bounds["_northEast"]["lng"]
-
-    filtered = filtered[
-        (filtered["lat"] >= lat_min) & (filtered["lat"] <= lat_max) &
-        (filtered["lon"] >= lon_min) & (filtered["lon"] <= lon_max)
-    ].head(300)
-else:
-    filtered = filtered.head(300)
-
-# --- Amenity colors ---
-amenity_colors = {
-    "cafe": "#6f4e37",
-    "restaurant": "#d35400",
-    "pub": "#2980b9",
-    "park": "#27ae60",
-}
+def current_view_bounds():
+    if "map_bounds" in st.session_state and not st.session_state.get("search_updated", False):
+        return bounds_from_leaflet(st.session_state["map_bounds"])
+    return viewport_bounds(st.session_state["map_center"], st.session_state["map_zoom"])
 
-# --- Create map ---
-m = folium.Map(
-    location=st.session_state["map_center"],
-    zoom_start=st.session_state["map_zoom"],
-    tiles=None
-)
+# Size and reach of the "open near" list
+NEAR_K = 10
+NEAR_RADIUS_M = 1500
 
-m.options['preferCanvas'] = True
-
-folium.TileLayer(
-    tiles=MAPBOX_STYLES[time_period],
-    attr="Mapbox",
-    name=f"Mapbox {time_period}",
-    max_zoom=18,
-    detect_retina=False,
-).add_to(m)
-
-# --- Add markers ---
-for _, row in filtered.iterrows():
-    color = amenity_colors.get(row['amenity'].lower(), "#555555")
-
-    popup_html = f"""
-    <div style="
-        font-family: Arial, sans-serif; 
-        font-size: 14px; 
-        border-radius: 6px; 
-        overflow: hidden;
-        box-shadow: 0 2px 6px rgba(0,0,0,0.3);
-        width: 220px;
-    ">
-      <div style="
-          background-color: {color};
-          color: white;
-          padding: 8px 12px;
-          font-weight: bold;
-          font-size: 16px;
-          text-align: center;
-      ">
-        {row['name']}
-      </div>
-      <div style="padding: 8px 12px; color: #333;">
-        <div>Open: {row['opening_hour_clean']} → {row['closing_hour_clean']}</div>
-        <div style="margin-top: 6px;">
-          <a href="{quote(str(row['website']), safe=':/?=&')}" target="_blank" style="color:#1E90FF; text-decoration:none;">Website</a>
-        </div>
-      </div>
-    </div>
-    """
-
-    icon_file = f"ICONS/{row['amenity'].lower()}.png"
-    icon_path = os.path.join(os.getcwd(), icon_file)
-    if os.path.exists(icon_path):
-        icon = folium.CustomIcon(icon_image=icon_path, icon_size=(30, 30))
-    else:
-        icon = folium.Icon(color="blue", icon="info-sign")
-
-    folium.Marker(
-        location=[row["lat"], row["lon"]],
-        popup=folium.Popup(popup_html, max_width=250),
-        icon=icon
+# --- Create map ---
+def make_base_map(center, zoom):
+    m = folium.Map(location=center, zoom_start=zoom, tiles=None)
+    m.options['preferCanvas'] = True
+    folium.TileLayer(
+        tiles=MAPBOX_STYLES[time_period],
+        attr=TILE_ATTRIBUTION,
+        name=f"Mapbox {time_period}",
+        max_zoom=18,
+        detect_retina=False,
     ).add_to(m)
+    return m
+
+# --- Map fragment ---
+# Panning, zooming or clicking the map reruns only this fragment: the viewport
+# query, the nearest list, the markers and the map. Filters, charts and tables
+# are left as they are, unless the charts follow the map and the view moved.
+@st.fragment
+def map_section():
+    # The full run's timer is already finished when only the fragment reruns
+    fragment_rerun = perf.finished
+    timer = RerunTimer(session_id=perf.session_id, total="map_fragment") if fragment_rerun else perf
+    view_bounds = current_view_bounds()
+    if fragment_rerun and charts_follow_map and view_bounds != st.session_state.get("chart_bounds"):
+        st.rerun()
+
+    # Cluster bubbles while the view holds too many venues, individual markers otherwise
+    with timer.stage("viewport") as stage:
+        if play_day:
+            # Every 15-minute frame of the selected day at once; the browser
+            # shows one frame at a time.
+            open_frames = schedule.day_frames(selected_day, stay_minutes)
+            clusters = cluster_pyramid.cluster_frames(
+                st.session_state["map_zoom"],
+                view_bounds,
+                open_frames,
+                amenity=None if selected_amenity == "All" else selected_amenity,
+                night_only=show_night,
+            )
+            view_rows = []
+            if clusters is None:
+                # Individual markers for the venues open at any point of the day
+                view_rows = spatial_index.query(view_bounds, mask=filter_mask(df, selected_amenity, night_only=show_night))
+                view_rows = view_rows[open_frames.any(axis=0)[schedule.code[view_rows]]]
+            filtered = df.iloc[view_rows]
+        else:
+            clusters = cluster_pyramid.clusters(
+                st.session_state["map_zoom"],
+                view_bounds,
+                amenity=None if selected_amenity == "All" else selected_amenity,
+                night_only=show_night,
+                open_schedules=open_schedules,
+            )
+            if clusters is None:
+                filtered = df.iloc[spatial_index.query(view_bounds, mask=mask)]
+            else:
+                filtered = df.iloc[:0]
+        stage["rows"] = len(filtered)
+        stage["clusters"] = 0 if clusters is None else len(clusters)
+
+    # --- Open venues nearest to the searched or clicked point ---
+    near_point = st.session_state.get("near_point")
+    near = None
+    if near_point is not None:
+        with timer.stage("nearest") as stage:
+            near_rows, near_distances = spatial_index.nearest(near_point["lat"], near_point["lon"], k=NEAR_K, radius_m=NEAR_RADIUS_M, mask=mask)
+            near = df.iloc[near_rows]
+            near = pd.DataFrame({
+                "Name": near["name"].to_numpy(),
+                "Type": near["amenity"].astype(str).str.capitalize().to_numpy(),
+                "Hours": (near["opening_hour"] + "-" + near["closing_hour"]).to_numpy(),
+                "Distance (m)": near_distances.round().astype(int),
+            })
+            stage["rows"] = len(near)
+
+    with timer.stage("markers") as stage:
+        if play_day:
+            features, masks = playback_features(filtered, open_frames, schedule.code[view_rows])
+            venue_layer = PlaybackLayer(
+                features + cluster_features(clusters),
+                masks,
+                start=schedule.slot_of(selected_minute),
+                day_name=DAY_NAMES[selected_day],
+                tile_urls=[MAPBOX_STYLES[period_of(hour)] for hour in range(24)],
+            )
+        else:
+            venue_layer = VenueLayer(venue_features(filtered) + cluster_features(clusters))
+        stage["payload_bytes"] = len(venue_layer.data)
+        if near_point is not None:
+            near_marker = folium.CircleMarker(
+                [near_point["lat"], near_point["lon"]], radius=8, color="#d62728", fill=True, fill_opacity=0.6
+            )
+
+    map_col, near_col = st.columns([3, 1])
+
+    with timer.stage("st_folium"), map_col:
+        if INCREMENTAL_MAP:
+            # The base map's view is fixed once per session and time period, so its
+            # HTML is identical across reruns and the browser keeps the map and its
+            # tiles; reruns only swap the marker feature group and move the view.
+            # (The folium object itself is rebuilt: re-rendering a cached one would
+            # append its script again and change the HTML.)
+            base_views = st.session_state.setdefault("base_map_views", {})
+            base_center, base_zoom = base_views.setdefault(
+                time_period, (list(st.session_state["map_center"]), st.session_state["map_zoom"])
+            )
+            m = make_base_map(base_center, base_zoom)
+            markers = folium.FeatureGroup(name="Venues")
+            venue_layer.add_to(markers)
+            if near_point is not None:
+                near_marker.add_to(markers)
+            st_folium(
+                m,
+                key=MAP_KEY,
+                use_container_width=True,
+                height=700,
+                center=st.session_state["map_center"],
+                zoom=st.session_state["map_zoom"],
+                feature_group_to_add=markers,
+                returned_objects=MAP_RETURNED_OBJECTS,
+                on_change=on_map_change,
+            )
+        else:
+            m = make_base_map(st.session_state["map_center"], st.session_state["map_zoom"])
+            venue_layer.add_to(m)
+            if near_point is not None:
+                near_marker.add_to(m)
+            st_folium(
+                m,
+                key=MAP_KEY,
+                use_container_width=True,
+                height=700,
+                returned_objects=MAP_RETURNED_OBJECTS,
+                on_change=on_map_change,
+            )
+
+    with near_col:
+        if near is None:
+            st.markdown("#### 📌 Open nearby")
+            st.caption("Search for a place or click the map to list the closest venues matching the filters.")
+        else:
+            st.markdown(f"#### 📌 Open near {near_point['label']}")
+            if len(near):
+                st.dataframe(near, hide_index=True, use_container_width=True)
+            else:
+                st.caption(f"Nothing matching the filters within {NEAR_RADIUS_M / 1000:g} km.")
 
-# --- Render map ---
-map_data = st_folium(m, use_container_width=True, height=700)
+    if fragment_rerun:
+        timer.finish()
+
+map_section()
 
 st.markdown("""
 <style>
@@ -219,79 +375,81 @@ iframe.stCustomComponentV1 {
 </style>
 """, unsafe_allow_html=True)
 
-# --- Update session state ---
-if map_data:
-    if "center" in map_data and "zoom" in map_data:
-        st.session_state["map_center"] = [map_data["center"]["lat"], map_data["center"]["lng"]]
-        st.session_state["map_zoom"] = map_data["zoom"]
-    if "bounds" in map_data:
-        st.session_state["map_bounds"] = map_data["bounds"]
-    # Reset search_updated after map interaction so next bounds filtering works
-    st.session_state["search_updated"] = False
-
 import plotly.express as px
 
-time_rename = {
-    'open_dawn': 'Morning',
-    'open_day': 'Midday',
-    'open_dusk': 'Evening',
-    'open_night': 'Night'
-}
-
-# Count by amenity bar chart
-amenity_counts = df['amenity'].value_counts().reset_index()
-amenity_counts.columns = ['amenity', 'count']
-
-fig1 = px.bar(
-    amenity_counts,
-    x='amenity',
-    y='count',
-    title="Count of Amenities by Type",
-    labels={'count': 'Number of Places', 'amenity': 'Amenity Type'},
-    color='amenity',
-    color_discrete_sequence=px.colors.qualitative.Safe
-)
-st.plotly_chart(fig1, use_container_width=True)
-
-# Overall amenities open by time of day (with renamed times)
-time_period_cols = list(time_rename.keys())
-time_period_counts = df[time_period_cols].sum().reset_index()
-time_period_counts.columns = ['time_period', 'count']
-time_period_counts['time_period'] = time_period_counts['time_period'].map(time_rename)
-
-fig2 = px.bar(
-    time_period_counts,
-    x='time_period',
-    y='count',
-    title="Amenities Open by Time of Day",
-    labels={'count': 'Number Open', 'time_period': 'Time Period'},
-    color='time_period',
-    color_discrete_sequence=px.colors.qualitative.Safe
-)
-st.plotly_chart(fig2, use_container_width=True)
-
-# Four pie charts with nice titles
-col1, col2, col3, col4 = st.columns(4)
-
-time_map = {
-    'open_dawn': col1,
-    'open_day': col2,
-    'open_dusk': col3,
-    'open_night': col4
+period_names = {
+    'morning': 'Morning',
+    'midday': 'Midday',
+    'evening': 'Evening',
+    'night': 'Night'
 }
 
-for time_col, col in time_map.items():
-    subset = df[df[time_col] == 1]
-    counts = subset['amenity'].value_counts().reset_index()
-    counts.columns = ['amenity', 'count']
-    fig = px.pie(
-        counts,
-        names='amenity',
-        values='count',
-        title=time_rename[time_col],  # Use renamed titles here
+# All charts are slices of the precomputed cube, for the whole city or the map view
+with perf.stage("charts"):
+    # The map fragment compares its view with this to know when to refresh the charts
+    st.session_state["chart_bounds"] = current_view_bounds()
+    chart_bounds = st.session_state["chart_bounds"] if charts_follow_map else None
+    scope = "in View" if charts_follow_map else "in Bucharest"
+
+    # Count by amenity bar chart
+    amenity_counts = cube.by_amenity("total", bounds=chart_bounds, night_only=show_night).rename_axis('amenity').reset_index()
+
+    fig1 = px.bar(
+        amenity_counts,
+        x='amenity',
+        y='count',
+        title=f"Count of Amenities by Type {scope}",
+        labels={'count': 'Number of Places', 'amenity': 'Amenity Type'},
+        color='amenity',
+        color_discrete_sequence=px.colors.qualitative.Safe
+    )
+    st.plotly_chart(fig1, use_container_width=True)
+
+    # What is open on the selected day and time
+    open_now_counts = cube.open_by_amenity(open_schedules, bounds=chart_bounds, night_only=show_night).rename_axis('amenity').reset_index()
+
+    fig_now = px.bar(
+        open_now_counts,
+        x='amenity',
+        y='count',
+        title=f"Open on {DAY_NAMES[selected_day]} at {selected_time:%H:%M} {scope}",
+        labels={'count': 'Number Open', 'amenity': 'Amenity Type'},
+        color='amenity',
         color_discrete_sequence=px.colors.qualitative.Safe
     )
-    col.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig_now, use_container_width=True)
+
+    # Overall amenities open by time of day (with renamed times)
+    time_period_counts = cube.by_measure(
+        list(period_names),
+        amenity=None if selected_amenity == "All" else selected_amenity,
+        bounds=chart_bounds,
+        night_only=show_night,
+    ).rename_axis('time_period').reset_index()
+    time_period_counts['time_period'] = time_period_counts['time_period'].map(period_names)
+
+    fig2 = px.bar(
+        time_period_counts,
+        x='time_period',
+        y='count',
+        title="Amenities Open by Time of Day",
+        labels={'count': 'Number Open', 'time_period': 'Time Period'},
+        color='time_period',
+        color_discrete_sequence=px.colors.qualitative.Safe
+    )
+    st.plotly_chart(fig2, use_container_width=True)
+
+    # Four pie charts with nice titles
+    for period, col in zip(period_names, st.columns(4)):
+        counts = cube.by_amenity(period, bounds=chart_bounds, night_only=show_night).rename_axis('amenity').reset_index()
+        fig = px.pie(
+            counts,
+            names='amenity',
+            values='count',
+            title=period_names[period],  # Use renamed titles here
+            color_discrete_sequence=px.colors.qualitative.Safe
+        )
+        col.plotly_chart(fig, use_container_width=True)
 
 # Show custom curated sample database
 st.markdown("### 📄 Sample of the Curated Database (Two of Each Type)")
@@ -300,9 +458,12 @@ sample_df = pd.read_csv("Amneties_Final_sample.csv")
 st.dataframe(sample_df)
 
 # --- Project Summary & Reflection ---
-st.markdown("## 🧭 Project Reflection & Background")
-
-st.markdown("""
+# Only produced while the expander is open: toggling it reruns the script,
+# so the map and charts never wait on the text and screenshots below.
+reflection = st.expander("🧭 Project Reflection & Background", key="reflection", on_change="rerun")
+if reflection.open:
+    with reflection:
+        st.markdown("""
 Hello! I am Alex and this is my first serious analyst project in my portfolio. I have chosen a subject which I was more familiar with, so I can follow the data and more accurately check for information. Also this had a larger data pool I could access with online sources, giving me enough material for a large project. 
 The tools I have used are:
 -Geodata/Overpass Turbo
@@ -317,7 +478,7 @@ The idea was simple: have an interactive map of Bucharest’s best locations to
 
 First step was to gather the raw data to work with. I’ve used overpass-turbo for this. I’ve used a filter by amenity ( bar, pub, nightclub, restaurant, café, cinema, theatre) within the Bucharest area. The related code for getting the data was:
 """)
-st.code("""
+        st.code("""
 [out:json][timeout:25];
 (
   node["amenity"~"bar|pub|cafe|nightclub|restaurant|theatre|cinema"](around:15000,44.4268,26.1025);
@@ -326,13 +487,13 @@ out body;
 >;
 out skel qt;
 """, language="text")
-st.markdown("""
+        st.markdown("""
 The database itself is quite large, with over 2500 rows of locations that include the coordinates, website, type and opening hours. 
 
 Now the real work began. Although huge, Overpass gave me a lot of duplicates, places that closed down, had missing info like websites and amenity type and the worst were the hours. Was either mismatching with current data, or the hours were split by day, such making the data clustered.
 """)
-st.image("Screenshots/1.jpg", use_container_width=True)
-st.markdown("""
+        st.image(screenshot("Screenshots/1.jpg"), use_container_width=True)
+        st.markdown("""
 Time for clean up. Had to organize a pipeline and check everything. I’ve started from the simplest tasks and moved up such as:
 
 1. Remove duplicates. Easy peasy.
@@ -348,8 +509,8 @@ Now that the base was ready and clean, it was time to format it for SQL and Tabl
 1. Checking the coordinates to have the same length and format. 
 2. Have the hours in the 24h format. Here was more work as the cells had multiple types, many am-pm, others were 24h and some had the hours written with letters -_-
 """)
-st.image("Screenshots/2.jpg", use_container_width=True)
-st.markdown("""
+        st.image(screenshot("Screenshots/2.jpg"), use_container_width=True)
+        st.markdown("""
 Here is where the Excel formulas were used intensively.  After changing all the hours into numerical format, I’ve then removed extra characters not needed such as seconds, changed the separators in proper type (many had *_* or *,* instead of *:* ) and then approximated and rounded the hours that had half hours(like 16:45 or 13:30). This step was important for the filter on Tableau to work.
 Then filtered by time format and switched the cells in 12h format into 24h.Formula used is 
 
@@ -361,8 +522,8 @@ Then lastly I had to separate the opening and closing hours into different colum
 
 Final dataset was optimized and looked like this: """)
 
-st.image("Screenshots/3.jpg", use_container_width=True)
-st.markdown("""
+        st.image(screenshot("Screenshots/3.jpg"), use_container_width=True)
+        st.markdown("""
 Everything was ready for Tableau. Imported, visualized, celebrated. I had a few hiccups now with the data. For example Tableau couldn’t read the hours as Sheets sneakily had a different format for the hours making them AM-PM even with the 24 hour format because of the formulas. I had to copy the values, paste into a new cell and assign the type manually (don’t forget to paste special: column values only otherwise the data will break because of the formulas). Then my coordinates were strings and couldn’t read as decimals for mapping. Why? After some detective work I discovered it was from the system itself. I had to navigate in Windows settings and change the decimal separator from comma to dot so Tableau could read it properly.
 
 PROGRESS.
@@ -371,9 +532,9 @@ Now the data in, map format ready and all data is working.
 
 I’ve created a set of custom icons to use as legend for the map in Photoshop and Illustrator. """)
 
-st.image("Screenshots/6.jpg", use_container_width=True)
-st.image("Screenshots/7.jpg", use_container_width=True)
-st.markdown("""
+        st.image(screenshot("Screenshots/6.jpg"), use_container_width=True)
+        st.image(screenshot("Screenshots/7.jpg"), use_container_width=True)
+        st.markdown("""
 For the custom maps there isn’t much to say. I’ve used mapbox and customized a map. I changed the colors and created 4 versions for each time of day(morning, afternoon, evening, night) and created a simple CRT texture and a watercolour texture that I applied in layers so I can give it a more handcrafted look.
 
 
@@ -384,14 +545,14 @@ But the process here was helpful and helped me figure out the practicality and U
 
 -	Made a time filter where the locations spots based by the hour. It was simple and the previous and painful process of cleaning all those hours helped here. A simple parameter did the trick""")
 
-st.image("Screenshots/4.jpg", use_container_width=True)
+        st.image(screenshot("Screenshots/4.jpg"), use_container_width=True)
 
-st.markdown("""
+        st.markdown("""
 For this filter to work I took my database in MySQL and created a Boolean assigning the four times of day on each location. This filter calculated the overall hour windows and if it’s opened during that time.
 
 The formula went like this: """)
 
-st.code("""SELECT * FROM bucharest_amneties.locations;
+        st.code("""SELECT * FROM bucharest_amneties.locations;
 SET SQL_SAFE_UPDATES = 0;
 UPDATE locations
 SET open_dawn = NULL,
@@ -417,10 +578,10 @@ WHERE
     )
   )""", language="text")
 
-st.markdown("""And then I repeated this query for each time of the day for their appropriate time windows. """)
+        st.markdown("""And then I repeated this query for each time of the day for their appropriate time windows. """)
 
-st.image("Screenshots/5.jpg", use_container_width=True)
-st.markdown("""
+        st.image(screenshot("Screenshots/5.jpg"), use_container_width=True)
+        st.markdown("""
 These Booleans helped a lot as now the program will know immediately when is opened without having to use complicated formulas within it. It avoids a lot of cluster and troubleshooting. 
 
 And the process went on. I’ve had calculated fields as filters for locations to appear depending on amenity and hour, then I created a way to visualize each location’s details when clicking on it. I had made custom banners and formatted a tool tip so I can get the closest result to a pop up. Unfortunately this data was lost in that update.
@@ -439,3 +600,11 @@ And here we are. The final project, with interesting ideas and challenges that h
 
 """)
 
+# --- Performance panel ---
+record = perf.finish()
+if record is not None:
+    with st.sidebar.expander("⏱ Rerun timings"):
+        st.caption(f"This rerun: {record['total_ms']:.0f} ms")
+        st.dataframe(pd.DataFrame(record["stages"]).set_index("stage").round(1))
+        st.caption("Across sessions (rolling window)")
+        st.dataframe(pd.DataFrame(STATS.summary()).T[["count", "p50_ms", "p95_ms"]].round(1))
@@ -0,0 +1,79 @@
+"""Shared fixtures: the shipped CSV, random viewports over it and local stand-in HTTP servers."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from amenities.data import build_frame
+
+
+@pytest.fixture(scope="session")
+def csv_path():
+    return Path(__file__).resolve().parents[1] / "Amneties_Final.csv"
+
+
+@pytest.fixture(scope="session")
+def df(csv_path):
+    return build_frame(csv_path)
+
+
+@pytest.fixture(scope="session")
+def random_bounds(df):
+    """``random_bounds(rng, count)`` yields ``count`` viewports over ``df``."""
+    lat, lon = df["lat"].to_numpy(dtype=np.float64), df["lon"].to_numpy(dtype=np.float64)
+    lat_span, lon_span = lat.max() - lat.min(), lon.max() - lon.min()
+
+    def views(rng, count):
+        # From a few streets to more than the whole city, some off the edge.
+        for _ in range(count):
+            c_lat = rng.uniform(lat.min() - 0.1 * lat_span, lat.max() + 0.1 * lat_span)
+            c_lon = rng.uniform(lon.min() - 0.1 * lon_span, lon.max() + 0.1 * lon_span)
+            half_lat, half_lon = rng.uniform(0.002, 0.6) * lat_span, rng.uniform(0.002, 0.6) * lon_span
+            yield c_lat - half_lat, c_lat + half_lat, c_lon - half_lon, c_lon + half_lon
+
+    return views
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status, headers, body = self.server.respond(self)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Stand-in for a remote API: ``respond(handler)`` returns ``(status, headers, body)``."""
+
+    daemon_threads = True
+
+    def __init__(self, respond):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.respond = respond
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_port}"
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(respond):
+        server = StubServer(respond)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
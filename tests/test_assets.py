@@ -0,0 +1,98 @@
+"""Image variants: cache file names, reuse, and the read-only fallback."""
+import os
+
+import pytest
+from PIL import Image
+
+from amenities import assets
+
+
+def make_image(path, size, color, mode="RGB"):
+    Image.new(mode, size, color).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def photo(tmp_path):
+    return make_image(tmp_path / "reflection.jpg", (2400, 1600), (200, 120, 40))
+
+
+@pytest.fixture
+def icon_png(tmp_path):
+    return make_image(tmp_path / "bar.png", (70, 70), (30, 60, 90, 200), mode="RGBA")
+
+
+def test_variants_are_resized(tmp_path, photo, icon_png):
+    cache = str(tmp_path / "cache")
+    out = assets.screenshot(photo, assets_dir=cache)
+    assert os.path.dirname(out) == cache
+    with Image.open(out) as image:
+        assert image.size == (assets.SCREENSHOT_WIDTH, 800)
+    assert os.path.getsize(out) < os.path.getsize(photo)
+    with Image.open(assets.icon(icon_png, assets_dir=cache)) as image:
+        assert (image.format, image.mode, image.size) == ("PNG", "P", (assets.ICON_PX, assets.ICON_PX))
+
+
+def test_cache_key_names_the_content_kind_and_size(tmp_path, photo, icon_png):
+    cache = str(tmp_path / "cache")
+    wide = assets.screenshot(photo, assets_dir=cache)
+    narrow = assets.screenshot(photo, width=600, assets_dir=cache)
+    small_icon = assets.icon(icon_png, px=30, assets_dir=cache)
+    names = [os.path.basename(p) for p in (wide, narrow, small_icon)]
+    assert len(set(names)) == 3
+    assert names[0].startswith(f"reflection-{assets._content_hash(photo)}-photo1200.")
+    assert names[1].startswith(f"reflection-{assets._content_hash(photo)}-photo600.")
+    assert names[2] == f"bar-{assets._content_hash(icon_png)}-icon30.png"
+    assert sorted(os.listdir(cache)) == sorted(names)
+
+
+def test_edited_source_gets_a_new_variant(tmp_path, photo):
+    cache = str(tmp_path / "cache")
+    before = assets.screenshot(photo, assets_dir=cache)
+    make_image(photo, (1800, 1200), (10, 10, 10))
+    after = assets.screenshot(photo, assets_dir=cache)
+    assert after != before
+    with Image.open(after) as image:
+        assert image.size == (assets.SCREENSHOT_WIDTH, 800)
+    # The stale variant is left alone, never served again.
+    assert sorted(os.listdir(cache)) == sorted([os.path.basename(before), os.path.basename(after)])
+
+
+def test_existing_variant_is_reused(tmp_path, photo):
+    cache = str(tmp_path / "cache")
+    out = assets.screenshot(photo, assets_dir=cache)
+    mtime = os.stat(out).st_mtime_ns
+    # A new process (no memo) finds the file instead of encoding it again.
+    assets._variant.cache_clear()
+    assert assets.screenshot(photo, assets_dir=cache) == out
+    assert os.stat(out).st_mtime_ns == mtime
+
+
+def test_unwritable_cache_dir_serves_the_original(tmp_path, photo, icon_png):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    cache = str(blocker / "assets")
+    assert assets.screenshot(photo, assets_dir=cache) == photo
+    assert assets.icon(icon_png, assets_dir=cache) == icon_png
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() == 0, reason="root can write to read-only directories")
+def test_read_only_cache_dir_serves_the_original(tmp_path, photo):
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    cache.chmod(0o555)
+    try:
+        assert assets.screenshot(photo, assets_dir=str(cache)) == photo
+    finally:
+        cache.chmod(0o755)
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path, photo, monkeypatch):
+    cache = tmp_path / "cache"
+
+    def read_only(src, dst):
+        raise PermissionError(30, "Read-only file system", dst)
+
+    monkeypatch.setattr(os, "replace", read_only)
+    assert assets.screenshot(photo, assets_dir=str(cache)) == photo
+    assert os.listdir(cache) == []
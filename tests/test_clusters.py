@@ -0,0 +1,199 @@
+"""ClusterPyramid bubbles against a brute-force Web Mercator binning of the shipped CSV."""
+import math
+
+import numpy as np
+import pytest
+
+from amenities import clusters
+from amenities.clusters import CELL_PX, MARKER_THRESHOLD, MAX_CLUSTER_ZOOM, MIN_ZOOM, ClusterPyramid
+from amenities.schedule import WeeklySchedule
+
+
+@pytest.fixture(scope="module")
+def schedule(df):
+    return WeeklySchedule.from_frame(df)
+
+
+@pytest.fixture(scope="module")
+def pyramid(df, schedule):
+    return ClusterPyramid(df, schedule.code)
+
+
+@pytest.fixture
+def every_view_clusters(monkeypatch):
+    # With no threshold even a view of a few streets comes back as bubbles.
+    monkeypatch.setattr(clusters, "MARKER_THRESHOLD", -1)
+
+
+def pixel_cell(lat, lon, zoom):
+    """(column, row) of the CELL_PX cell holding a point, one point at a time."""
+    size = 256 * 2 ** zoom
+    x = (lon + 180) / 360 * size
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * size
+    return math.floor(x / CELL_PX), math.floor(y / CELL_PX)
+
+
+class BruteForce:
+    """Every venue's cell at every zoom, and the bubbles a view should get."""
+
+    def __init__(self, df, code):
+        self.df = df
+        self.lat = df["lat"].to_numpy(dtype=np.float64)
+        self.lon = df["lon"].to_numpy(dtype=np.float64)
+        self.code = code
+        self.cells = {
+            zoom: np.array([pixel_cell(lat, lon, zoom) for lat, lon in zip(self.lat, self.lon)])
+            for zoom in range(MIN_ZOOM, MAX_CLUSTER_ZOOM + 1)
+        }
+
+    def rows(self, zoom, bounds, amenity=None, hour=None, night_only=False, open_schedules=None):
+        # A view takes whole cells: every cell it touches, even partly.
+        lat_min, lat_max, lon_min, lon_max = bounds
+        c0, r0 = pixel_cell(lat_max, lon_min, zoom)
+        c1, r1 = pixel_cell(lat_min, lon_max, zoom)
+        col, row = self.cells[zoom].T
+        keep = (col >= c0) & (col <= c1) & (row >= r0) & (row <= r1)
+        if amenity is not None:
+            keep &= (self.df["amenity"] == amenity).to_numpy()
+        if hour is not None:
+            keep &= (self.df["open_hours"].to_numpy() >> hour) & 1 == 1
+        if night_only:
+            keep &= self.df["open_night"].to_numpy()
+        if open_schedules is not None:
+            keep &= open_schedules[self.code]
+        return np.flatnonzero(keep)
+
+    def bubbles(self, zoom, rows, open_frames=None):
+        by_cell = {}
+        for i in rows:
+            col, row = self.cells[zoom][i]
+            by_cell.setdefault((row, col), []).append(i)
+        amenity = self.df["amenity"].astype(str).to_numpy()
+        expected = []
+        for cell in sorted(by_cell):
+            members = by_cell[cell]
+            names, counts = np.unique(amenity[members], return_counts=True)
+            bubble = {
+                "lat": self.lat[members].mean(),
+                "lon": self.lon[members].mean(),
+                "count": len(members),
+                "by_amenity": dict(zip(names.tolist(), counts.tolist())),
+            }
+            if open_frames is not None:
+                bubble["counts"] = open_frames[:, self.code[members]].sum(axis=1).tolist()
+            expected.append(bubble)
+        return expected
+
+
+@pytest.fixture(scope="module")
+def brute(df, schedule):
+    return BruteForce(df, schedule.code)
+
+
+def assert_same_bubbles(got, expected):
+    assert len(got) == len(expected)
+    for bubble, want in zip(got, expected):
+        assert bubble["count"] == want["count"]
+        assert bubble["by_amenity"] == want["by_amenity"]
+        assert bubble["lat"] == pytest.approx(want["lat"], abs=1e-9)
+        assert bubble["lon"] == pytest.approx(want["lon"], abs=1e-9)
+        assert bubble.get("counts") == want.get("counts")
+
+
+@pytest.mark.parametrize("zoom", range(MIN_ZOOM, MAX_CLUSTER_ZOOM + 1))
+def test_clusters_match_brute_force(random_bounds, schedule, pyramid, brute, every_view_clusters, zoom):
+    rng = np.random.default_rng(zoom)
+    filters = [
+        {},
+        {"amenity": "bar"},
+        {"hour": 23, "night_only": True},
+        {"amenity": "restaurant", "open_schedules": schedule.schedules_open(5, 22 * 60 + 30)},
+    ]
+    for bounds in random_bounds(rng, 40):
+        for kwargs in filters:
+            expected = brute.bubbles(zoom, brute.rows(zoom, bounds, **kwargs))
+            assert_same_bubbles(pyramid.clusters(zoom, bounds, **kwargs), expected)
+
+
+@pytest.mark.parametrize("zoom", [MIN_ZOOM, 13, MAX_CLUSTER_ZOOM])
+@pytest.mark.parametrize("day", [0, 4, 6])
+def test_cluster_frames_match_brute_force(random_bounds, schedule, pyramid, brute, every_view_clusters, zoom, day):
+    rng = np.random.default_rng(zoom * 7 + day)
+    open_frames = schedule.day_frames(day, stay_minutes=30)
+    open_any = open_frames.any(axis=0)
+    for bounds in random_bounds(rng, 30):
+        for amenity, night_only in [(None, False), ("pub", False), (None, True)]:
+            rows = brute.rows(zoom, bounds, amenity=amenity, night_only=night_only, open_schedules=open_any)
+            got = pyramid.cluster_frames(zoom, bounds, open_frames, amenity=amenity, night_only=night_only)
+            assert_same_bubbles(got, brute.bubbles(zoom, rows, open_frames))
+
+
+@pytest.mark.parametrize("zoom, level", [(3, MIN_ZOOM), (9.4, MIN_ZOOM), (12.6, 13), (17.2, MAX_CLUSTER_ZOOM), (21, MAX_CLUSTER_ZOOM)])
+def test_zoom_is_rounded_and_clamped_to_the_pyramid(df, pyramid, brute, every_view_clusters, zoom, level):
+    lat, lon = df["lat"].to_numpy(), df["lon"].to_numpy()
+    city = (float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max()))
+    assert_same_bubbles(pyramid.clusters(zoom, city), brute.bubbles(level, brute.rows(level, city)))
+
+
+def test_views_take_whole_edge_cells(df, pyramid, brute, every_view_clusters):
+    # A view a few metres wide around one venue still gets its whole cell,
+    # including neighbours outside the view.
+    zoom = 12
+    col, row = brute.cells[zoom].T
+    cell_sizes = {}
+    for cell in zip(col.tolist(), row.tolist()):
+        cell_sizes[cell] = cell_sizes.get(cell, 0) + 1
+    busiest = max(cell_sizes, key=cell_sizes.get)
+    i = int(np.flatnonzero((col == busiest[0]) & (row == busiest[1]))[0])
+    lat, lon = brute.lat[i], brute.lon[i]
+    bounds = (lat - 1e-5, lat + 1e-5, lon - 1e-5, lon + 1e-5)
+    (bubble,) = pyramid.clusters(zoom, bounds)
+    assert bubble["count"] == cell_sizes[busiest] > 1
+    assert_same_bubbles([bubble], brute.bubbles(zoom, brute.rows(zoom, bounds)))
+
+
+def test_marker_threshold_switch_over(pyramid, brute):
+    # Widen a view around the city centre until it holds more than
+    # MARKER_THRESHOLD venues: markers up to the threshold, bubbles past it.
+    zoom = 13
+    lat, lon = np.median(brute.lat), np.median(brute.lon)
+    seen_markers = seen_bubbles = False
+    for half in np.geomspace(0.001, 0.2, 60):
+        bounds = (lat - half, lat + half, lon - half, lon + half)
+        in_view = len(brute.rows(zoom, bounds))
+        got = pyramid.clusters(zoom, bounds)
+        if in_view <= MARKER_THRESHOLD:
+            assert got is None
+            seen_markers = True
+        else:
+            assert sum(bubble["count"] for bubble in got) == in_view
+            seen_bubbles = True
+    assert seen_markers and seen_bubbles
+
+
+def test_cluster_frames_switch_over_on_the_whole_day(df, schedule, pyramid, brute):
+    # Markers are shipped for every frame at once: the venues open in any
+    # frame have to fit, not just the busiest frame.
+    zoom = 13
+    lat, lon = df["lat"].to_numpy(), df["lon"].to_numpy()
+    city = (float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max()))
+    open_frames = schedule.day_frames(4)
+    per_frame = open_frames[:, schedule.code].sum(axis=1)
+    quiet = open_frames[per_frame <= MARKER_THRESHOLD]
+    assert len(quiet) > 0 and quiet.any(axis=0)[schedule.code].sum() > MARKER_THRESHOLD
+    assert pyramid.cluster_frames(zoom, city, quiet) is not None
+
+    lat, lon = np.median(brute.lat), np.median(brute.lon)
+    seen_markers = seen_bubbles = False
+    for half in np.geomspace(0.001, 0.2, 40):
+        bounds = (lat - half, lat + half, lon - half, lon + half)
+        in_view = len(brute.rows(zoom, bounds, open_schedules=quiet.any(axis=0)))
+        got = pyramid.cluster_frames(zoom, bounds, quiet)
+        if in_view <= MARKER_THRESHOLD:
+            assert got is None
+            seen_markers = True
+        else:
+            assert sum(bubble["count"] for bubble in got) == in_view
+            seen_bubbles = True
+    assert seen_markers and seen_bubbles
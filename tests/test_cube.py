@@ -0,0 +1,62 @@
+"""AggregateCube slices against row-by-row counts on the shipped CSV."""
+import numpy as np
+import pytest
+
+from amenities.cube import MEASURES, AggregateCube
+from amenities.data import PERIODS
+from amenities.schedule import WeeklySchedule
+
+
+@pytest.fixture(scope="module")
+def schedule(df):
+    return WeeklySchedule.from_frame(df)
+
+
+@pytest.fixture(scope="module")
+def cube(df, schedule):
+    return AggregateCube(df, schedule.code)
+
+
+def rows_in_view(df, bounds, night_only):
+    keep = np.ones(len(df), dtype=bool)
+    if bounds is not None:
+        lat_min, lat_max, lon_min, lon_max = bounds
+        lat, lon = df["lat"].to_numpy(dtype=np.float64), df["lon"].to_numpy(dtype=np.float64)
+        keep = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+    if night_only:
+        keep &= df["open_night"].to_numpy()
+    return keep
+
+
+def count_by_amenity(df, keep):
+    return df[keep].groupby("amenity", observed=False).size().astype(np.int64)
+
+
+@pytest.mark.parametrize("night_only", [False, True])
+def test_slices_match_row_counts(df, random_bounds, cube, night_only):
+    rng = np.random.default_rng(8)
+    for bounds in [None, *random_bounds(rng, 200)]:
+        keep = rows_in_view(df, bounds, night_only)
+        for measure in MEASURES:
+            measure_keep = keep if measure == "total" else keep & df[f"open_{measure}"].to_numpy()
+            counts = cube.by_amenity(measure, bounds=bounds, night_only=night_only)
+            assert counts.tolist() == count_by_amenity(df, measure_keep).tolist()
+
+        periods = list(PERIODS)
+        amenity = cube.amenities[0]
+        expected = [int((keep & (df["amenity"] == amenity).to_numpy() & df[f"open_{p}"].to_numpy()).sum()) for p in periods]
+        assert cube.by_measure(periods, amenity=amenity, bounds=bounds, night_only=night_only).tolist() == expected
+
+
+@pytest.mark.parametrize("night_only", [False, True])
+@pytest.mark.parametrize("day, minute, stay", [(0, 12 * 60, 0), (4, 21 * 60 + 45, 0), (5, 2 * 60, 0), (6, 18 * 60, 90)])
+def test_open_by_amenity_matches_row_counts(df, random_bounds, schedule, cube, night_only, day, minute, stay):
+    rng = np.random.default_rng(day * 1440 + minute)
+    open_schedules = schedule.schedules_open(day, minute, stay)
+    is_open = open_schedules[schedule.code]
+    for bounds in [None, *random_bounds(rng, 50)]:
+        keep = rows_in_view(df, bounds, night_only) & is_open
+        counts = cube.open_by_amenity(open_schedules, bounds=bounds, night_only=night_only)
+        expected = count_by_amenity(df, keep)
+        assert list(counts.index) == list(expected.index)
+        assert counts.tolist() == expected.tolist()
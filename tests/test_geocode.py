@@ -0,0 +1,194 @@
+"""The search chain (gazetteer, LRU, disk cache, Nominatim) against a local stand-in server."""
+import json
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+
+from amenities.geocode import DiskCache, Gazetteer, Geocoder, RateLimiter
+
+PLACES_PATH = Path(__file__).resolve().parents[1] / "bucharest_places.csv"
+PLACES = {
+    "herastrau": {"lat": "44.4700", "lon": "26.0820", "display_name": "Parcul Herăstrău, București"},
+    "caf": {"lat": "44.4300", "lon": "26.1000", "display_name": "Caf, București"},
+    "izvor": {"lat": "44.4320", "lon": "26.0770", "display_name": "Izvor, Sector 5, București"},
+    "dristor": {"lat": "44.4200", "lon": "26.1430", "display_name": "Dristor, Sector 3, București"},
+}
+
+
+@pytest.fixture
+def nominatim(stub_server):
+    # Answers from PLACES; queries listed in `failures` get a 500 once.
+    failures = set()
+
+    def respond(handler):
+        query = parse_qs(urlsplit(handler.path).query)["q"][0].lower()
+        if query in failures:
+            failures.discard(query)
+            return 500, {}, b"busy"
+        place = PLACES.get(query)
+        return 200, {"Content-Type": "application/json"}, json.dumps([place] if place else []).encode()
+
+    server = stub_server(respond)
+    server.failures = failures
+    return server
+
+
+def geocoder(server, **kwargs):
+    return Geocoder(url=server.url, rate_limiter=RateLimiter(0), **kwargs)
+
+
+@pytest.fixture(scope="module")
+def city_gazetteer(df):
+    return Gazetteer.from_sources(df, places_path=PLACES_PATH)
+
+
+def test_short_queries_only_match_exactly():
+    gazetteer = Gazetteer(
+        [("Piața Aviatorilor", 44.46, 26.08), ("Obor", 44.45, 26.12), ("Cafeteria", 44.40, 26.10)],
+        [("Bar Centraal", 44.43, 26.10), ("Cafeneaua Verde", 44.44, 26.09)],
+    )
+    assert gazetteer.lookup("bar") is None
+    assert gazetteer.lookup("caf") is None
+    assert gazetteer.lookup_venue("caf") is None
+    assert gazetteer.lookup("obor")["display_name"] == "Obor"
+    assert gazetteer.lookup("bar centraal")["display_name"] == "Bar Centraal"
+    assert gazetteer.lookup("aviatorilor")["display_name"] == "Piața Aviatorilor"
+    assert gazetteer.lookup("piata aviatorlor")["display_name"] == "Piața Aviatorilor"
+
+
+def test_partial_venue_matches_are_kept_apart():
+    gazetteer = Gazetteer([("Piața Victoriei", 44.45, 26.09)], [("Cafeneaua Verde", 44.44, 26.09)])
+    assert gazetteer.lookup("cafenea") is None
+    assert gazetteer.lookup_venue("cafenea")["display_name"] == "Cafeneaua Verde"
+    assert gazetteer.lookup_venue("victoriei") is None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Dorobanti", {"Piața Dorobanților"}),
+    ("Victoriei", {"Calea Victoriei", "Piața Victoriei"}),
+    ("Amzei", {"Piața Amzei"}),
+    ("amzei", {"Piața Amzei"}),
+    ("Aviatorilor", {"Piața Aviatorilor", "Bulevardul Aviatorilor"}),
+])
+def test_places_win_over_venue_names(city_gazetteer, query, expected):
+    assert city_gazetteer.lookup(query)["display_name"] in expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Izvor", "Izvor, Sector 5, București"),
+    ("Dristor", "Dristor, Sector 3, București"),
+])
+def test_neighbourhoods_named_in_venues_go_to_nominatim(city_gazetteer, nominatim, query, expected):
+    # "Teatrul Bulandra - Sala Izvor" and "Dristor Doner Kebap" must not answer these.
+    assert city_gazetteer.lookup(query) is None
+    place = geocoder(nominatim, gazetteer=city_gazetteer).search(query)
+    assert (place["display_name"], place["source"]) == (expected, "nominatim")
+
+
+def test_partial_venue_match_when_nothing_else_has_one(city_gazetteer, nominatim):
+    coder = geocoder(nominatim, gazetteer=city_gazetteer)
+    place = coder.search("Victoriei Ballr")
+    assert (place["display_name"], place["source"]) == ("Victoriei Ballroom", "gazetteer")
+    assert len(nominatim.requests) == 1
+    # The Nominatim miss is cached, the venue fallback still answers.
+    assert coder.search("victoriei ballr")["display_name"] == "Victoriei Ballroom"
+    assert len(nominatim.requests) == 1
+
+
+def test_short_query_goes_to_nominatim(nominatim):
+    gazetteer = Gazetteer([], [("Cafeneaua Verde", 44.44, 26.09)])
+    place = geocoder(nominatim, gazetteer=gazetteer).search("caf")
+    assert place["source"] == "nominatim"
+    assert place["display_name"] == "Caf, București"
+
+
+def test_gazetteer_answers_without_the_network(nominatim):
+    gazetteer = Gazetteer([("Piața Aviatorilor", 44.46, 26.08)])
+    place = geocoder(nominatim, gazetteer=gazetteer).search("Piata  AVIATORILOR")
+    assert place == {"lat": 44.46, "lon": 26.08, "display_name": "Piața Aviatorilor", "source": "gazetteer"}
+    assert nominatim.requests == []
+
+
+def test_repeated_query_never_reaches_the_network(nominatim):
+    coder = geocoder(nominatim)
+    first = coder.search("Herastrau")
+    assert first["source"] == "nominatim"
+    for query in ("herastrau", " HERĂSTRĂU "):
+        again = coder.search(query)
+        assert again["source"] == "cache"
+        assert {k: again[k] for k in ("lat", "lon", "display_name")} == {
+            k: first[k] for k in ("lat", "lon", "display_name")
+        }
+    assert len(nominatim.requests) == 1
+
+
+def test_disk_cache_survives_a_new_geocoder(nominatim, tmp_path):
+    path = tmp_path / "geocode.sqlite"
+    geocoder(nominatim, disk_cache=DiskCache(path)).search("herastrau")
+    place = geocoder(nominatim, disk_cache=DiskCache(path)).search("herastrau")
+    assert place["source"] == "cache"
+    assert place["lat"] == pytest.approx(44.47)
+    assert len(nominatim.requests) == 1
+
+
+def test_expired_disk_entries_are_fetched_again(nominatim, tmp_path):
+    path = tmp_path / "geocode.sqlite"
+    geocoder(nominatim, disk_cache=DiskCache(path, ttl=-1)).search("herastrau")
+    assert geocoder(nominatim, disk_cache=DiskCache(path, ttl=-1)).search("herastrau")["source"] == "nominatim"
+    assert len(nominatim.requests) == 2
+
+
+def test_misses_are_cached(nominatim, tmp_path):
+    path = tmp_path / "geocode.sqlite"
+    assert geocoder(nominatim, disk_cache=DiskCache(path)).search("nowhere") is None
+    coder = geocoder(nominatim, disk_cache=DiskCache(path))
+    assert coder.search("nowhere") is None
+    assert coder.search("nowhere") is None
+    assert len(nominatim.requests) == 1
+
+
+def test_http_errors_are_not_cached(nominatim, tmp_path):
+    disk_cache = DiskCache(tmp_path / "geocode.sqlite")
+    coder = geocoder(nominatim, disk_cache=disk_cache)
+    nominatim.failures.add("herastrau")
+    with pytest.raises(requests.HTTPError):
+        coder.search("herastrau")
+    assert disk_cache.get("herastrau") is None
+    assert coder.search("herastrau")["source"] == "nominatim"
+    assert len(nominatim.requests) == 2
+
+
+def test_connection_errors_are_not_cached(nominatim, tmp_path):
+    disk_cache = DiskCache(tmp_path / "geocode.sqlite")
+    coder = geocoder(nominatim, disk_cache=disk_cache)
+    coder.url = "http://127.0.0.1:9/search"
+    with pytest.raises(requests.ConnectionError):
+        coder.search("herastrau")
+    assert disk_cache.get("herastrau") is None
+    coder.url = nominatim.url
+    assert coder.search("herastrau")["source"] == "nominatim"
+
+
+def test_rate_limiter_spaces_concurrent_calls():
+    limiter = RateLimiter(0.05)
+    done, lock = [], threading.Lock()
+
+    def call():
+        limiter.wait()
+        with lock:
+            done.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The i-th call to get through cannot leave before i intervals have passed
+    # (less a little for sleep() returning early on coarse clocks).
+    for i, finished in enumerate(sorted(done)):
+        assert finished - start >= i * 0.05 - 0.005
@@ -0,0 +1,100 @@
+"""The vectorized hours engine against the original row-by-row dashboard code.
+
+``is_open_at`` and ``is_open_at_interval`` are copied from the dashboard as
+it was before ``amenities.hours``; the checks run on the shipped CSV.
+"""
+from datetime import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from amenities.data import PERIODS
+from amenities.hours import MINUTES_PER_DAY, normalize_hours, open_at, open_at_hour, open_during, open_throughout
+
+# Rows whose period flag changed on purpose: the old code missed venues open
+# past midnight (and the one open 24h) for these periods.
+CHANGED_PERIOD_ROWS = {"morning": 150, "midday": 283, "evening": 320, "night": 330}
+
+
+def is_open_at_interval(open_time, close_time, start_hour, end_hour):
+    open_h = open_time.hour + open_time.minute / 60
+    close_h = close_time.hour + close_time.minute / 60
+
+    if start_hour < end_hour:
+        return (open_h < end_hour) and (close_h > start_hour)
+    else:
+        return (open_h < end_hour) or (close_h > start_hour)
+
+
+def is_open_at(hour, open_time, close_time):
+    if open_time < close_time:
+        return open_time <= hour < close_time
+    else:
+        return hour >= open_time or hour < close_time
+
+
+@pytest.fixture(scope="module")
+def frames(df, csv_path):
+    raw = pd.read_csv(csv_path)
+    raw.columns = raw.columns.str.strip()
+    raw["opening_time"] = pd.to_datetime(raw["opening_hour"], format="%H:%M").dt.time
+    raw["closing_time"] = pd.to_datetime(raw["closing_hour"], format="%H:%M").dt.time
+    return raw, df
+
+
+@pytest.mark.parametrize("hour", range(24))
+def test_open_at_hour_matches_is_open_at(frames, hour):
+    raw, df = frames
+    old = np.array([is_open_at(time(hour, 0), o, c) for o, c in zip(raw["opening_time"], raw["closing_time"])])
+    new = open_at_hour(df["open_hours"].to_numpy(), hour)
+    assert np.array_equal(new, old)
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_period_flags_only_add_overnight_and_all_day_venues(frames, period):
+    raw, df = frames
+    start_hour, end_hour = PERIODS[period]
+    old = np.array([
+        is_open_at_interval(o, c, start_hour, end_hour) for o, c in zip(raw["opening_time"], raw["closing_time"])
+    ])
+    new = df[f"open_{period}"].to_numpy()
+    changed = old != new
+
+    assert changed.sum() == CHANGED_PERIOD_ROWS[period]
+    # Every change turns a flag on, and only for windows that are not a
+    # plain same-day opening < closing.
+    assert new[changed].all()
+    same_day = (raw["opening_time"] < raw["closing_time"]).to_numpy()
+    assert not same_day[changed].any()
+
+
+def window_minutes(start, end):
+    # Every minute of [start, end) on the 24h clock; start == end is the whole day.
+    length = (end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY
+    return (start + np.arange(length)) % MINUTES_PER_DAY
+
+
+@pytest.fixture(scope="module")
+def venues(df):
+    # The shipped windows plus random ones: overnight, around the clock and 23:59 closings.
+    rng = np.random.default_rng(2)
+    minutes = rng.integers(0, 96, size=(2, 400)) * 15
+    minutes[1, :40] = 23 * 60 + 59
+    minutes[1, 40:80] = minutes[0, 40:80]
+    opening, closing = normalize_hours(*minutes)
+    opening = np.concatenate([df["opening_min"].to_numpy(), opening])
+    closing = np.concatenate([df["closing_min"].to_numpy(), closing])
+    by_minute = open_at(opening[:, None], closing[:, None], np.arange(MINUTES_PER_DAY)[None, :])
+    return opening, closing, by_minute
+
+
+def test_open_during_and_throughout_match_minute_by_minute(venues):
+    opening, closing, by_minute = venues
+    rng = np.random.default_rng(22)
+    windows = [(0, 0), (0, 1), (1439, 0), (22 * 60, 2 * 60), (23 * 60, 23 * 60), (12 * 60, 12 * 60 + 1)]
+    windows += [tuple(int(v) for v in rng.integers(0, MINUTES_PER_DAY, 2)) for _ in range(300)]
+    for start, end in windows:
+        open_minutes = by_minute[:, window_minutes(start, end)]
+        assert np.array_equal(open_throughout(opening, closing, start, end), open_minutes.all(axis=1)), (start, end)
+        assert np.array_equal(open_during(opening, closing, start, end), open_minutes.any(axis=1)), (start, end)
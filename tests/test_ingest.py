@@ -0,0 +1,205 @@
+"""Streaming Overpass ingestion on small hand-written exports."""
+import gzip
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from amenities.data import PERIODS, build_frame
+from amenities.ingest import general_window, ingest, iter_elements, iter_json_elements
+from amenities.schedule import parse_opening_hours
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": 44.4301, "lon": 26.1001,
+     "tags": {"amenity": "bar", "name": "Fabrica", "opening_hours": "Mo-Th 18:00-02:00; Fr-Sa 18:00-05:00",
+              "website": "https://fabrica.example"}},
+    {"type": "way", "id": 1, "center": {"lat": 44.4402, "lon": 26.0902},
+     "tags": {"amenity": "cafe", "name": "Cafeneaua „Veche”",
+              "opening_hours": "Mo-Fr 08:00-16:00; Sa 10:00-14:00"}},
+    {"type": "node", "id": 2, "lat": 44.4203, "lon": 26.1103,
+     "tags": {"amenity": "restaurant", "name": "Caru' cu Bere", "opening_hours": "24/7"}},
+    {"type": "node", "id": 3, "lat": 44.4504, "lon": 26.0804,
+     "tags": {"amenity": "pharmacy", "name": "Farmacia"}},
+    {"type": "node", "id": 4, "lat": 44.4605, "lon": 26.0705,
+     "tags": {"amenity": "pub", "name": "Fără ore"}},
+    {"type": "node", "id": 5, "lat": 44.4106, "lon": 26.1206,
+     "tags": {"amenity": "cinema", "name": "Cinema Pro", "opening_hours": "Mo-Su 10:00-24:00"}},
+]
+
+
+def overpass_json(elements):
+    return json.dumps({"version": 0.6, "generator": "Overpass API", "osm3s": {"copyright": "ODbL"},
+                       "elements": elements}, ensure_ascii=False, indent=1)
+
+
+def overpass_xml(elements):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6" generator="Overpass API">',
+             '<note>The data included in this document is from www.openstreetmap.org.</note>']
+    for e in elements:
+        tags = "".join(f'<tag k="{k}" v="{v}"/>' for k, v in e["tags"].items())
+        if e["type"] == "node":
+            lines.append(f'<node id="{e["id"]}" lat="{e["lat"]}" lon="{e["lon"]}">{tags}</node>')
+        else:
+            center = e["center"]
+            lines.append(f'<{e["type"]} id="{e["id"]}"><center lat="{center["lat"]}" lon="{center["lon"]}"/>'
+                         f'<nd ref="7"/><nd ref="8"/>{tags}</{e["type"]}>')
+    lines.append("</osm>")
+    return "\n".join(lines)
+
+
+def expected_elements(elements):
+    return [
+        {"type": e["type"], "id": e["id"], "lat": e.get("lat", e.get("center", {}).get("lat")),
+         "lon": e.get("lon", e.get("center", {}).get("lon")), "tags": e["tags"]}
+        for e in elements
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 50, 1 << 16])
+def test_json_elements_across_chunk_boundaries(chunk_size):
+    text = overpass_json(ELEMENTS)
+    assert list(iter_json_elements(io.StringIO(text), chunk_size)) == expected_elements(ELEMENTS)
+
+
+def test_json_without_elements():
+    assert list(iter_json_elements(io.StringIO('{"version": 0.6, "elements": []}'), 4)) == []
+    assert list(iter_json_elements(io.StringIO('{"version": 0.6}'), 4)) == []
+
+
+@pytest.mark.parametrize("chunk_size", [5, 1 << 16])
+def test_truncated_json_raises(chunk_size):
+    text = overpass_json(ELEMENTS)
+    array = text.index("[", text.index('"elements"')) + 1
+    _, first_end = json.JSONDecoder().raw_decode(text, text.index("{", array))
+    # Inside an element, between two, and with the closing bracket missing.
+    for cut in (array + 20, first_end - 10, first_end + 1, len(text) - 3):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_elements(io.StringIO(text[:cut]), chunk_size))
+
+
+@pytest.mark.parametrize("fmt", ["json", "xml"])
+@pytest.mark.parametrize("compressed", [False, True])
+def test_iter_elements_sniffs_json_xml_and_gzip(tmp_path, fmt, compressed):
+    text = overpass_json(ELEMENTS) if fmt == "json" else overpass_xml(ELEMENTS)
+    path = tmp_path / f"export.{fmt}{'.gz' if compressed else ''}"
+    if compressed:
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        path.write_text(text, encoding="utf-8")
+    got = list(iter_elements(str(path)))
+    expected = expected_elements(ELEMENTS)
+    if fmt == "xml":
+        for e in expected:
+            e["lat"], e["lon"] = float(e["lat"]), float(e["lon"])
+    assert got == expected
+
+
+def test_iter_elements_rejects_other_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("amenity,name\n")
+    with pytest.raises(ValueError):
+        list(iter_elements(str(path)))
+
+
+def write_export(tmp_path, name, elements):
+    path = tmp_path / name
+    path.write_text(overpass_json(elements), encoding="utf-8")
+    return str(path)
+
+
+def read_output(path):
+    return pd.read_csv(path, keep_default_na=False)
+
+
+def test_ingest_writes_hours_and_period_flags(tmp_path):
+    output = tmp_path / "out.csv"
+    stats = ingest([write_export(tmp_path, "a.json", ELEMENTS)], str(output))
+    assert (stats["written"], stats["other_amenity"], stats["no_hours"]) == (4, 1, 1)
+
+    rows = read_output(output).set_index("name")
+    assert list(rows.index) == ["Fabrica", "Cafeneaua „Veche”", "Caru' cu Bere", "Cinema Pro"]
+    windows = rows[["opening_hour", "closing_hour"]].agg("-".join, axis=1).to_dict()
+    assert windows == {
+        "Fabrica": "18:00-05:00",
+        "Cafeneaua „Veche”": "08:00-16:00",
+        "Caru' cu Bere": "00:00-23:59",
+        "Cinema Pro": "10:00-23:59",
+    }
+    assert rows.loc["Fabrica", "opening_hours"] == "Mo-Th 18:00-02:00; Fr-Sa 18:00-05:00"
+    assert rows.loc["Fabrica", "website"] == "https://fabrica.example"
+    assert rows.loc["Cafeneaua „Veche”", "website"] == ""
+
+    # The open_* flags are the ones the dashboard derives from the two hour columns.
+    frame = build_frame(output)
+    for column, period in zip(("open_dawn", "open_day", "open_dusk", "open_night"), PERIODS):
+        assert rows[column].astype(bool).tolist() == frame[f"open_{period}"].tolist()
+
+
+def test_default_hours_keep_venues_without_opening_hours(tmp_path):
+    output = tmp_path / "out.csv"
+    stats = ingest([write_export(tmp_path, "a.json", ELEMENTS)], str(output), default_hours=(600, 1320))
+    assert stats["written"] == 5
+    row = read_output(output).set_index("name").loc["Fără ore"]
+    assert (row["opening_hour"], row["closing_hour"], row["opening_hours"]) == ("10:00", "22:00", "")
+
+
+def test_duplicates_by_id_across_inputs(tmp_path):
+    output = tmp_path / "out.csv"
+    first = write_export(tmp_path, "a.json", ELEMENTS[:3])
+    # Node 1 again, moved and renamed: still the same OSM object. Relation 1
+    # shares only the number.
+    moved = dict(ELEMENTS[0], lat=44.5, lon=26.2, tags=dict(ELEMENTS[0]["tags"], name="Renamed"))
+    relation = {"type": "relation", "id": 1, "center": {"lat": 44.5, "lon": 26.2}, "tags": ELEMENTS[0]["tags"]}
+    second = write_export(tmp_path, "b.json", [moved, relation])
+    stats = ingest([first, second], str(output))
+    assert stats["duplicate_id"] == 1
+    assert read_output(output)["name"].tolist() == ["Fabrica", "Cafeneaua „Veche”", "Caru' cu Bere", "Fabrica"]
+
+
+def test_duplicates_by_name_within_distance(tmp_path):
+    base = {"type": "node", "tags": {"amenity": "bar", "name": "Control Club", "opening_hours": "20:00-04:00"}}
+    elements = [
+        dict(base, id=10, lat=44.43600, lon=26.09800),
+        # ~20 m east, name differs only in case, spacing and diacritics: a duplicate.
+        dict(base, id=11, lat=44.43600, lon=26.09825, tags=dict(base["tags"], name="  CONTROL  clúb ")),
+        # ~30 m north: a duplicate.
+        dict(base, id=12, lat=44.43627, lon=26.09800),
+        # ~200 m away: a second venue with the same name.
+        dict(base, id=13, lat=44.43780, lon=26.09800),
+        # Same spot, another name: kept.
+        dict(base, id=14, lat=44.43600, lon=26.09800, tags=dict(base["tags"], name="Club Control")),
+    ]
+    output = tmp_path / "out.csv"
+    stats = ingest([write_export(tmp_path, "a.json", elements)], str(output))
+    assert stats["duplicate_nearby"] == 2
+    rows = read_output(output)
+    assert rows["lat"].round(5).tolist() == [44.436, 44.4378, 44.436]
+    assert rows["name"].tolist() == ["Control Club", "Control Club", "Club Control"]
+
+
+def test_failed_run_keeps_the_previous_output(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("previous\n")
+    broken = tmp_path / "broken.json"
+    broken.write_text(overpass_json(ELEMENTS)[:-40])
+    with pytest.raises(json.JSONDecodeError):
+        ingest([str(broken)], str(output))
+    assert output.read_text() == "previous\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["broken.json", "out.csv"]
+
+
+@pytest.mark.parametrize("text, window", [
+    ("Mo-Fr 09:00-17:00; Sa 10:00-14:00", (540, 1020)),
+    ("Mo-Th 18:00-02:00; Fr-Sa 18:00-05:00", (1080, 300)),
+    ("Mo-Fr 08:00-12:00,13:00-23:00", (480, 1380)),
+    ("Mo 10:00-18:00; Tu 20:00-03:00", (600, 180)),
+    ("Mo 06:00-18:00; Tu 20:00-08:00", (0, 1440)),
+    ("Mo-Su 10:00-24:00", (600, 1440)),
+    ("24/7", (0, 1440)),
+    ("Mo-Su 12:00-12:00", (0, 1440)),
+    ("off", None),
+])
+def test_general_window(text, window):
+    assert general_window(parse_opening_hours(text)) == window
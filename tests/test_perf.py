@@ -0,0 +1,117 @@
+"""Stage timings: rolling percentiles, the Prometheus text file and the JSON log."""
+import json
+import re
+
+import pytest
+
+from amenities.perf import RerunTimer, StageStats
+
+# One sample line of the Prometheus text format: name{labels} value.
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{((?:[a-zA-Z_]\w*="(?:[^"\\\n]|\\.)*",?)*)\} (\S+)$')
+LABEL_RE = re.compile(r'([a-zA-Z_]\w*)="((?:[^"\\\n]|\\.)*)"')
+
+
+def parse_prometheus(text):
+    """{(metric, frozenset(labels)): value}, failing on any line that is not valid."""
+    assert text.endswith("\n")
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+            continue
+        match = SAMPLE_RE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        unescaped = {
+            key: re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), raw)
+            for key, raw in LABEL_RE.findall(labels)
+        }
+        samples[name, frozenset(unescaped.items())] = float(value)
+    return types, samples
+
+
+def test_percentiles_of_known_samples():
+    stats = StageStats()
+    for ms in range(100, 0, -1):
+        stats.add("viewport", ms / 1000)
+    stats.add("markers", 0.25)
+    summary = stats.summary()
+    # Linear interpolation between the closest ranks, as numpy.percentile.
+    assert summary["viewport"]["p50_ms"] == pytest.approx(50.5)
+    assert summary["viewport"]["p95_ms"] == pytest.approx(95.05)
+    assert summary["viewport"]["count"] == 100
+    assert summary["viewport"]["sum_s"] == pytest.approx(5.05)
+    assert summary["markers"] == {"count": 1, "sum_s": 0.25, "p50_ms": 250.0, "p95_ms": 250.0}
+
+
+def test_percentiles_cover_the_rolling_window_only():
+    stats = StageStats(window=10)
+    for ms in [1000] * 50 + list(range(1, 11)):
+        stats.add("total", ms / 1000)
+    summary = stats.summary()["total"]
+    assert summary["p50_ms"] == pytest.approx(5.5)
+    assert summary["p95_ms"] == pytest.approx(9.55)
+    # Count and sum are since the start, as a Prometheus summary expects.
+    assert summary["count"] == 60
+    assert summary["sum_s"] == pytest.approx(50.055)
+
+
+def test_prometheus_text_format():
+    stats = StageStats()
+    stage = 'odd "stage" \\ name\nsecond line'
+    for ms in (10, 20, 30, 40):
+        stats.add("viewport", ms / 1000)
+        stats.add(stage, ms / 1000)
+    types, samples = parse_prometheus(stats.prometheus())
+    assert types == {"dashboard_stage_seconds": "summary"}
+    for name in ("viewport", stage):
+        assert samples["dashboard_stage_seconds", frozenset({("stage", name), ("quantile", "0.5")})] == 0.025
+        assert samples["dashboard_stage_seconds", frozenset({("stage", name), ("quantile", "0.95")})] == 0.0385
+        assert samples["dashboard_stage_seconds_sum", frozenset({("stage", name)})] == 0.1
+        assert samples["dashboard_stage_seconds_count", frozenset({("stage", name)})] == 4
+    assert len(samples) == 8
+
+
+def test_empty_stats_are_still_valid():
+    types, samples = parse_prometheus(StageStats().prometheus())
+    assert types == {"dashboard_stage_seconds": "summary"}
+    assert samples == {}
+
+
+def test_finished_rerun_is_logged_and_exported(tmp_path, monkeypatch):
+    log_path, prom_path = tmp_path / "perf.jsonl", tmp_path / "perf.prom"
+    monkeypatch.setenv("DASHBOARD_PERF_LOG", str(log_path))
+    monkeypatch.setenv("DASHBOARD_PERF_PROM", str(prom_path))
+    stats = StageStats()
+    for total in ("total", "map_fragment"):
+        timer = RerunTimer(session_id="abc", stats=stats, total=total)
+        assert timer.enabled
+        with timer.stage("viewport") as stage:
+            stage["rows"] = 12
+        record = timer.finish()
+        assert record["rerun"] == total
+        assert [(s["stage"], s["rows"]) for s in record["stages"]] == [("viewport", 12)]
+
+    records = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [(r["session"], r["rerun"]) for r in records] == [("abc", "total"), ("abc", "map_fragment")]
+    _, samples = parse_prometheus(prom_path.read_text())
+    counts = {dict(labels)["stage"]: value for (name, labels), value in samples.items() if name.endswith("_count")}
+    assert counts == {"viewport": 2, "total": 1, "map_fragment": 1}
+    # The Prometheus file is replaced whole, never left half written.
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["perf.jsonl", "perf.prom"]
+
+
+def test_disabled_timer_records_nothing(monkeypatch):
+    for name in ("DASHBOARD_PERF", "DASHBOARD_PERF_LOG", "DASHBOARD_PERF_PROM"):
+        monkeypatch.delenv(name, raising=False)
+    stats = StageStats()
+    timer = RerunTimer(stats=stats)
+    with timer.stage("viewport") as stage:
+        stage["rows"] = 3
+    assert timer.finish() is None
+    assert timer.finished
+    assert timer.stages == []
+    assert stats.summary() == {}
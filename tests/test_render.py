@@ -0,0 +1,103 @@
+"""GeoJSON features and the layers that inline them into the page."""
+import json
+import re
+
+import folium
+import numpy as np
+import pandas as pd
+import pytest
+
+from amenities.render import _LAYER_HELPERS, VenueLayer, playback_features, venue_features
+from amenities.schedule import SLOT_MINUTES, SLOTS_PER_DAY, WeeklySchedule
+
+HOSTILE_NAME = """</script><script>alert("x")</script> & 'Bar' <b>"""
+
+
+def venue_frame(names, websites):
+    return pd.DataFrame({
+        "lat": [44.4301234567] * len(names),
+        "lon": [26.1001234567] * len(names),
+        "name": names,
+        "amenity": pd.Categorical(["spaceship"] * len(names)),
+        "opening_hour": ["18:00"] * len(names),
+        "closing_hour": ["02:00"] * len(names),
+        "website": websites,
+    })
+
+
+@pytest.fixture(scope="module")
+def schedule(df):
+    return WeeklySchedule.from_frame(df)
+
+
+def test_venue_features(df):
+    features = venue_features(df.head(5))
+    assert [f["properties"]["name"] for f in features] == df["name"].head(5).tolist()
+    first = features[0]
+    assert first["geometry"]["coordinates"] == [round(float(df["lon"].iloc[0]), 6), round(float(df["lat"].iloc[0]), 6)]
+    assert set(first["properties"]) == {"name", "amenity", "open", "close", "website"}
+
+
+@pytest.mark.parametrize("website, expected", [
+    ("https://fabrica.example/meniu?zi=luni&ora=20", "https://fabrica.example/meniu?zi=luni&ora=20"),
+    ("HTTP://Fabrica.example", "HTTP://Fabrica.example"),
+    ('https://x.example/"><script>', "https://x.example/%22%3E%3Cscript%3E"),
+    ("https://x.example/ceainărie", "https://x.example/ceain%C4%83rie"),
+    ("javascript:alert(1)", ""),
+    (" javascript:alert(1)", ""),
+    ("data:text/html,<script>alert(1)</script>", ""),
+    ("", ""),
+])
+def test_only_web_links_are_kept(website, expected):
+    (feature,) = venue_features(venue_frame(["Fabrica"], [website]))
+    assert feature["properties"]["website"] == expected
+
+
+def test_names_cannot_break_out_of_the_script(tmp_path):
+    layer = VenueLayer(venue_features(venue_frame([HOSTILE_NAME], [""])))
+    assert not set("<>&") & set(layer.data)
+    assert json.loads(layer.data)["features"][0]["properties"]["name"] == HOSTILE_NAME
+
+    m = folium.Map(location=[44.43, 26.1], zoom_start=13, tiles=None)
+    layer.add_to(m)
+    html = m.get_root().render()
+    assert "alert(" in html
+    assert "<script>alert(" not in html
+    assert "<b>" not in html
+
+
+def test_popup_escapes_every_property():
+    # popupHtml runs in the browser: every property it writes into the HTML
+    # goes through esc(); the amenity only picks a colour.
+    popup = re.search(r"function popupHtml\(p\) \{(.*?)\n            \}", _LAYER_HELPERS, re.S).group(1)
+    used = re.findall(r"(\w*)[(\[]p\.(\w+)", popup)
+    assert len(used) == len(re.findall(r"\bp\.", popup))
+    assert set(used) == {
+        ("esc", "name"), ("esc", "open"), ("esc", "close"), ("esc", "website"), ("colors", "amenity"), ("", "website"),
+    }
+
+
+def unpack(words, slot):
+    # What the browser's isOpen(words, s) reads.
+    return (words[slot >> 5] >> (slot & 31)) & 1 == 1
+
+
+@pytest.mark.parametrize("day, stay", [(0, 0), (4, 0), (5, 60), (6, 0)])
+def test_playback_masks_match_the_schedule(df, schedule, day, stay):
+    rows = np.sort(np.random.default_rng(day).choice(len(df), 300, replace=False))
+    codes = schedule.code[rows]
+    features, masks = playback_features(df.iloc[rows], schedule.day_frames(day, stay), codes)
+
+    # One mask per schedule in view, shared by every venue on that schedule.
+    s = np.array([f["properties"]["s"] for f in features])
+    assert len(masks) == len(np.unique(codes))
+    assert sorted(set(s.tolist())) == list(range(len(masks)))
+    assert all(len(words) == 3 for words in masks)
+    for code in np.unique(codes):
+        assert len(set(s[codes == code].tolist())) == 1
+
+    for slot in range(SLOTS_PER_DAY):
+        minute = slot * SLOT_MINUTES
+        expected = schedule.open_at(day, minute) if stay == 0 else schedule.open_throughout(day, minute, stay)
+        got = [unpack(masks[i], slot) for i in s]
+        assert got == expected[rows].tolist(), slot
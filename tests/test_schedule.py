@@ -0,0 +1,88 @@
+"""OSM opening_hours parsing and the packed weekly schedules."""
+import numpy as np
+import pytest
+
+from amenities.hours import open_at
+from amenities.schedule import SLOT_MINUTES, SLOTS_PER_DAY, WeeklySchedule, parse_opening_hours, slots_from_spans
+
+ALL_DAY = [(0, 1440)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Mo-Fr 09:00-17:00", {d: [(540, 1020)] for d in range(5)}),
+    ("Fr-Mo 10:00-12:00", {d: [(600, 720)] for d in (4, 5, 6, 0)}),
+    ("Mo,We-Th 08:00-10:00,12:00-14:30", {d: [(480, 600), (720, 870)] for d in (0, 2, 3)}),
+    ("Tu: 11:00-23:00", {1: [(660, 1380)]}),
+    ("12:00-22:00", {d: [(720, 1320)] for d in range(7)}),
+    ("Mo-Sa 09:00-18:00; Su 10:00-14:00", {**{d: [(540, 1080)] for d in range(6)}, 6: [(600, 840)]}),
+    ("Mo-Su 08:00-20:00; We 10:00-12:00", {**{d: [(480, 1200)] for d in range(7)}, 2: [(600, 720)]}),
+    ("Mo-Fr 18:00+", {d: [(1080, 1440)] for d in range(5)}),
+    ("Mo-Fr 09:00-17:00; PH off", {d: [(540, 1020)] for d in range(5)}),
+    ("Mo-Fr 09:00-17:00 || Sa 10:00-12:00", {d: [(540, 1020)] for d in range(5)}),
+])
+def test_day_ranges_lists_and_rules(text, expected):
+    assert parse_opening_hours(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Fr-Sa 20:00-03:00", {4: [(1200, 1620)], 5: [(1200, 1620)]}),
+    ("Mo-Su 18:00-00:00", {d: [(1080, 1440)] for d in range(7)}),
+    ("Th 22:00-24:00", {3: [(1320, 1440)]}),
+    ("Su 12:00-12:00", {6: [(720, 2160)]}),
+])
+def test_overnight_spans(text, expected):
+    assert parse_opening_hours(text) == expected
+
+
+@pytest.mark.parametrize("text", ["24/7", " 24/7 ", "Mo-Su 00:00-24:00", "Mo-Su 24/7", "Mo-Su"])
+def test_around_the_clock(text):
+    assert parse_opening_hours(text) == {d: ALL_DAY for d in range(7)}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Mo-Su 10:00-22:00; Su off", {**{d: [(600, 1320)] for d in range(6)}, 6: []}),
+    ("Mo-Sa 09:00-18:00; Su closed", {**{d: [(540, 1080)] for d in range(6)}, 6: []}),
+    ("24/7; Mo off", {0: [], **{d: ALL_DAY for d in range(1, 7)}}),
+    ("off", {d: [] for d in range(7)}),
+])
+def test_off_rules(text, expected):
+    assert parse_opening_hours(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    None, "", " ; ", "sunrise-sunset", "Jan-Mar 10:00-12:00", "Mo-Fr 25:00-26:00", "Mo-Fr 09:75-10:00",
+    "Mo-Fr 09:00", "Mo-Fr 9-17", "open daily", "Xy 10:00-12:00",
+])
+def test_invalid_input(text):
+    assert parse_opening_hours(text) is None
+
+
+def test_overnight_spans_spill_into_the_next_day():
+    slots = slots_from_spans(parse_opening_hours("Su 22:00-02:30"))
+    assert np.flatnonzero(slots[6]).tolist() == list(range(88, 96))
+    assert np.flatnonzero(slots[0]).tolist() == list(range(0, 10))
+    assert not slots[1:6].any()
+
+
+def test_two_column_schedules_match_open_at(df):
+    # The shipped CSV has no opening_hours column: every day repeats the window.
+    assert "opening_hours" not in df
+    schedule = WeeklySchedule.from_frame(df)
+    opening, closing = df["opening_min"].to_numpy(), df["closing_min"].to_numpy()
+    for slot in range(SLOTS_PER_DAY):
+        expected = open_at(opening, closing, slot * SLOT_MINUTES)
+        for day in range(7):
+            assert np.array_equal(schedule.open_at(day, slot * SLOT_MINUTES), expected), (day, slot)
+
+
+def test_opening_hours_column_overrides_the_window(df):
+    frame = df.head(3).copy()
+    frame["opening_hours"] = ["Mo-Fr 09:00-17:00", "not parseable", "Sa 22:00-02:00"]
+    schedule = WeeklySchedule.from_frame(frame)
+    at_noon_monday = schedule.open_at(0, 12 * 60)
+    window = open_at(frame["opening_min"].to_numpy(), frame["closing_min"].to_numpy(), 12 * 60)
+    assert at_noon_monday.tolist() == [True, bool(window[1]), False]
+    assert schedule.open_at(5, 23 * 60).tolist()[::2] == [False, True]
+    assert schedule.open_at(6, 60).tolist()[::2] == [False, True]
+    assert schedule.open_throughout(6, 0, 120).tolist()[::2] == [False, True]
+    assert schedule.open_throughout(6, 0, 135).tolist()[::2] == [False, False]
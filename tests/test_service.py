@@ -0,0 +1,102 @@
+"""The query service over HTTP, in process, on the shipped CSV."""
+import threading
+
+import pytest
+import requests
+
+from amenities.query import filter_mask
+from amenities.service import AmenityQueryService, QueryServer
+
+
+@pytest.fixture(scope="module")
+def service(csv_path):
+    return AmenityQueryService(csv_path)
+
+
+@pytest.fixture(scope="module")
+def server(service):
+    server = QueryServer(("127.0.0.1", 0), service, workers=4)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_venues_match_filter_mask(server, service):
+    response = requests.get(server.url + "/venues", params={"amenity": "bar", "hour": 22, "limit": 5000})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("application/json")
+    body = response.json()
+    assert body["count"] == len(body["venues"]) == int(filter_mask(service.df, "bar", hour=22).sum())
+    assert {venue["amenity"] for venue in body["venues"]} == {"bar"}
+
+
+def test_weekday_query_matches_filter_mask(server, service):
+    response = requests.get(server.url + "/venues", params={"day": "fr", "time": "23:30", "stay": 60, "limit": 5000})
+    expected = filter_mask(service.df, schedule=service.schedule, day=4, minute=23 * 60 + 30, stay_minutes=60)
+    assert response.json()["count"] == int(expected.sum())
+
+
+def test_geojson(server):
+    response = requests.get(server.url + "/venues", params={"hour": 12, "limit": 7, "format": "geojson"})
+    assert response.headers["Content-Type"].startswith("application/geo+json")
+    body = response.json()
+    assert body["type"] == "FeatureCollection"
+    assert len(body["features"]) == 7
+
+
+def test_etag_revalidation(server):
+    url = server.url + "/venues?amenity=pub&hour=20"
+    first = requests.get(url)
+    etag = first.headers["ETag"]
+    assert "max-age" in first.headers["Cache-Control"]
+    unchanged = requests.get(url, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert requests.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_equivalent_queries_share_a_cache_entry(service):
+    first = service.query(service.normalize({"day": ["fr"], "time": ["23:30"]}))
+    again = service.query(service.normalize({"day": ["4"], "time": ["23:37"], "amenity": ["All"]}))
+    assert again[0] is first[0]
+
+
+def test_cache_is_capped_by_bytes(csv_path):
+    service = AmenityQueryService(csv_path, cache_bytes=200_000)
+    keys = [service.normalize({"hour": [str(hour)], "limit": ["5000"]}) for hour in range(24)]
+    for key in keys:
+        service.query(key)
+        assert service.cache_bytes == sum(len(body) for body, _ in service._cache.values())
+        assert service.cache_bytes <= 200_000
+    assert keys[-1] in service._cache
+    assert keys[0] not in service._cache
+
+
+@pytest.mark.parametrize("query", [
+    "hour=24",
+    "hour=noon",
+    "amenity=spaceship",
+    "day=fr",
+    "stay=60",
+    "day=fr&stay=60",
+    "time=23:30",
+    "day=xx&time=23:30",
+    "day=fr&time=25:00",
+    "hour=3&day=fr&time=01:00",
+    "day=fr&time=23:30&stay=long",
+    "bbox=44.4,26.1,44.5",
+    "bbox=44.5,26.1,44.4,26.2",
+    "limit=many",
+    "format=xml",
+])
+def test_bad_parameters_are_400(server, query):
+    response = requests.get(f"{server.url}/venues?{query}")
+    assert response.status_code == 400
+    assert response.json()["error"]
+
+
+def test_health_and_unknown_paths(server):
+    assert requests.get(server.url + "/health").json() == {"status": "ok"}
+    assert requests.get(server.url + "/nothing").status_code == 404
@@ -0,0 +1,63 @@
+"""GridIndex viewport and nearest queries against brute-force scans of the shipped CSV."""
+import numpy as np
+import pytest
+
+from amenities.query import filter_mask
+from amenities.spatial import GridIndex, haversine_m
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return GridIndex(df["lat"].to_numpy(), df["lon"].to_numpy())
+
+
+def brute_force_query(index, bounds, mask=None):
+    lat_min, lat_max, lon_min, lon_max = bounds
+    inside = (index.lat >= lat_min) & (index.lat <= lat_max) & (index.lon >= lon_min) & (index.lon <= lon_max)
+    if mask is not None:
+        inside &= mask
+    return np.flatnonzero(inside)
+
+
+def test_query_matches_brute_force(df, random_bounds, index):
+    rng = np.random.default_rng(3)
+    masks = [None, filter_mask(df, "bar", hour=21), rng.random(len(df)) < 0.3]
+    for bounds in random_bounds(rng, 200):
+        for mask in masks:
+            assert np.array_equal(index.query(bounds, mask=mask), brute_force_query(index, bounds, mask))
+
+
+def test_query_without_bounds_returns_every_match(df, index):
+    mask = filter_mask(df, "restaurant", hour=12)
+    assert np.array_equal(index.query(mask=mask), np.flatnonzero(mask))
+
+
+def test_limited_query_is_a_subset_of_the_matches(random_bounds, index):
+    rng = np.random.default_rng(4)
+    for bounds in random_bounds(rng, 50):
+        expected = brute_force_query(index, bounds)
+        rows = index.query(bounds, limit=30)
+        assert len(rows) == min(30, len(expected))
+        assert len(np.unique(rows)) == len(rows)
+        assert np.isin(rows, expected).all()
+
+
+def brute_force_nearest(index, lat, lon, k, radius_m, mask=None):
+    dist = haversine_m(lat, lon, index.lat, index.lon)
+    rows = np.flatnonzero((dist <= radius_m) & (True if mask is None else mask))
+    order = np.lexsort((rows, dist[rows]))[:k]
+    return rows[order], dist[rows[order]]
+
+
+def test_nearest_matches_brute_force(df, index):
+    rng = np.random.default_rng(13)
+    masks = [None, filter_mask(df, "bar", hour=21), filter_mask(df, hour=3)]
+    for _ in range(120):
+        lat = rng.uniform(index.lat_min, index.lat_max)
+        lon = rng.uniform(index.lon_min, index.lon_max)
+        k, radius_m = int(rng.integers(1, 20)), float(rng.uniform(100, 5000))
+        for mask in masks:
+            rows, dist = index.nearest(lat, lon, k=k, radius_m=radius_m, mask=mask)
+            expected_rows, expected_dist = brute_force_nearest(index, lat, lon, k, radius_m, mask)
+            assert np.array_equal(rows, expected_rows)
+            assert np.allclose(dist, expected_dist)
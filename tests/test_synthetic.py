@@ -0,0 +1,39 @@
+"""Synthetic datasets load exactly like the shipped CSV."""
+import pandas as pd
+
+from amenities.data import PERIODS, build_frame
+from amenities.synthetic import AMENITY_MIX, generate, write_csv
+
+
+def test_csv_has_the_shipped_columns_and_dtypes(csv_path, tmp_path):
+    path = write_csv(tmp_path / "synthetic.csv", 2000, seed=1)
+    shipped, synthetic = pd.read_csv(csv_path), pd.read_csv(path)
+    assert list(synthetic.columns) == list(shipped.columns)
+    assert synthetic.dtypes.to_dict() == shipped.dtypes.to_dict()
+
+
+def test_build_frame_gives_the_same_schema(df, tmp_path):
+    frame = build_frame(write_csv(tmp_path / "synthetic.csv", 2000, seed=2))
+    assert list(frame.columns) == list(df.columns)
+    assert frame.dtypes.to_dict() == df.dtypes.to_dict()
+    assert set(frame["amenity"].cat.categories) == set(AMENITY_MIX) == set(df["amenity"].cat.categories)
+    assert frame["website"].str.startswith("https://").all()
+
+
+def test_period_flags_match_the_derived_ones(tmp_path):
+    path = write_csv(tmp_path / "synthetic.csv", 2000, seed=3)
+    raw, frame = pd.read_csv(path), build_frame(path)
+    for column, period in zip(("open_dawn", "open_day", "open_dusk", "open_night"), PERIODS):
+        assert raw[column].astype(bool).tolist() == frame[f"open_{period}"].tolist()
+
+
+def test_hours_cover_overnight_and_all_day_venues():
+    venues = generate(5000, seed=4)
+    assert venues["closing_hour"].eq("23:59").any()
+    overnight = venues["closing_hour"] < venues["opening_hour"]
+    assert 0.15 < overnight.mean() < 0.35
+
+
+def test_same_seed_same_venues():
+    assert generate(300, seed=5).equals(generate(300, seed=5))
+    assert not generate(300, seed=5).equals(generate(300, seed=6))
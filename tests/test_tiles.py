@@ -0,0 +1,151 @@
+"""The caching tile proxy against a local stand-in upstream tile server."""
+import concurrent.futures
+import threading
+import time
+
+import pytest
+import requests
+
+from amenities import tiles
+from amenities.tiles import (
+    MissingTokenError, TileCache, TileFetcher, TileProxyServer, mapbox_url, prefetch, tiles_in,
+)
+
+TILE = "/tiles/day/12/2332/1476.png"
+# A few streets around Piața Unirii: a handful of tiles per zoom.
+SMALL_BBOX = (44.424, 44.430, 26.098, 26.106)
+
+
+@pytest.fixture
+def upstream(stub_server):
+    # Serves a distinct body per tile; paths in `broken` answer 500, in `absent` 404.
+    state = {"broken": set(), "absent": set(), "delay": 0.0}
+
+    def respond(handler):
+        time.sleep(state["delay"])
+        if handler.path in state["broken"]:
+            return 500, {}, b"upstream broke"
+        if handler.path in state["absent"]:
+            return 404, {}, b"no such tile"
+        return 200, {"Content-Type": "image/png"}, f"png {handler.path}".encode().ljust(256, b".")
+
+    server = stub_server(respond)
+    server.state = state
+    return server
+
+
+@pytest.fixture
+def fetcher(upstream, tmp_path):
+    return TileFetcher(TileCache(tmp_path / "tiles.sqlite"), url=upstream.url + "/{style}/{z}/{x}/{y}")
+
+
+@pytest.fixture
+def proxy(fetcher):
+    server = TileProxyServer(("127.0.0.1", 0), fetcher)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_miss_then_hit(proxy, upstream):
+    first = requests.get(proxy.url + TILE)
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    assert first.content.startswith(b"png /day/12/2332/1476")
+    second = requests.get(proxy.url + TILE)
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.content == first.content
+    assert upstream.requests == ["/day/12/2332/1476"]
+
+
+def test_etag_revalidation(proxy):
+    etag = requests.get(proxy.url + TILE).headers["ETag"]
+    unchanged = requests.get(proxy.url + TILE, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["ETag"] == etag
+    stale = requests.get(proxy.url + TILE, headers={"If-None-Match": '"something-else"'})
+    assert stale.status_code == 200
+
+
+@pytest.mark.parametrize("path", ["/tiles/noon/12/1/1", "/tiles/day/3/8/0", "/tiles/day/12/1/1/extra", "/other"])
+def test_unknown_paths_are_404(proxy, upstream, path):
+    assert requests.get(proxy.url + path).status_code == 404
+    assert upstream.requests == []
+
+
+def test_missing_upstream_tile_is_404_and_not_cached(proxy, upstream, fetcher):
+    upstream.state["absent"].add("/day/12/2332/1476")
+    assert requests.get(proxy.url + TILE).status_code == 404
+    assert "day/12/2332/1476" not in fetcher.cache
+
+
+def test_upstream_failure_is_502_and_not_cached(proxy, upstream, fetcher):
+    upstream.state["broken"].add("/day/12/2332/1476")
+    assert requests.get(proxy.url + TILE).status_code == 502
+    assert "day/12/2332/1476" not in fetcher.cache
+    upstream.state["broken"].clear()
+    assert requests.get(proxy.url + TILE).headers["X-Cache"] == "MISS"
+
+
+def test_unreachable_upstream_is_502(proxy, fetcher):
+    fetcher.url = "http://127.0.0.1:9/{style}/{z}/{x}/{y}"
+    assert requests.get(proxy.url + TILE).status_code == 502
+
+
+def test_concurrent_misses_fetch_once(proxy, upstream):
+    upstream.state["delay"] = 0.3
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: requests.get(proxy.url + TILE), range(8)))
+    assert [r.status_code for r in responses] == [200] * 8
+    assert len({r.content for r in responses}) == 1
+    assert sorted(r.headers["X-Cache"] for r in responses) == ["HIT"] * 7 + ["MISS"]
+    assert len(upstream.requests) == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiles, "TOUCH_INTERVAL", 0)
+    path = tmp_path / "tiles.sqlite"
+    cache = TileCache(path, max_bytes=10_000)
+    for i in range(10):
+        cache.put(f"day/15/{i}/0", bytes(1000), "image/png")
+        time.sleep(0.002)
+    assert cache.get("day/15/0/0") is not None  # now the most recently used
+    cache.put("day/15/10/0", bytes(1000), "image/png")
+
+    # Evicted down to 90% of the cap, oldest first.
+    assert cache.total_bytes == 9000
+    assert "day/15/0/0" in cache
+    assert "day/15/1/0" not in cache and "day/15/2/0" not in cache
+    assert all(f"day/15/{i}/0" in cache for i in range(3, 11))
+    assert TileCache(path, max_bytes=10_000).total_bytes == 9000
+
+
+def test_prefetch_warms_the_cache(fetcher, upstream):
+    zooms = range(14, 17)
+    jobs = {f"/day/{z}/{x}/{y}" for z in zooms for x, y in tiles_in(SMALL_BBOX, z)}
+    broken, absent = sorted(jobs)[:2]
+    upstream.state["broken"].add(broken)
+    upstream.state["absent"].add(absent)
+
+    counts = prefetch(fetcher, bounds=SMALL_BBOX, zooms=zooms, styles=["day"], workers=4)
+    assert counts["tiles"] == len(jobs)
+    assert (counts["fetched"], counts["failed"], counts["missing"], counts["cached"]) == (len(jobs) - 2, 1, 1, 0)
+    assert counts["bytes"] == 256 * (len(jobs) - 2)
+    assert set(upstream.requests) == jobs
+
+    upstream.state["broken"].clear()
+    again = prefetch(fetcher, bounds=SMALL_BBOX, zooms=zooms, styles=["day"], workers=4)
+    assert (again["fetched"], again["failed"], again["missing"], again["cached"]) == (1, 0, 1, len(jobs) - 2)
+
+
+def test_mapbox_urls_need_a_token(monkeypatch):
+    monkeypatch.setattr(tiles, "MAPBOX_TOKEN", None)
+    with pytest.raises(MissingTokenError):
+        mapbox_url("day")
+    with pytest.raises(SystemExit):
+        tiles.main(["prefetch", "--zooms", "11"])
+    monkeypatch.setattr(tiles, "MAPBOX_TOKEN", "pk.test")
+    assert "access_token=pk.test" in mapbox_url("day")